@@ -1,16 +1,36 @@
 import pandas as pd
+import numpy as np
+import os
+import sys
+from itertools import islice
 from datetime import datetime
 
+# Shared helpers live one level up in Main/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uomEngine import learn_conversion_factors, normalize_quantities, shared_conversion_factors, factors_digest
+from resultBuilder import PairCollector, take_rows, assemble
+from runReport import RunReport
+from profitKernel import coerce_numeric, unit_cost
+from kodeJoin import normalize_kode, KodeIndex, EMPTY
+from itemDictionary import ItemDictionary, ContainsIndex
+from checkpoint import Checkpoint, checkpoint_path, input_signature
+from dateKeys import parse_dates, format_dates
+from costingEngine import method_from_env, cost_sales, unsold_history, COST_COLUMNS
+
 # ================== CONFIGURATION ==================
 file_penjualan = "./penjualan raw mei 2025.xlsx"
 file_pembelian = "./pembelian raw 2023 2025.xlsx"
 output_file = "MBUPembelianPenjualan2025_Lembur2.xlsx"
+match_by_kode = True  # exact 'Kode #' join first, name matching only for rows without a code hit
+resume = "--resume" in sys.argv  # continue the merge after the last completed chunk of an interrupted run
+costing_method = method_from_env()  # MBU_COSTING_METHOD: average or fifo adds HPP from the full purchase history
 
 # ================== UTILITY FUNCTION FOR VERBOSE LOGGING ==================
 def log(msg):
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
 
 log("Starting data cleaning and merging process...")
+report = RunReport("lembur")
 
 # ================== STEP 1: CLEAN PENJUALAN ==================
 def clean_penjualan(path):
@@ -28,8 +48,8 @@ def clean_penjualan(path):
     df['Satuan'] = df['Satuan'].astype(str).str.strip()
 
     # Convert Tanggal safely
-    log("Converting 'Tanggal' to datetime in penjualan...")
-    df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='mixed', errors='coerce')
+    log("Converting 'Tanggal' to datetime in penjualan (format detected once)...")
+    df['Tanggal'] = parse_dates(df['Tanggal'])
 
     # Drop invalid dates
     df = df[df['Tanggal'].notna()]
@@ -51,7 +71,7 @@ def clean_pembelian(path):
     df = df.loc[:, ~df.columns.isna()]
 
     log("Cleaning 'Kode #' values...")
-    df['Kode #'] = df['Kode #'].astype(str).apply(lambda x: x.lstrip('0') if x else '0')
+    df['Kode #'] = normalize_kode(df['Kode #'])
 
     # Clean string columns
     log("Cleaning text fields in pembelian...")
@@ -59,8 +79,8 @@ def clean_pembelian(path):
     df['Satuan'] = df['Satuan'].astype(str).str.strip()
 
     # Convert Tanggal safely
-    log("Converting 'Tanggal' to datetime in pembelian...")
-    df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='mixed', errors='coerce')
+    log("Converting 'Tanggal' to datetime in pembelian (format detected once)...")
+    df['Tanggal'] = parse_dates(df['Tanggal'])
 
     # Drop invalid dates
     df = df[df['Tanggal'].notna()]
@@ -70,88 +90,119 @@ def clean_pembelian(path):
 
 # ================== CLEAN DATA ==================
 log("Cleaning penjualan data...")
+report.begin("clean_penjualan")
 df_jual = clean_penjualan(file_penjualan)
+report.end(rows_out=len(df_jual))
 
 log("Cleaning pembelian data...")
+report.begin("clean_pembelian")
 df_beli = clean_pembelian(file_pembelian)
+report.end(rows_out=len(df_beli))
+
+# ================== UNIT NORMALIZATION ==================
+log("Learning per-item unit conversion factors from purchase history...")
+report.begin("normalize_units", rows_in=len(df_jual) + len(df_beli))
+uom_factors = shared_conversion_factors()
+if uom_factors is None:
+    uom_factors = learn_conversion_factors(df_beli)
+log(f"Learned {len(uom_factors)} item/unit conversion factors.")
+
+df_jual = normalize_quantities(df_jual, uom_factors)
+df_beli = normalize_quantities(df_beli, uom_factors)
+report.end(rows_out=len(uom_factors))
 
 # ================== MERGE LOGIC ==================
 log("Starting merge process...")
-merged_rows = []
-unmatched_rows = []
+report.begin("match", rows_in=len(df_jual))
+checkpoint = Checkpoint(checkpoint_path(output_file), input_signature(
+    file_penjualan, file_pembelian, match_by_kode=match_by_kode, uom_factors=factors_digest(uom_factors)))
+start, state = checkpoint.start(resume, pairs=PairCollector(), unmatched_pos=[], unmatched_reasons=[], matched_by_kode=0)
+pairs, unmatched_pos, unmatched_reasons = state['pairs'], state['unmatched_pos'], state['unmatched_reasons']
+matched_by_kode = state['matched_by_kode']
 
 # Show available columns for debugging
 log("Available columns in penjualan: " + ", ".join(df_jual.columns.astype(str)))
 log("Available columns in pembelian: " + ", ".join(df_beli.columns.astype(str)))
 
-for idx, row_jual in df_jual.iterrows():
-    jual_nama = row_jual['Nama Barang']
-    jual_satuan = row_jual['Satuan']
-    jual_tanggal = row_jual['Tanggal']
-
-    # Filter by Satuan and partial Nama Barang match
-    matches = df_beli[
-        (df_beli['Satuan'] == jual_satuan) &
-        (df_beli['Nama Barang'].str.contains(jual_nama, case=False, na=False, regex=False))
-    ]
-
-    if not matches.empty:
-        # Filter purchases before the sales date
-        matches = matches[matches['Tanggal'] <= jual_tanggal]
-
-        if not matches.empty:
-            best_match = matches.loc[matches['Tanggal'].idxmax()]
-
-            merged_row = {
-                'Nama Barang': jual_nama,
-                'Satuan': jual_satuan,
-                'Tanggal_Jual': jual_tanggal.strftime('%d %b %Y'),
-                'Kode #_Jual': row_jual.get('Kode #', ''),
-            }
-
-            # Add all relevant penjualan fields with _Jual suffix
-            for col in df_jual.columns:
-                if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                    merged_row[f"{col}_Jual"] = row_jual.get(col, '')
-
-            # Add all relevant pembelian fields with _Beli suffix
-            if not best_match.empty:
-                merged_row['Kode #_Beli'] = best_match.get('Kode #', '')
-                merged_row['Tanggal_Beli'] = best_match.get('Tanggal').strftime('%d %b %Y') if pd.notna(best_match.get('Tanggal')) else ''
-
-                for col in df_beli.columns:
-                    if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                        merged_row[f"{col}_Beli"] = best_match.get(col, '')
-            else:
-                merged_row['Kode #_Beli'] = ''
-                merged_row['Tanggal_Beli'] = ''
-
-            merged_rows.append(merged_row)
+beli_tanggal = df_beli['Tanggal'].to_numpy('datetime64[ns]').view('int64')  # full timestamps (rows without a date were dropped)
+beli_satuan = df_beli['Satuan'].to_numpy()
+beli_satuan_dasar = df_beli['Satuan Dasar'].to_numpy()
+beli_kode = KodeIndex(df_beli['Kode #']) if match_by_kode and 'Kode #' in df_beli.columns else None
+if beli_kode is not None and 'Kode #' in df_jual.columns:
+    jual_kode = normalize_kode(df_jual['Kode #'])
+else:
+    jual_kode = pd.Series(None, index=df_jual.index, dtype=object)
+
+# Canonical item names as int32 IDs (the shared MBU_ITEM_DICTIONARY when set, else the default store);
+# the partial name match is memoized per distinct sales name
+items = ItemDictionary.load()
+jual_ids = items.encode(df_jual['Nama Barang'])
+beli_names = ContainsIndex(items, items.encode(df_beli['Nama Barang']))
+items.save()
+log(f"Item dictionary holds {len(items)} canonical names.")
+
+jual_keys = zip(jual_kode, jual_ids, df_jual['Satuan'], df_jual['Satuan Dasar'], df_jual['Tanggal'].to_numpy('datetime64[ns]').view('int64'))
+for idx, (kode, jual_id, jual_satuan, jual_satuan_dasar, jual_tanggal) in islice(enumerate(jual_keys), start, None):
+    # Tier 1: same Kode # with a compatible Satuan (raw or base unit)
+    matches = beli_kode.positions(kode) if beli_kode is not None else EMPTY
+    matches = matches[(beli_satuan[matches] == jual_satuan) | (beli_satuan_dasar[matches] == jual_satuan_dasar)]
+
+    if len(matches) > 0:
+        matched_by_kode += 1
+    else:
+        # Tier 2: filter by Satuan (raw or converted to the item's base unit) and partial Nama Barang match
+        matches = np.flatnonzero(
+            ((beli_satuan == jual_satuan) | (beli_satuan_dasar == jual_satuan_dasar)) &
+            beli_names.mask(jual_id)
+        )
+
+    if len(matches) > 0:
+        # Filter purchases up to the sale's timestamp (not just its day, so later purchases that day are out)
+        matches = matches[beli_tanggal[matches] <= jual_tanggal]
+
+        if len(matches) > 0:
+            # Latest purchase on or before the sale (first one on ties, like idxmax)
+            pairs.add_matches(idx, [matches[np.argmax(beli_tanggal[matches])]])
         else:
-            unmatched_row = {
-                'Nama Barang': jual_nama,
-                'Satuan': jual_satuan,
-                'Tanggal_Jual': jual_tanggal.strftime('%d %b %Y'),
-                'Reason': 'No purchase before sale date'
-            }
-            unmatched_rows.append(unmatched_row)
+            unmatched_pos.append(idx)
+            unmatched_reasons.append('No purchase before sale date')
     else:
-        unmatched_row = {
-            'Nama Barang': jual_nama,
-            'Satuan': jual_satuan,
-            'Tanggal_Jual': jual_tanggal.strftime('%d %b %Y'),
-            'Reason': 'No matching item found'
-        }
-        unmatched_rows.append(unmatched_row)
+        unmatched_pos.append(idx)
+        unmatched_reasons.append('No matching item found')
+
+    if checkpoint.due(idx + 1):
+        checkpoint.save(idx + 1, pairs=pairs, unmatched_pos=unmatched_pos, unmatched_reasons=unmatched_reasons,
+                        matched_by_kode=matched_by_kode)
+
+log(f"Resolved by 'Kode #': {matched_by_kode} of {len(df_jual)} rows; the rest went through name matching.")
+report.end(rows_out=len(pairs))
 
 # Convert to DataFrames
 log("Building merged DataFrame...")
-df_merged = pd.DataFrame(merged_rows)
-df_unmatched = pd.DataFrame(unmatched_rows)
-
+report.begin("assemble", rows_in=len(pairs) + len(unmatched_pos))
+key_cols = ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']
+jual_pos, beli_pos = pairs.arrays()
+df_merged = assemble([
+    take_rows(df_jual, jual_pos, ['Nama Barang', 'Satuan']),
+    take_rows(df_jual, jual_pos, ['Tanggal'], '_Jual').apply(format_dates),
+    take_rows(df_jual, jual_pos, ['Kode #'], '_Jual', missing=''),
+    take_rows(df_jual, jual_pos, [col for col in df_jual.columns if col not in key_cols], '_Jual'),
+    take_rows(df_beli, beli_pos, ['Kode #'], '_Beli', missing=''),
+    take_rows(df_beli, beli_pos, ['Tanggal'], '_Beli').apply(format_dates, missing=''),
+    take_rows(df_beli, beli_pos, [col for col in df_beli.columns if col not in key_cols], '_Beli'),
+])
+
+unmatched_pos = np.asarray(unmatched_pos, dtype=np.int64)
+df_unmatched = assemble([
+    take_rows(df_jual, unmatched_pos, ['Nama Barang', 'Satuan']),
+    take_rows(df_jual, unmatched_pos, ['Tanggal'], '_Jual').apply(format_dates),
+])
+df_unmatched['Reason'] = unmatched_reasons
+report.end(rows_out=len(df_merged) + len(df_unmatched))
 
 # ---- NEW: Add DUAL HPP Calculation ----
 log("Starting dual HPP calculation...")
+report.begin("hpp", rows_in=len(df_merged))
 
 # List to hold missing column names (if any)
 missing_columns = []
@@ -160,11 +211,11 @@ missing_columns = []
 has_hpp_jual = all(col in df_merged.columns for col in ['Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Jual'])
 has_hpp_beli = all(col in df_merged.columns for col in ['Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Beli'])
 
+df_merged = coerce_numeric(df_merged)
+
 if has_hpp_jual:
     # Calculate HPP_Jual = (Penjualan_Jual - Laba_Jual) / Kuantitas_Jual
-    df_merged['Kuantitas_Jual'] = df_merged['Kuantitas_Jual'].replace(0, pd.NA)
-    df_merged['HPP_Jual'] = (df_merged['Penjualan_Jual'] - df_merged['Laba_Jual']) / df_merged['Kuantitas_Jual']
-    df_merged['HPP_Jual'] = df_merged['HPP_Jual'].round(2).fillna(0)
+    df_merged['HPP_Jual'] = unit_cost(df_merged['Penjualan_Jual'], df_merged['Laba_Jual'], df_merged['Kuantitas_Jual'])
 else:
     missing = [col for col in ['Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Jual'] if col not in df_merged.columns]
     missing_columns.extend(missing)
@@ -172,31 +223,64 @@ else:
 
 if has_hpp_beli:
     # Calculate HPP_Beli = (Penjualan_Jual - Laba_Jual) / Kuantitas_Beli
-    df_merged['Kuantitas_Beli'] = df_merged['Kuantitas_Beli'].replace(0, pd.NA)
-    df_merged['HPP_Beli'] = (df_merged['Penjualan_Jual'] - df_merged['Laba_Jual']) / df_merged['Kuantitas_Beli']
-    df_merged['HPP_Beli'] = df_merged['HPP_Beli'].round(2).fillna(0)
+    df_merged['HPP_Beli'] = unit_cost(df_merged['Penjualan_Jual'], df_merged['Laba_Jual'], df_merged['Kuantitas_Beli'])
 else:
     missing = [col for col in ['Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Beli'] if col not in df_merged.columns]
     missing_columns.extend(missing)
     log(f"⚠️ Missing columns for HPP_Beli: {', '.join(missing)}")
 
+# HPP from the purchase price converted to the base unit, so a PCS sale is costed correctly against a CTN purchase
+if all(col in df_merged.columns for col in ['Kuantitas Dasar_Jual', '@Harga Dasar_Beli']):
+    df_merged['HPP_Satuan_Dasar'] = (df_merged['Kuantitas Dasar_Jual'] * df_merged['@Harga Dasar_Beli']).round(2).fillna(0)
+
 if not missing_columns:
     log("✅ Both HPP columns calculated successfully.")
 elif len(set(missing_columns)) == len(missing_columns):
     log(f"❌ Some columns are still missing: {', '.join(set(missing_columns))}")
 
+# HPP replayed over the full purchase history (average or FIFO) next to the latest-purchase HPP
+cost_missing = [col for col in ['Kuantitas Dasar'] if col not in df_jual.columns] + \
+               [col for col in ['Kuantitas Dasar', '@Harga Dasar'] if col not in df_beli.columns]
+if costing_method != 'latest' and cost_missing:
+    log(f"⚠️ Missing base-unit columns for {costing_method} HPP: {', '.join(cost_missing)}; skipped.")
+    costing_method = 'latest'
+# The sales file covers one period while the purchases go back further: FIFO would consume the earlier
+# lots again for lack of the earlier sales, so the purchase-weighted average is used instead
+earlier_purchases = unsold_history(df_jual, df_beli) if costing_method == 'fifo' else 0
+if earlier_purchases:
+    log(f"⚠️ {earlier_purchases} purchase rows predate the first sales month and their sales are not in {file_penjualan}; using average HPP instead of FIFO.")
+    costing_method = 'average'
+if costing_method != 'latest':
+    # Matched sales are costed under the purchase's item name, so partial name matches share the item's lots
+    cost_names = df_jual['Nama Barang'].to_numpy(dtype=object).copy()
+    cost_names[jual_pos] = df_beli['Nama Barang'].to_numpy(dtype=object)[beli_pos]
+    costs = cost_sales(df_jual.assign(**{'Nama Barang': cost_names}), df_beli, qty_col='Kuantitas Dasar', price_col='@Harga Dasar')
+    hpp_column = COST_COLUMNS[costing_method].replace(' ', '_').replace('-', '_')
+    df_merged[hpp_column] = costs[COST_COLUMNS[costing_method]].to_numpy()[jual_pos]
+    df_merged['Stok_Kurang'] = costs['Stok Kurang'].to_numpy()[jual_pos]
+    if 'Penjualan_Jual' in df_merged.columns:
+        df_merged[hpp_column.replace('HPP_', 'Laba_')] = (df_merged['Penjualan_Jual'] - df_merged[hpp_column]).round(2)
+    log(f"{costing_method} HPP calculated; {int(costs['Stok Kurang'].sum())} sales rows sold beyond recorded stock.")
+
 # Sort merged data
+report.end(rows_out=len(df_merged))
+
 log("Sorting merged data...")
 df_merged = df_merged.sort_values(by=['Tanggal_Jual', 'Nama Barang'])
 df_unmatched = df_unmatched.sort_values(by=['Tanggal_Jual', 'Nama Barang'])
 
 # ================== EXPORT TO EXCEL WITH MULTIPLE SHEETS ==================
 log(f"Exporting results to {output_file}...")
+report.begin("export", rows_in=len(df_merged) + len(df_unmatched))
 with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
     df_merged.to_excel(writer, sheet_name='Merged', index=False)
     df_unmatched.to_excel(writer, sheet_name='Unmatched', index=False)
+checkpoint.clear()
+
+report.end()
 
 log("Process completed successfully!")
 log(f"✔️ Merged rows: {len(df_merged)}")
 log(f"❌ Unmatched rows: {len(df_unmatched)}")
-log(f"📄 Output saved to: {output_file}")
\ No newline at end of file
+log(f"📄 Output saved to: {output_file}")
+report.save(os.path.dirname(os.path.abspath(output_file)))
@@ -0,0 +1,193 @@
+import pandas as pd
+import os
+from glob import glob
+from columnLoader import load_columns, MissingColumnsError
+
+# Month x supplier x item x category cube over the merged files (*_merge_*.xlsx, one per month, see
+# merged_files). Each file is
+# aggregated once per data refresh and cached; report sheets are then roll-ups of the cube
+# instead of fresh scans of row-level Excel data. Dimensions are stored as categoricals
+# (dictionary-encoded), so the cube stays small even with long item names.
+#
+# Besides the sales measures, each cell holds the purchase side of the merged-with-purchasing files
+# (supplier on the purchase invoice, purchase quantity and value, HPP and the recalculated Laba) and
+# the details of its lowest-Laba row, so the lowest-profit report is a slice of the cube as well.
+
+CACHE_DIR_NAME = "_cube"
+DIMENSIONS = ['Bulan', 'Pemasok', 'Nama Barang', 'Kategori', 'Pemasok Faktur']
+MEASURES = [
+    'Laba', 'Penjualan', 'Total Harga', 'Kuantitas', 'Diskon',
+    '@Harga Beli', 'Kuantitas Beli', 'Total Pembelian', 'HPP', 'Hitung Ulang Laba',
+]
+COUNTS = ['Jumlah Baris', 'Jumlah Rugi', 'Jumlah Harga Beli']  # rows, rows with Laba < 0, rows with a purchase price
+# Row-level columns of the lowest-Laba row of each cell, stored under these names
+LOWEST_DETAILS = {
+    'Total Harga': 'Total Harga Terendah', 'Kuantitas': 'Kuantitas Terendah',
+    'Satuan': 'Satuan Terendah', '@Harga': '@Harga Terendah',
+}
+CUBE_COLUMNS = DIMENSIONS + MEASURES + COUNTS + ['Laba Terendah'] + list(LOWEST_DETAILS.values())
+UNKNOWN_SUPPLIER = '(Tidak Diketahui)'
+
+# Merged-file column per dimension (besides 'Bulan') and the source columns of the measures
+DIMENSION_COLUMNS = {
+    'Pemasok': 'Pemasok', 'Nama Barang': 'Nama Barang',
+    'Kategori': 'Nama Kategori Barang Barang & Jasa', 'Pemasok Faktur': 'Nama Pemasok Faktur Pembelian Beli',
+}
+SOURCE_MEASURES = ['Laba', 'Penjualan', 'Total Harga', 'Kuantitas', 'Diskon', '@Harga Beli', 'Kuantitas Beli', 'HPP', 'Hitung Ulang Laba']
+
+# Columns read from each merged file (projection pushdown, see columnLoader)
+REQUIRED_COLUMNS = ['Pemasok', 'Laba']
+OPTIONAL_COLUMNS = ['Nama Barang', 'Nama Kategori Barang Barang & Jasa', 'Nama Pemasok Faktur Pembelian Beli', 'Satuan', '@Harga'] + [
+    col for col in SOURCE_MEASURES if col not in REQUIRED_COLUMNS]
+
+
+def file_key(file_path):
+    """'01_merge_januari.xlsx' or '01_merge_with_purchasing_januari.xlsx' -> '01_januari', the sheet name the reports use"""
+    number, month = os.path.basename(file_path).split('_merge_')
+    month = month.replace('.xlsx', '')
+    if month.startswith('with_purchasing_'):
+        month = month[len('with_purchasing_'):]
+    return f"{number}_{month}"
+
+
+def merged_files(directory="./BAEKMI"):
+    """One merged file per month number, 'NN_merge_with_purchasing_<bulan>.xlsx' over 'NN_merge_<bulan>.xlsx'.
+
+    The pipeline writes both and they hold the same sales rows, so reading both counts every month twice.
+    """
+    chosen = {}
+    for file_path in sorted(glob(os.path.join(directory, "*_merge_*.xlsx"))):
+        file_name = os.path.basename(file_path)
+        if file_name.endswith("_ANALYSIS_REPORT.xlsx") or file_name.startswith('~$'):
+            continue
+        number = file_name.split('_merge_')[0]
+        if number not in chosen or '_merge_with_purchasing_' in file_name:
+            chosen[number] = file_path
+    return [chosen[number] for number in sorted(chosen)]
+
+
+def cube_part(df, bulan):
+    """Aggregate one merged file (or a report's recalculated rows, with 'HPP' and 'Hitung Ulang Laba') to cube granularity"""
+    df = df.copy()
+    df['Laba'] = pd.to_numeric(df['Laba'], errors='coerce')
+    df = df.dropna(subset=['Laba']).reset_index(drop=True)
+
+    def column(name, numeric=True):
+        if name not in df.columns:
+            return float('nan')
+        return pd.to_numeric(df[name], errors='coerce') if numeric else df[name]
+
+    rows = pd.DataFrame({
+        'Bulan': bulan,
+        'Pemasok': df['Pemasok'].fillna(UNKNOWN_SUPPLIER) if 'Pemasok' in df.columns else UNKNOWN_SUPPLIER,
+        'Nama Barang': df['Nama Barang'] if 'Nama Barang' in df.columns else '',
+        'Kategori': df['Nama Kategori Barang Barang & Jasa'].fillna('') if 'Nama Kategori Barang Barang & Jasa' in df.columns else '',
+        'Pemasok Faktur': column('Nama Pemasok Faktur Pembelian Beli', False),
+    }, index=df.index)
+    for col in SOURCE_MEASURES:
+        rows[col] = column(col)
+    # Purchase value of the matched (latest) purchase; it is the HPP unless the rows bring their own
+    rows['Total Pembelian'] = rows['@Harga Beli'] * rows['Kuantitas Beli']
+    if 'HPP' not in df.columns:
+        rows['HPP'] = rows['Total Pembelian']
+    if 'Hitung Ulang Laba' not in df.columns:
+        rows['Hitung Ulang Laba'] = rows['Penjualan'] - rows['HPP'] - rows['Diskon']
+    rows['Jumlah Baris'] = 1
+    rows['Jumlah Rugi'] = (rows['Laba'] < 0).astype(int)
+    rows['Jumlah Harga Beli'] = rows['@Harga Beli'].notna().astype(int)
+
+    # dropna=False keeps rows without an item name (or purchase) in the supplier totals
+    grouped = rows.groupby(DIMENSIONS, sort=False, dropna=False)
+    part = grouped[MEASURES + COUNTS].sum()
+    part['Laba Terendah'] = grouped['Laba'].min()
+    # Details of the lowest-Laba row of each cell (the first such row, like idxmin)
+    lowest = grouped['Laba'].idxmin().to_numpy()
+    for col, name in LOWEST_DETAILS.items():
+        part[name] = column(col, numeric=col != 'Satuan').to_numpy()[lowest] if col in df.columns else float('nan')
+    return part.reset_index()
+
+
+def _cached_part(cache_path, file_path, refresh=False):
+    """The cached part of a merged file if it is newer than the file and has every cube column, else None"""
+    if refresh or not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(file_path):
+        return None
+    part = pd.read_pickle(cache_path)
+    return part if set(CUBE_COLUMNS) <= set(part.columns) else None
+
+
+def file_part(file_path, df=None, refresh=False):
+    """Cube part of one merged file: from the cache when current, else aggregated (from df when given) and cached.
+
+    Raises MissingColumnsError when the file lacks REQUIRED_COLUMNS.
+    """
+    cache_dir = os.path.join(os.path.dirname(file_path), CACHE_DIR_NAME)
+    cache_path = os.path.join(cache_dir, os.path.splitext(os.path.basename(file_path))[0] + ".pkl")
+    part = _cached_part(cache_path, file_path, refresh)
+    if part is not None:
+        part['Bulan'] = file_key(file_path)  # parts cached before both file kinds shared one key
+        return part
+    if df is None:
+        df = load_columns(file_path, REQUIRED_COLUMNS, OPTIONAL_COLUMNS)
+    elif not set(REQUIRED_COLUMNS) <= set(df.columns):
+        raise MissingColumnsError(file_path, [c for c in REQUIRED_COLUMNS if c not in df.columns])
+    print(f"Aggregating {os.path.basename(file_path)} into the cube...")
+    part = cube_part(df, file_key(file_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    part.to_pickle(cache_path)
+    return part
+
+
+def build_cube(directory="./BAEKMI", refresh=False):
+    """Cube over the merged files of directory (one per month); unchanged files are read from the per-file cache"""
+    parts = []
+
+    for file_path in merged_files(directory):
+        file_name = os.path.basename(file_path)
+        try:
+            parts.append(file_part(file_path, refresh=refresh))
+        except MissingColumnsError as e:
+            print(f"Skipping {file_name} - {e}")
+        except Exception as e:
+            print(f"Error processing {file_name}: {str(e)}")
+
+    return as_cube(parts)
+
+
+def as_cube(parts):
+    """Concatenate cube parts, with the dimensions as categoricals; None without parts"""
+    if not parts:
+        return None
+    cube = pd.concat(parts, ignore_index=True)
+    for dim in DIMENSIONS:
+        cube[dim] = cube[dim].astype('category')
+    return cube
+
+
+def rollup(cube, dims, months=None, sort_by='Laba'):
+    """Sum the cube over everything except `dims`, optionally for a subset of months"""
+    if months is not None:
+        cube = cube[cube['Bulan'].isin(months)]
+    grouped = cube.groupby(dims, observed=True, sort=False)
+    result = grouped[MEASURES + COUNTS].sum()
+    result['Laba Terendah'] = grouped['Laba Terendah'].min()
+    result = result.reset_index()
+    for dim in dims:
+        result[dim] = result[dim].astype(object)
+    return result.sort_values(by=sort_by) if sort_by else result
+
+
+def lowest_rows(cube, dims, months=None):
+    """Per group of dims, the lowest-Laba row: the dimensions of its cell and the row's own details"""
+    if months is not None:
+        cube = cube[cube['Bulan'].isin(months)]
+    cells = cube.loc[cube.groupby(dims, observed=True, sort=False)['Laba Terendah'].idxmin()]
+    result = cells[DIMENSIONS + ['Laba Terendah'] + list(LOWEST_DETAILS.values())].rename(
+        columns={'Laba Terendah': 'Laba', **{name: col for col, name in LOWEST_DETAILS.items()}})
+    result = result.reset_index(drop=True)
+    for dim in DIMENSIONS:
+        result[dim] = result[dim].astype(object)
+    return result.sort_values(by='Laba', kind='mergesort')
+
+
+def months(cube):
+    return sorted(cube['Bulan'].unique().tolist())
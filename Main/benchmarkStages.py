@@ -0,0 +1,358 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import io
+import json
+import time
+import runpy
+import importlib
+import shutil
+import argparse
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+
+# Performance regression tracker. Every pipeline stage (clean, supplier match, purchase match, merge,
+# each report) runs on fixed synthetic inputs of several sizes, in a fresh scratch directory per run so
+# no cache (cube, partials, item dictionary) is warm. Results are appended to a JSON-lines history and
+# compared with the stored baseline per stage and size; a stage slower than the tolerance is flagged.
+# The scaling exponent (slope of log time vs log size) is fitted per stage too, so an algorithmic
+# regression (e.g. linear -> quadratic in catalog size) shows up even when small inputs stay fast.
+#
+#   python benchmarkStages.py                       # run, compare with baseline, append history
+#   python benchmarkStages.py --update-baseline     # accept the current timings as the new baseline
+#   python benchmarkStages.py --strict              # exit 1 on a regression (for CI / pre-release)
+
+MAIN_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = "./BAEKMI/_bench"
+HISTORY_FILE = "history.jsonl"
+BASELINE_FILE = "baseline.json"
+
+SIZES = (200, 400, 800)      # sales rows; the item catalog is a quarter of that
+REPEATS = 3                  # best-of timing per stage and size
+TOLERANCE = 0.25             # flag stages more than 25% slower than the baseline
+EXPONENT_TOLERANCE = 0.3     # flag a scaling exponent that grew by more than this
+
+_WORDS = ['MINYAK', 'GULA', 'TEH', 'KOPI', 'SUSU', 'BERAS', 'TEPUNG', 'SABUN', 'MIE', 'KECAP']
+_VARIANTS = ['GORENG', 'PASIR', 'CELUP', 'BUBUK', 'UHT', 'PREMIUM', 'TERIGU', 'CAIR', 'INSTAN', 'MANIS']
+_UNITS = ['PCS', 'PAK', 'KRT', 'BOX']
+_CATEGORIES = ['Sembako', 'Minuman', 'Kebersihan', 'Makanan']
+_SUPPLIERS = [f'PT Pemasok {i:02d}' for i in range(12)]
+
+
+# ================== SYNTHETIC INPUTS ==================
+def make_inputs(root, rows, seed=0):
+    """Write the raw inputs of every stage for `rows` sales rows into root (same seed -> same files)"""
+    rng = np.random.default_rng(seed)
+    n_items = max(rows // 4, 10)
+    catalog = pd.DataFrame({
+        'Kode #': [f'{i + 1:05d}' for i in range(n_items)],
+        'Nama Barang': [f'{_WORDS[i % 10]} {_VARIANTS[(i // 10) % 10]} {i // 100 + 1}KG' for i in range(n_items)],
+        'Kategori': [_CATEGORIES[i % len(_CATEGORIES)] for i in range(n_items)],
+        'Pemasok': [_SUPPLIERS[i % len(_SUPPLIERS)] for i in range(n_items)],
+        'Harga': rng.integers(5, 200, n_items) * 500.0,
+    })
+    baekmi = os.path.join(root, 'BAEKMI')
+    os.makedirs(baekmi, exist_ok=True)
+
+    # Purchases: several per item over January, with the raw export's four header rows
+    n_beli = n_items * 3
+    item = rng.integers(0, n_items, n_beli)
+    tanggal = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 31, n_beli), unit='D')
+    pembelian = pd.DataFrame({
+        'Kode #': catalog['Kode #'].to_numpy()[item],
+        'Tanggal': tanggal,
+        'Nama Barang': catalog['Nama Barang'].to_numpy()[item],
+        'Satuan': rng.choice(_UNITS, n_beli),
+        'Kuantitas': rng.integers(1, 50, n_beli),
+        '@Harga': catalog['Harga'].to_numpy()[item] * rng.uniform(0.9, 1.1, n_beli).round(2),
+        'Nama Pemasok Faktur Pembelian': catalog['Pemasok'].to_numpy()[item],
+        'Kena PPN': rng.choice(['Ya', 'Tidak'], n_beli),
+    })
+    raw = pembelian.assign(Tanggal=pembelian['Tanggal'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    header = [['Pembelian per Barang'], ['Periode Januari 2024'], ['BAEKMI'], [''], list(raw.columns)]
+    raw_dir = os.path.join(root, '01 Januari')
+    os.makedirs(raw_dir, exist_ok=True)
+    pd.DataFrame(header + raw.values.tolist()).to_excel(
+        os.path.join(raw_dir, 'Pembelian per Barang hingga Januari.xlsx'), index=False, header=False)
+    pembelian.to_excel(os.path.join(root, 'PembelianBuDian2024.xlsx'), index=False)
+
+    # Sales: every third row loses its code, a fifth use a shorter name so the name matcher has work
+    item = rng.integers(0, n_items, rows)
+    nama = catalog['Nama Barang'].to_numpy()[item].astype(object)
+    short = rng.random(rows) < 0.2
+    nama[short] = [name.rsplit(' ', 1)[0] for name in nama[short]]
+    kuantitas = rng.integers(1, 20, rows)
+    harga = catalog['Harga'].to_numpy()[item] * 1.15
+    hpp = catalog['Harga'].to_numpy()[item] * rng.uniform(0.8, 1.3, rows)
+    kode = catalog['Kode #'].to_numpy()[item].astype(object)
+    kode[np.arange(rows) % 3 == 0] = None
+    penjualan = pd.DataFrame({
+        'Kode #': kode,
+        'Tanggal': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 31, rows), unit='D'),
+        'Nama Barang': nama,
+        'Satuan': rng.choice(_UNITS, rows),
+        'Kuantitas': kuantitas,
+        '@Harga': harga,
+        'Total Harga': harga * kuantitas,
+        'Penjualan': harga * kuantitas,
+        'HPP': hpp * kuantitas,
+        'Laba': (harga - hpp) * kuantitas,
+        'Nama Kategori Barang Barang & Jasa': catalog['Kategori'].to_numpy()[item],
+        'Kena PPN': rng.choice(['Ya', 'Tidak'], rows),
+    })
+    penjualan.to_excel(os.path.join(baekmi, '01 penjualan januari.xlsx'), index=False)
+    penjualan.to_excel(os.path.join(baekmi, 'Penjualan2024.xlsx'), index=False)
+    catalog[['Kode #', 'Nama Barang', 'Pemasok']].to_excel(os.path.join(baekmi, '01 supplier januari.xlsx'), index=False)
+
+
+# ================== STAGES ==================
+# Each stage runs with the scratch directory as working directory, after the stages before it.
+def _expect(path):
+    # Several stages report errors by printing and carrying on; a missing output must not look fast
+    if not os.path.exists(path):
+        raise RuntimeError(f"Stage did not produce {path}")
+
+
+def _clean():
+    from cleanPembelianSheets_Batch import process_month
+    process_month('01', 'Januari')
+    _expect('./BAEKMI/01 pembelian terbaru per barang hingga Januari.xlsx')
+
+
+def _supplier_match():
+    from matchSupplierWithStringContain import process_monthly_sales
+    process_monthly_sales('./BAEKMI/01 supplier januari.xlsx', './BAEKMI/01 penjualan januari.xlsx')
+
+
+def _purchase_match():
+    from matchSalesSupplierPurchases import process_sales_purchasing
+    process_sales_purchasing('./BAEKMI/01_merge_januari.xlsx', './BAEKMI/01 pembelian terbaru per barang hingga Januari.xlsx')
+
+
+def _merge():
+    runpy.run_path(os.path.join(MAIN_DIR, 'mergeBuDianDataRayyanData3.py'), run_name='__main__')
+
+
+def _report_analysis():
+    from generateAllReportFromMergePurchasing import generate_report
+    generate_report('./BAEKMI/01_merge_with_purchasing_januari.xlsx')
+    _expect('./BAEKMI/01_merge_with_purchasing_januari_ANALYSIS_REPORT.xlsx')
+
+
+def _report_laba_supplier():
+    from generateLabaPerSupplier import analyze_supplier_profits
+    analyze_supplier_profits('./BAEKMI')
+
+
+def _report_laba_item():
+    from generateLabaPerItemWithSupplier import export_item_profit_and_losses
+    export_item_profit_and_losses('./BAEKMI')
+
+
+def _report_rugi_item():
+    from generateRugiPerItem import analyze_supplier_profits
+    analyze_supplier_profits('./BAEKMI')
+
+
+# Modules each stage uses; imported before the timing window so import cost is not counted as stage time
+STAGE_MODULES = {
+    'clean': ['cleanPembelianSheets_Batch'],
+    'supplier_match': ['matchSupplierWithStringContain'],
+    'purchase_match': ['matchSalesSupplierPurchases'],
+    'merge': ['resultBuilder', 'kodeJoin', 'itemDictionary', 'checkpoint', 'dateKeys', 'uomEngine'],
+    'report_analysis': ['generateAllReportFromMergePurchasing'],
+    'report_laba_supplier': ['generateLabaPerSupplier', 'xlsxwriter'],
+    'report_laba_item': ['generateLabaPerItemWithSupplier', 'xlsxwriter'],
+    'report_rugi_item': ['generateRugiPerItem', 'xlsxwriter'],
+}
+
+STAGES = {
+    'clean': _clean,
+    'supplier_match': _supplier_match,
+    'purchase_match': _purchase_match,
+    'merge': _merge,
+    'report_analysis': _report_analysis,
+    'report_laba_supplier': _report_laba_supplier,
+    'report_laba_item': _report_laba_item,
+    'report_rugi_item': _report_rugi_item,
+}
+
+
+def import_stage_modules(stages=None):
+    """Import the modules of the given stages (all by default); later imports are sys.modules lookups"""
+    for stage in stages or STAGES:
+        for module in STAGE_MODULES[stage]:
+            importlib.import_module(module)
+
+
+def run_once(rows, stages=None, seed=0):
+    """Seconds per stage for one pass over fresh inputs of the given size"""
+    stages = [s for s in STAGES if s in (stages or STAGES)]
+    import_stage_modules()
+    root = tempfile.mkdtemp(prefix=f'bench_{rows}_')
+    cwd = os.getcwd()
+    timings = {}
+    try:
+        make_inputs(root, rows, seed)
+        os.chdir(root)
+        for name in STAGES:  # earlier stages still run (untimed output) so later ones get their inputs
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                STAGES[name]()
+            if name in stages:
+                timings[name] = time.perf_counter() - start
+            if name == stages[-1]:
+                break
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+    return timings
+
+
+def run_benchmark(sizes=SIZES, repeats=REPEATS, stages=None, seed=0):
+    """Best-of-`repeats` seconds per stage and size: {stage: {size: seconds}}"""
+    stages = [s for s in STAGES if s in (stages or STAGES)]
+    results = {stage: {} for stage in stages}
+    # Untimed warm-up pass at the smallest size, so first-call costs (lazy imports inside pandas and the
+    # Excel engines, caches filled on first use) do not land in the first timed run
+    run_once(min(sizes), stages, seed)
+    for rows in sizes:
+        for _ in range(repeats):
+            for stage, seconds in run_once(rows, stages, seed).items():
+                results[stage][rows] = min(seconds, results[stage].get(rows, np.inf))
+        print(f"Size {rows}: " + ", ".join(f"{s} {results[s][rows]:.3f}s" for s in stages))
+    return results
+
+
+def scaling_exponent(timings):
+    """Slope of log(seconds) vs log(size); ~1 linear, ~2 quadratic (None with fewer than two sizes)"""
+    sizes = sorted(int(s) for s in timings)
+    if len(sizes) < 2:
+        return None
+    seconds = np.array([max(timings[s] if s in timings else timings[str(s)], 1e-6) for s in sizes])
+    return round(float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0]), 2)
+
+
+def compare(results, baseline, tolerance=TOLERANCE, exponent_tolerance=EXPONENT_TOLERANCE):
+    """Rows of (stage, size, seconds, baseline seconds, ratio, status) plus exponent rows (size 'exp')"""
+    rows = []
+    for stage, timings in results.items():
+        base = baseline.get(stage, {}).get('seconds', {})
+        for size, seconds in sorted(timings.items()):
+            base_seconds = base.get(str(size))
+            ratio = seconds / base_seconds if base_seconds else None
+            status = 'new' if ratio is None else ('SLOWER' if ratio > 1 + tolerance else 'ok')
+            rows.append((stage, size, seconds, base_seconds, ratio, status))
+        exponent = scaling_exponent(timings)
+        base_exponent = baseline.get(stage, {}).get('exponent')
+        if exponent is not None:
+            if base_exponent is None:
+                status = 'new'
+            else:
+                status = 'SCALING' if exponent > base_exponent + exponent_tolerance else 'ok'
+            rows.append((stage, 'exp', exponent, base_exponent, None, status))
+    return rows
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=MAIN_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def load_baseline(bench_dir=BENCH_DIR):
+    path = os.path.join(bench_dir, BASELINE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, bench_dir=BENCH_DIR):
+    """Store the stages of this run as their new baseline; other stages keep theirs"""
+    os.makedirs(bench_dir, exist_ok=True)
+    baseline = load_baseline(bench_dir)
+    baseline.update({
+        stage: {'seconds': {str(k): round(v, 4) for k, v in timings.items()}, 'exponent': scaling_exponent(timings)}
+        for stage, timings in results.items()
+    })
+    path = os.path.join(bench_dir, BASELINE_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+    return path
+
+
+def append_history(results, comparison, bench_dir=BENCH_DIR):
+    os.makedirs(bench_dir, exist_ok=True)
+    entry = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'stages': {
+            stage: {'seconds': {str(k): round(v, 4) for k, v in timings.items()}, 'exponent': scaling_exponent(timings)}
+            for stage, timings in results.items()
+        },
+        'flagged': sorted({row[0] for row in comparison if row[5] in ('SLOWER', 'SCALING')}),
+    }
+    path = os.path.join(bench_dir, HISTORY_FILE)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+    return path
+
+
+def print_comparison(comparison):
+    print(f"\n{'Stage':<22}{'Size':>6}{'Now':>10}{'Baseline':>10}{'Ratio':>8}  Status")
+    for stage, size, value, base, ratio, status in comparison:
+        if size == 'exp':
+            base_text = '-' if base is None else f"{base:.2f}"
+            print(f"{stage:<22}{'exp':>6}{value:>10.2f}{base_text:>10}{'':>8}  {status}")
+        else:
+            base_text = '-' if base is None else f"{base:.3f}"
+            ratio_text = '-' if ratio is None else f"{ratio:.2f}x"
+            print(f"{stage:<22}{size:>6}{value:>10.3f}{base_text:>10}{ratio_text:>8}  {status}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic inputs and flag regressions")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="sales rows per run")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="best-of repeats per size")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="only time these stages")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument('--exponent-tolerance', type=float, default=EXPONENT_TOLERANCE, help="allowed growth of the scaling exponent")
+    parser.add_argument('--bench-dir', default=BENCH_DIR, help="where the history and baseline are kept")
+    parser.add_argument('--update-baseline', action='store_true', help="store this run as the new baseline")
+    parser.add_argument('--strict', action='store_true', help="exit with status 1 when a regression is flagged")
+    args = parser.parse_args(argv)
+
+    # Stages import the pipeline modules, which live next to this file
+    if MAIN_DIR not in sys.path:
+        sys.path.insert(0, MAIN_DIR)
+    bench_dir = os.path.abspath(args.bench_dir)
+
+    print(f"Benchmarking {', '.join(args.stages or STAGES)} at sizes {args.sizes} (best of {args.repeats})...")
+    results = run_benchmark(sorted(args.sizes), args.repeats, args.stages)
+    baseline = load_baseline(bench_dir)
+    comparison = compare(results, baseline, args.tolerance, args.exponent_tolerance)
+    print_comparison(comparison)
+    print(f"\nHistory appended to: {append_history(results, comparison, bench_dir)}")
+
+    if args.update_baseline or not baseline:
+        print(f"Baseline saved to: {save_baseline(results, bench_dir)}")
+
+    flagged = [row for row in comparison if row[5] in ('SLOWER', 'SCALING')]
+    if flagged:
+        print(f"\n⚠️ {len(flagged)} regression(s) beyond tolerance: "
+              + ", ".join(sorted({f'{row[0]} ({row[5].lower()})' for row in flagged})))
+        return 1 if args.strict else 0
+    print("\n✅ No stage regressed beyond tolerance")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
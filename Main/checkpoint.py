@@ -0,0 +1,68 @@
+import pandas as pd
+import os
+from datetime import datetime
+
+# Checkpoints for the long merge loops (Lembur/main.py, mergeBuDianDataRayyanData*.py). The sales rows
+# are processed in chunks; after each chunk the matched pairs, the counters and the progress cursor
+# (number of sales rows done) are written to a local file next to the output. Started with --resume,
+# a script continues after the last completed chunk instead of from row 0. The checkpoint records the
+# input files (size and mtime) and settings it was made with and is ignored when those changed.
+# It is removed once the output has been written.
+
+CHUNK_ROWS = 1000
+
+
+def checkpoint_path(output_path):
+    """./MergedDianRayyan2024.xlsx -> ./MergedDianRayyan2024.checkpoint.pkl"""
+    return os.path.splitext(output_path)[0] + ".checkpoint.pkl"
+
+
+def input_signature(*paths, **settings):
+    """What the run depends on: each input's path, size and mtime plus settings that change the result"""
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append((os.path.abspath(path), stat.st_size, int(stat.st_mtime)))
+    return {'files': files, 'settings': settings}
+
+
+class Checkpoint:
+    """Progress of one merge loop: cursor (sales rows done) plus named state (pairs, counters, ...)"""
+
+    def __init__(self, path, signature, every=CHUNK_ROWS):
+        self.path = path
+        self.signature = signature
+        self.every = every
+
+    def start(self, resume, **initial):
+        """(cursor, state) to continue from; a fresh start (0, initial) unless resume finds a usable checkpoint"""
+        if not resume:
+            return 0, initial
+        if not os.path.exists(self.path):
+            print(f"No checkpoint at {self.path}, starting from the first row")
+            return 0, initial
+        saved = pd.read_pickle(self.path)
+        if saved.get('signature') != self.signature:
+            print(f"Checkpoint {self.path} was made for other inputs or settings, starting from the first row")
+            return 0, initial
+        state = {**initial, **saved['state']}
+        print(f"Resuming after row {saved['cursor']} (checkpoint from {saved['saved_at']})")
+        return saved['cursor'], state
+
+    def due(self, cursor):
+        return cursor % self.every == 0
+
+    def save(self, cursor, **state):
+        """Write atomically, so a crash during the write leaves the previous checkpoint intact"""
+        tmp_path = f"{self.path}.tmp"
+        pd.to_pickle({
+            'signature': self.signature,
+            'cursor': cursor,
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'state': state,
+        }, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,6 +1,9 @@
 import pandas as pd
 import os
 from pathlib import Path
+from kodeJoin import normalize_kode
+from uomEngine import canonicalize_satuan, uom_priority, learn_conversion_factors, save_conversion_factors, shared_conversion_factors
+from itemMaster import ItemMaster
 
 # Define month mappings
 MONTHS = {
@@ -29,6 +32,7 @@ def check_duplicates(df, month_name):
         print(f"No duplicate Nama Barang found in {month_name}\n")
 
 def process_month(month_num, month_name):
+    """Clean one month's purchase export; returns the output path, or None when it failed (the error is printed)"""
     # Create paths
     input_dir = Path(f"./{month_num} {month_name}")
     output_dir = Path("./BAEKMI")  # Single output directory
@@ -38,6 +42,7 @@ def process_month(month_num, month_name):
     
     input_file = input_dir / f"Pembelian per Barang hingga {month_name}.xlsx"
     output_file = output_dir / f"{month_num} pembelian terbaru dan unit terkecil per barang hingga {month_name}.xlsx"
+    factor_file = output_dir / f"{month_num} faktor konversi satuan hingga {month_name}.xlsx"
     
     print(f"Processing {input_file}...")
     
@@ -53,10 +58,7 @@ def process_month(month_num, month_name):
         df.reset_index(drop=True, inplace=True)
         
         # Clean Kode Barang
-        df['Kode #'] = df['Kode #'].astype(str)
-        df['Kode #'] = df['Kode #'].apply(
-            lambda x: x.lstrip('0') if x.lstrip('0') else '0'
-        )
+        df['Kode #'] = normalize_kode(df['Kode #'])
         
         # Remove duplicate header rows
         duplicate = df['Tanggal'] == 'Tanggal'
@@ -65,47 +67,43 @@ def process_month(month_num, month_name):
         # Convert date column
         df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='%Y-%m-%d %H:%M:%S')
         
-        # Step 1: Define UOM hierarchy (lower number = smaller unit)
-        uom_priority = {
-            'PCS': 1, 'Pcs': 1, 'pcs': 1,
-            'ML': 2, 'Ml': 2, 'ml': 2,
-            'GR': 3, 'Gr': 3, 'gr': 3,
-            'LTR': 4, 'Ltr': 4, 'ltr': 4,
-            'PAI': 5, 'Pai': 5,
-            'PCK': 6, 'Pck': 6, 'pck': 6,
-            'CAN': 7, 'Can': 7,
-            'BTL': 8, 'Btl': 8, 'btl': 8,
-            'JAR': 9, 'Jar': 9,
-            'JRG': 10, 'Jrg': 10,
-            'BOX': 11, 'Box': 11, 'box': 11,
-            'CTN': 12, 'Ctn': 12, 'ctn': 12,
-            'GAL': 13, 'Gal': 13,
-            'KG': 14, 'Kg': 14, 'kg': 14,
-        }
+        # Merge this export into the persistent item master (skipped when it was merged before)
+        master = ItemMaster.load()
+        items = master.for_purchases(str(input_file), rows=df)
+        master.save()
+        
+        # Step 1: Canonicalize units (vectorized over the distinct spellings)
+        df['Satuan'] = canonicalize_satuan(df['Satuan'])
 
-        # Step 2: Normalize and assign priority
-        df['Satuan'] = df['Satuan'].astype(str).str.strip()
-        df['UOM_Priority'] = df['Satuan'].map(lambda x: uom_priority.get(x.upper(), 999))  # default 999 for unknowns
+        # Step 2: Assign priority (lower number = smaller unit, 999 for unknowns)
+        df['UOM_Priority'] = uom_priority(df['Satuan'])
 
-        # Step 3: Keep only rows with smallest UOM per 'Nama Barang'
-        min_uom_idx = df.groupby('Nama Barang')['UOM_Priority'].idxmin()
-        df = df.loc[min_uom_idx].reset_index(drop=True)
+        # Learn per-item conversion factors from the full history before filtering (or use the shared table)
+        factors = shared_conversion_factors()
+        if factors is None:
+            factors = learn_conversion_factors(df)
+        save_conversion_factors(factors, str(factor_file))
 
-        # Step 4: From those, get the latest entry per item
-        df_sorted = df.sort_values(by='Tanggal', ascending=True)
-        df_barang_terbaru = df_sorted.drop_duplicates(subset='Nama Barang', keep='last').reset_index(drop=True)
+        # Step 3: Latest entry in the smallest UOM per item, looked up in the item master
+        df_barang_terbaru = items.table('smallest', items.columns(str(input_file)))
+        df_barang_terbaru = df_barang_terbaru.sort_values(by='Tanggal', kind='mergesort').reset_index(drop=True)
+        df_barang_terbaru['Satuan'] = canonicalize_satuan(df_barang_terbaru['Satuan'])
+        df_barang_terbaru['UOM_Priority'] = uom_priority(df_barang_terbaru['Satuan'])
         # Check for duplicates
         check_duplicates(df_barang_terbaru, month_name)
         
         # Save to output file
         df_barang_terbaru.to_excel(output_file, index=False)
         print(f"Successfully saved to {output_file}\n")
+        return output_file
         
     except Exception as e:
         print(f"Error processing {month_name}: {str(e)}\n")
+        return None
 
 # Process all months
-for month_num, month_name in MONTHS.items():
-    process_month(month_num, month_name)
+if __name__ == "__main__":
+    for month_num, month_name in MONTHS.items():
+        process_month(month_num, month_name)
 
-print("All months processed!")
\ No newline at end of file
+    print("All months processed!")
\ No newline at end of file
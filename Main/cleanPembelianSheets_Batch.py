@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 from pathlib import Path
+from kodeJoin import normalize_kode
 
 # Define month mappings
 MONTHS = {
@@ -29,6 +30,7 @@ def check_duplicates(df, month_name):
         print(f"No duplicate Nama Barang found in {month_name}\n")
 
 def process_month(month_num, month_name):
+    """Clean one month's purchase export; returns the output path, or None when it failed (the error is printed)"""
     # Create paths
     input_dir = Path(f"./{month_num} {month_name}")
     output_dir = Path("./BAEKMI")  # Single output directory
@@ -53,10 +55,7 @@ def process_month(month_num, month_name):
         df.reset_index(drop=True, inplace=True)
         
         # Clean Kode Barang
-        df['Kode #'] = df['Kode #'].astype(str)
-        df['Kode #'] = df['Kode #'].apply(
-            lambda x: x.lstrip('0') if x.lstrip('0') else '0'
-        )
+        df['Kode #'] = normalize_kode(df['Kode #'])
         
         # Remove duplicate header rows
         duplicate = df['Tanggal'] == 'Tanggal'
@@ -77,12 +76,15 @@ def process_month(month_num, month_name):
         # Save to output file
         df_barang_terbaru.to_excel(output_file, index=False)
         print(f"Successfully saved to {output_file}\n")
+        return output_file
         
     except Exception as e:
         print(f"Error processing {month_name}: {str(e)}\n")
+        return None
 
 # Process all months
-for month_num, month_name in MONTHS.items():
-    process_month(month_num, month_name)
+if __name__ == "__main__":
+    for month_num, month_name in MONTHS.items():
+        process_month(month_num, month_name)
 
-print("All months processed!")
\ No newline at end of file
+    print("All months processed!")
\ No newline at end of file
@@ -0,0 +1,42 @@
+import pandas as pd
+import os
+import json
+from sharedDataset import read_merged, is_published, shared_path, MANIFEST
+
+# Projection pushdown for the report stages. Each stage declares the columns it requires and the
+# ones it uses when present; the loader reads only the header first, so a file without a required
+# column is skipped before its rows are parsed, then loads just the declared columns (from the
+# shared memory-mapped columns when published, otherwise pd.read_excel with usecols). Load time and
+# memory then follow the columns a report uses, not the 30+ columns of a merged file.
+
+
+class MissingColumnsError(ValueError):
+    """A file lacks columns a stage requires"""
+
+    def __init__(self, source_file, missing):
+        self.source_file = source_file
+        self.missing = list(missing)
+        super().__init__(f"missing {' and '.join(repr(c) for c in self.missing)}")
+
+
+def header(source_file):
+    """Column names of a merged file without reading its rows"""
+    if is_published(source_file):
+        with open(os.path.join(shared_path(source_file), MANIFEST), encoding='utf-8') as f:
+            return [column['name'] for column in json.load(f)['columns']]
+    return [str(c) for c in pd.read_excel(source_file, nrows=0).columns]
+
+
+def projection(source_file, required, optional=()):
+    """The declared columns present in source_file (required first); raises MissingColumnsError"""
+    present = set(header(source_file))
+    missing = [c for c in required if c not in present]
+    if missing:
+        raise MissingColumnsError(source_file, missing)
+    return list(required) + [c for c in optional if c in present and c not in required]
+
+
+def load_columns(source_file, required, optional=(), categorical=False):
+    """Only the required and (present) optional columns of a merged file"""
+    columns = projection(source_file, required, optional)
+    return read_merged(source_file, categorical=categorical, columns=columns)
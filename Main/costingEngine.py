@@ -0,0 +1,163 @@
+import pandas as pd
+import numpy as np
+import os
+from glob import glob
+from itemDictionary import canonicalize
+from dateKeys import day_keys, NO_DAY
+from uomEngine import normalize_quantities
+
+# Cost of goods sold from the full purchase history instead of the latest purchase price. Purchases and
+# sales are replayed per item in date order (a day's purchases come before that day's sales):
+#
+#   latest    the previous behaviour, HPP from the latest purchase price; the engine is not used
+#   average   weighted average cost of the item's purchases on or before the sale date (cumulative sums)
+#   fifo      first in, first out. With an item's lots laid end to end on a cumulative quantity axis, a sale
+#             consumes the stretch between the item's cumulative sold quantity before and after it, so its
+#             cost is a difference of the interpolated cumulative lot cost: the lot queue without a row loop.
+#
+# Units sold beyond the purchases on record up to the sale date (opening stock that is not in the export,
+# or goods sold before they were booked) are costed from the next lots, or at the item's last purchase
+# price past the end of the history, and flagged 'Stok Kurang'. Items never purchased get NaN, so callers
+# keep their latest-purchase HPP for them.
+#
+# FIFO needs the sales from the start of the purchase history: sales before the first month given are
+# missing, so their lots would be consumed again. Callers check unsold_history() and use average instead
+# when the purchases start before the sales.
+#
+# The scripts read the method from MBU_COSTING_METHOD (default 'latest').
+
+METHODS = ('latest', 'average', 'fifo')
+COST_COLUMNS = {'average': 'HPP Rata-rata', 'fifo': 'HPP FIFO'}
+
+
+def method_from_env(default='latest'):
+    method = os.environ.get('MBU_COSTING_METHOD', default).strip().lower()
+    if method not in METHODS:
+        raise ValueError(f"Unknown costing method '{method}', expected one of {', '.join(METHODS)}")
+    return method
+
+
+def read_purchase_export(path):
+    """Rows of a raw Accurate 'Pembelian per Barang' export (header in row 4, like the clean scripts)"""
+    df = pd.read_excel(path)
+    df = df.dropna(axis="columns", how="all")
+    df.columns = df.iloc[3]
+    df = df.drop(range(0, 4)).reset_index(drop=True)
+    df = df.loc[:, ~df.columns.isna()]
+    return df[df['Nama Barang'] != 'Nama Barang'].reset_index(drop=True)
+
+
+def latest_purchase_export(root="."):
+    """The newest 'NN Bulan/Pembelian per Barang hingga <Bulan>.xlsx'; the exports are cumulative, so it holds the full history"""
+    files = sorted(glob(os.path.join(root, '[0-9][0-9] *', 'Pembelian per Barang hingga *.xlsx')))
+    return files[-1] if files else None
+
+
+def unsold_history(df_jual, df_beli, date_col='Tanggal'):
+    """Number of purchase rows dated before the month of the first sale (0 when the sales cover the history)"""
+    jual_days = day_keys(df_jual[date_col])
+    beli_days = day_keys(df_beli[date_col])
+    jual_days, beli_days = jual_days[jual_days != NO_DAY], beli_days[beli_days != NO_DAY]
+    if len(jual_days) == 0 or len(beli_days) == 0:
+        return 0
+    first_month = np.datetime64(int(jual_days.min()), 'D').astype('datetime64[M]')
+    return int((beli_days.astype('datetime64[D]') < first_month.astype('datetime64[D]')).sum())
+
+
+def _group_starts(keys):
+    """Boolean mask of the first row of each run of equal (sorted) keys"""
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    return starts
+
+
+def cost_sales(df_jual, df_beli, factors=None, item_col='Nama Barang', date_col='Tanggal', qty_col='Kuantitas', price_col='@Harga'):
+    """Average and FIFO cost of every sales row, replayed against the purchase rows.
+
+    With conversion factors (uomEngine) both sides are costed in the item's base unit first. Returns a frame
+    indexed like df_jual: total cost per row ('HPP Rata-rata', 'HPP FIFO'), the same per sold unit
+    ('@HPP Rata-rata', '@HPP FIFO') and 'Stok Kurang'.
+    """
+    sold_qty = pd.to_numeric(df_jual[qty_col], errors='coerce').to_numpy(dtype=float)
+    if factors is not None:
+        df_jual = normalize_quantities(df_jual, factors, item_col, qty_col, price_col)
+        df_beli = normalize_quantities(df_beli, factors, item_col, qty_col, price_col)
+        qty_col, price_col = 'Kuantitas Dasar', '@Harga Dasar'
+
+    # One integer per canonical item name, shared by both sides
+    names = np.concatenate([canonicalize(df_jual[item_col]), canonicalize(df_beli[item_col])])
+    items = pd.factorize(names)[0]
+    items[names == ''] = -1
+    jual_item, beli_item = items[:len(df_jual)], items[len(df_jual):]
+    jual_day, beli_day = day_keys(df_jual[date_col]).astype(np.int64), day_keys(df_beli[date_col]).astype(np.int64)
+    jual_qty = pd.to_numeric(df_jual[qty_col], errors='coerce').to_numpy(dtype=float)
+    beli_qty = pd.to_numeric(df_beli[qty_col], errors='coerce').to_numpy(dtype=float)
+    beli_price = pd.to_numeric(df_beli[price_col], errors='coerce').to_numpy(dtype=float)
+
+    result = pd.DataFrame(np.nan, index=df_jual.index, columns=['HPP Rata-rata', 'HPP FIFO'])
+    result['Stok Kurang'] = False
+
+    # Lots in (item, date, file order); returns, free goods and rows without item or date are not lots
+    lots = np.flatnonzero((beli_item >= 0) & (beli_day != NO_DAY) & (beli_qty > 0) & np.isfinite(beli_price))
+    lots = lots[np.lexsort((lots, beli_day[lots], beli_item[lots]))]
+    # Sales of items that were ever purchased
+    sales = np.flatnonzero((jual_item >= 0) & (jual_day != NO_DAY) & np.isfinite(jual_qty))
+    sales = sales[np.isin(jual_item[sales], beli_item[lots])]
+    if len(sales):
+        lot_item, lot_day, lot_qty = beli_item[lots], beli_day[lots], beli_qty[lots]
+        lot_cost = lot_qty * beli_price[lots]
+
+        # Cumulative quantity and cost within each item
+        starts = _group_starts(lot_item)
+        group = np.cumsum(starts) - 1
+        cum_qty, cum_cost = np.cumsum(lot_qty), np.cumsum(lot_cost)
+        cum_qty -= (cum_qty - lot_qty)[starts][group]
+        cum_cost -= (cum_cost - lot_cost)[starts][group]
+        group_item = lot_item[starts]
+        ends = np.append(np.flatnonzero(starts)[1:], len(lots)) - 1
+        total_qty, first_price, last_price = cum_qty[ends], beli_price[lots][starts], beli_price[lots][ends]
+
+        # Sales in (item, date, file order)
+        sales = sales[np.lexsort((sales, jual_day[sales], jual_item[sales]))]
+        sale_item, sale_day, qty = jual_item[sales], jual_day[sales], jual_qty[sales]
+        sale_group = np.searchsorted(group_item, sale_item)
+
+        # Average: last lot on or before the sale date, found by searching (item, day) keys
+        day_min = min(lot_day.min(), sale_day.min())
+        span = max(lot_day.max(), sale_day.max()) - day_min + 1
+        last_lot = np.searchsorted(lot_item * span + (lot_day - day_min), sale_item * span + (sale_day - day_min), side='right') - 1
+        safe_lot = np.maximum(last_lot, 0)
+        bought = (last_lot >= 0) & (lot_item[safe_lot] == sale_item)
+        average = np.where(bought, cum_cost[safe_lot] / cum_qty[safe_lot], first_price[sale_group])
+        bought_qty = np.where(bought, cum_qty[safe_lot], 0.0)
+
+        # FIFO: the sale consumes [sold before, sold before + qty) on the item's cumulative lot axis
+        consumed = np.maximum(qty, 0)
+        sold_after = np.cumsum(consumed)
+        sale_starts = _group_starts(sale_item)
+        sold_after -= (sold_after - consumed)[sale_starts][np.cumsum(sale_starts) - 1]
+        sold_before = sold_after - consumed
+        # Items side by side on one increasing axis (a gap of 1 between them), each starting at cost 0
+        offset = np.concatenate([[0], np.cumsum(total_qty + 1)[:-1]])
+        axis = np.insert(cum_qty + offset[group], np.flatnonzero(starts), offset)
+        axis_cost = np.insert(cum_cost, np.flatnonzero(starts), 0.0)
+
+        def cost_at(position):
+            inside = np.minimum(position, total_qty[sale_group])
+            beyond = np.maximum(position - total_qty[sale_group], 0)
+            return np.interp(inside + offset[sale_group], axis, axis_cost) + beyond * last_price[sale_group]
+
+        fifo = cost_at(sold_after) - cost_at(sold_before)
+        # Returns (no quantity consumed) are valued at the average cost
+        fifo = np.where(consumed > 0, fifo, average * qty)
+
+        result.iloc[sales, 0] = average * qty
+        result.iloc[sales, 1] = fifo
+        result.iloc[sales, 2] = sold_after > bought_qty
+
+    quantity = pd.Series(sold_qty, index=result.index)
+    quantity = quantity.where(quantity != 0)
+    for column in ('HPP Rata-rata', 'HPP FIFO'):
+        result[column] = result[column].round(2)
+        result[f"@{column}"] = (result[column] / quantity).round(2)
+    return result
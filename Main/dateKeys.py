@@ -0,0 +1,98 @@
+import pandas as pd
+import numpy as np
+
+# Date layer for the merge scripts. The export's date format is detected once per column from a
+# sample of its distinct values, then only the distinct values are parsed (a year of rows has a few
+# hundred distinct dates) and broadcast back. Date joins compare int32 day numbers (days since
+# 1970-01-01) instead of formatted strings; display strings ('02 Mar 2024') are produced only at
+# export, again once per distinct day.
+
+DISPLAY_FORMAT = '%d %b %Y'
+NO_DAY = np.iinfo(np.int32).min  # missing/invalid date; never equal to a real day in same_day()
+
+# Tried in order; Accurate exports use the first, the rest cover re-saved and hand-made sheets
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d-%m-%Y',
+    '%d %b %Y', '%d %B %Y', '%m/%d/%Y', '%Y/%m/%d',
+]
+_EXCEL_EPOCH = '1899-12-30'
+_SAMPLE = 500
+MIN_SHARE = 0.9  # share of sampled dates a format must parse to be used for the whole column
+
+
+def detect_format(texts, formats=DATE_FORMATS, min_share=MIN_SHARE):
+    """Format that parses the largest share of the sampled date strings, or None when none reaches min_share
+    (then parsing falls back to 'mixed'); values the chosen format cannot parse are parsed with 'mixed'"""
+    sample = pd.Series(pd.unique(pd.Series(texts, dtype=object).dropna())[:_SAMPLE], dtype=object).str.strip()
+    if sample.empty:
+        return None
+    best, best_share = None, 0.0
+    for fmt in formats:
+        share = pd.to_datetime(sample, format=fmt, errors='coerce').notna().mean()
+        if share > best_share:
+            best, best_share = fmt, share
+            if share == 1.0:
+                break
+    return best if best_share >= min_share else None
+
+
+def _parse_distinct(uniques, fmt=None):
+    """Parse distinct raw values: datetime objects as they are, text with one format, numbers as Excel serials"""
+    result = pd.Series(pd.NaT, index=range(len(uniques)), dtype='datetime64[ns]')
+    values = pd.Series(uniques, dtype=object)
+    is_text = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    is_number = values.map(lambda v: isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool)).to_numpy(dtype=bool)
+    is_other = ~(is_text | is_number)
+
+    if is_text.any():
+        texts = values[is_text].str.strip()
+        fmt = fmt or detect_format(texts)
+        parsed = pd.to_datetime(texts, format=fmt or 'mixed', errors='coerce')
+        if fmt is not None and parsed.isna().any():
+            # The few distinct values the column's format does not fit (typed-in dates) get the slow parser
+            leftover = parsed.isna()
+            parsed[leftover] = pd.to_datetime(texts[leftover], format='mixed', errors='coerce')
+        result[is_text] = parsed.to_numpy('datetime64[ns]')
+    if is_number.any():
+        result[is_number] = pd.to_datetime(values[is_number].astype(float), unit='D', origin=_EXCEL_EPOCH, errors='coerce').to_numpy('datetime64[ns]')
+    if is_other.any():
+        result[is_other] = pd.to_datetime(values[is_other], errors='coerce').to_numpy('datetime64[ns]')
+    return result.to_numpy('datetime64[ns]')
+
+
+def parse_dates(values, fmt=None):
+    """Vectorized date parsing of a column: the format is detected once and each distinct value parsed once"""
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = np.append(_parse_distinct(uniques, fmt), np.datetime64('NaT', 'ns'))
+    return pd.Series(parsed.take(codes), index=series.index, name=series.name)
+
+
+def day_keys(dates):
+    """int32 day numbers (days since 1970-01-01); NO_DAY for missing dates"""
+    days = np.asarray(parse_dates(dates).to_numpy('datetime64[ns]'), dtype='datetime64[D]')
+    keys = days.view('int64')
+    return np.where(np.isnat(days), NO_DAY, keys).astype(np.int32)
+
+
+def same_day(keys, key):
+    """Mask of keys equal to key; a missing date matches nothing"""
+    return (keys == key) & (key != NO_DAY)
+
+
+def format_days(keys, fmt=DISPLAY_FORMAT, missing=None):
+    """Display strings for day numbers, formatted once per distinct day"""
+    keys = np.asarray(keys, dtype=np.int32)
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    known = distinct != NO_DAY
+    labels = np.full(len(distinct), missing, dtype=object)
+    labels[known] = pd.to_datetime(distinct[known].astype('int64'), unit='D').strftime(fmt).to_numpy(dtype=object)
+    return labels[inverse.reshape(-1)]
+
+
+def format_dates(dates, fmt=DISPLAY_FORMAT, missing=None):
+    """Display strings for a date column (only for export; joins use day_keys)"""
+    series = dates if isinstance(dates, pd.Series) else pd.Series(dates)
+    return pd.Series(format_days(day_keys(series), fmt, missing), index=series.index, name=series.name)
@@ -1,37 +1,61 @@
 import os
+import re
 import pandas as pd
 from openpyxl import Workbook
+from profitKernel import coerce_numeric, recalculated_profit
+from costingEngine import method_from_env, cost_sales, unsold_history, COST_COLUMNS, latest_purchase_export, read_purchase_export
+from uomEngine import learn_conversion_factors, shared_conversion_factors
+from aggregateCube import cube_part, as_cube, rollup
 
 # Configuration
 input_folder = "./BAEKMI"
 output_file = "Laporan_Laba_Bulanan.xlsx"
-
-# Get list of input files
-input_files = [f for f in os.listdir(input_folder) if f.startswith('_merge_with_purchasing')]
+costing_method = method_from_env()  # MBU_COSTING_METHOD: latest (default), average or fifo
+MERGED_FILE = re.compile(r'^(\d{2})_merge_with_purchasing_([a-z]+)\.xlsx$', re.IGNORECASE)
+
+# Get list of input files: the 'NN_merge_with_purchasing_<bulan>.xlsx' files in month order
+input_files = sorted(f for f in os.listdir(input_folder) if MERGED_FILE.match(f))
+
+# Read every month first: average and FIFO cost replay the sales of all months in date order
+frames = {}
+for file in input_files:
+    df = pd.read_excel(os.path.join(input_folder, file))
+    df.columns = df.columns.str.strip()  # Clean column names (if needed)
+    frames[file] = coerce_numeric(df)
+
+# HPP per sales row from the full purchase history (None keeps the latest purchase price)
+history_hpp = {file: None for file in frames}
+if costing_method != 'latest' and frames:
+    purchase_file = latest_purchase_export(".")
+    if purchase_file is None:
+        print("⚠️ No 'Pembelian per Barang hingga' export found, HPP stays at the latest purchase price")
+    else:
+        df_beli = read_purchase_export(purchase_file)
+        factors = shared_conversion_factors()
+        if factors is None:
+            factors = learn_conversion_factors(df_beli)
+        sales = pd.concat(frames.values(), keys=list(frames), ignore_index=False)
+        # FIFO needs the sales from the start of the purchase history; without the earlier months use average
+        earlier_purchases = unsold_history(sales, df_beli) if costing_method == 'fifo' else 0
+        if earlier_purchases:
+            print(f"⚠️ {earlier_purchases} purchase rows predate the first merged month; using average HPP instead of FIFO")
+            costing_method = 'average'
+        # Cost matched sales under the purchase's item name, so partial name matches share the item's lots
+        if 'Nama Barang Beli' in sales.columns:
+            sales['Nama Barang'] = sales['Nama Barang Beli'].fillna(sales['Nama Barang'])
+        costs = cost_sales(sales, df_beli, factors)
+        history_hpp = {file: costs.loc[file, COST_COLUMNS[costing_method]].to_numpy() for file in frames}
+        print(f"HPP by {costing_method} cost from {purchase_file} ({int(costs['Stok Kurang'].sum())} rows sold beyond recorded stock)")
 
 # Create a Pandas Excel writer
 with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
     
-    # Summary dataframe to collect monthly totals
-    summary_data = []
-
-    for file in input_files:
-        file_path = os.path.join(input_folder, file)
-
-        # Read the Excel file
-        df = pd.read_excel(file_path)
-
-        # Clean column names (if needed)
-        df.columns = df.columns.str.strip()
+    # Cube parts of the recalculated rows; the monthly totals are a roll-up of them
+    cube_parts = []
 
-        # --- Calculate HPP per item ---
-        df['HPP'] = df['@Harga Beli'] * df['Kuantitas Beli']
-
-        # --- Calculate difference between HPP and Harga Beli ---
-        df['Selisih HPP vs Harga Beli'] = df['HPP'] - df['@Harga Beli']
-
-        # --- Recalculate Laba (Profit) = Penjualan - HPP - Diskon ---
-        df['Hitung Ulang Laba'] = df['Penjualan'] - df['HPP'] - df['Diskon']
+    for file, df in frames.items():
+        # --- HPP per item, its difference to Harga Beli, and Laba = Penjualan - HPP - Diskon ---
+        df = recalculated_profit(df, history_hpp[file])
 
         # --- Optional: Drop unnecessary columns to make it cleaner ---
         cols_to_show = [
@@ -41,29 +65,26 @@ with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
         ]
         df_summary = df[cols_to_show]
 
-        # --- Monthly summary ---
-        total_penjualan = df['Penjualan'].sum()
-        total_hpp = df['HPP'].sum()
-        total_laba_baru = df['Hitung Ulang Laba'].sum()
-        laba_selisih = df['Hitung Ulang Laba'].sum() - df['Laba'].sum()
-
         # Extract month from filename
-        month_name = file.split("_")[-1].replace(".xlsx", "").capitalize()
+        month_name = MERGED_FILE.match(file).group(2).capitalize()
 
-        summary_data.append({
-            'Bulan': month_name,
-            'Total Penjualan': total_penjualan,
-            'Total HPP': total_hpp,
-            'Total Laba (Baru)': total_laba_baru,
-            'Selisih Laba Lama-Baru': laba_selisih
-        })
+        # --- Monthly summary: aggregate the recalculated rows (HPP, Hitung Ulang Laba) to the cube ---
+        cube_parts.append(cube_part(df, month_name))
 
         # Write detailed sheet for this month
         sheet_name = month_name[:31]  # Excel sheet name limit
         df_summary.to_excel(writer, sheet_name=sheet_name, index=False)
 
     # --- Save the summary sheet ---
-    summary_df = pd.DataFrame(summary_data)
+    totals = rollup(as_cube(cube_parts), ['Bulan'], sort_by=None) if cube_parts else pd.DataFrame(
+        columns=['Bulan', 'Penjualan', 'HPP', 'Hitung Ulang Laba', 'Laba'])
+    summary_df = pd.DataFrame({
+        'Bulan': totals['Bulan'],
+        'Total Penjualan': totals['Penjualan'],
+        'Total HPP': totals['HPP'],
+        'Total Laba (Baru)': totals['Hitung Ulang Laba'],
+        'Selisih Laba Lama-Baru': totals['Hitung Ulang Laba'] - totals['Laba'],
+    })
     summary_df.to_excel(writer, sheet_name="Ringkasan Bulanan", index=False)
 
 print(f"✅ Laporan berhasil dibuat: {output_file}")
\ No newline at end of file
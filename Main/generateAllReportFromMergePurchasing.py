@@ -3,20 +3,51 @@ from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 import os
+import sys
 import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from runReport import RunReport, record_rows
+from profitKernel import coerce_numeric, selling_vs_purchase_price, hpp_detail, ppn
+import partialAggregates
+import aggregateCube
+from aggregateCube import file_part, rollup
+from columnLoader import load_columns, MissingColumnsError
 
-# Containers to store cumulative data
-hpp_summary_list = []
-profit_by_category_list = []
-supplier_summary_list = []
-ppn_summary_list = []
+# Every column the report sheets use; each sheet is skipped on its own when its columns are absent.
+# Profit by Category and Supplier Analysis are roll-ups of the file's part of the aggregate cube,
+# so the cube's columns are loaded too (the part is cached for the Laba/Rugi reports).
+REPORT_COLUMNS = [
+    'Nama Barang', 'Tanggal', 'Kuantitas', '@Harga', 'Total Harga', '@Harga Beli', 'Kuantitas Beli',
+    'Penjualan', 'Laba', 'Nama Kategori Barang Barang & Jasa', 'Nama Pemasok Faktur Pembelian Beli',
+    'Kena PPN', 'Kena PPN Beli',
+]
+REPORT_COLUMNS += [c for c in aggregateCube.REQUIRED_COLUMNS + aggregateCube.OPTIONAL_COLUMNS if c not in REPORT_COLUMNS]
+CATEGORY_COLUMNS = ['Nama Kategori Barang Barang & Jasa', 'Penjualan', 'Laba']
+SUPPLIER_COLUMNS = ['Nama Pemasok Faktur Pembelian Beli', '@Harga Beli', 'Kuantitas Beli']
 
-def generate_report(input_file):
+def generate_report(input_file, df=None):
+    """Write the analysis report for one merged file and store its partial aggregates for the year summary.
+
+    df can be passed in (e.g. a frame attached with sharedDataset); otherwise only REPORT_COLUMNS are
+    loaded, from the published shared columns when up to date or else from the Excel file.
+    """
+    partials = {}
+    shared_df = df is not None
+    if df is None:
+        try:
+            df = load_columns(input_file, [], REPORT_COLUMNS)
+        except Exception as e:
+            print(f"Error reading {input_file}: {e}")
+            return
+    record_rows(rows_in=len(df))
+    df = coerce_numeric(df)
+
+    # This month's cube part (cached; a frame passed in may lack cube columns, so the file is read then)
     try:
-        df = pd.read_excel(input_file)
-    except Exception as e:
-        print(f"Error reading {input_file}: {e}")
-        return
+        part = file_part(input_file, None if shared_df else df)
+    except MissingColumnsError as e:
+        part = None
+        print(f"Missing columns in {input_file} for the aggregate cube: {e}")
     
     wb = Workbook()
     del wb['Sheet']
@@ -54,72 +85,55 @@ def generate_report(input_file):
 
     # Sheet 1: HPP vs Harga Beli Summary
     try:
-        hpp_summary = df[['Nama Barang', '@Harga', '@Harga Beli']].copy()
-        hpp_summary['Selisih HPP vs Harga Beli'] = hpp_summary['@Harga'] - hpp_summary['@Harga Beli']
-        hpp_summary['% Selisih'] = (hpp_summary['Selisih HPP vs Harga Beli'] / hpp_summary['@Harga Beli']) * 100
-        hpp_summary = hpp_summary.groupby('Nama Barang').mean().reset_index().round(2)
+        hpp_rows = selling_vs_purchase_price(df[['Nama Barang', '@Harga', '@Harga Beli']].copy())
+        partials['hpp'] = partialAggregates.partial_aggregate(hpp_rows, 'hpp')
+        hpp_summary = partialAggregates.finalize(partials['hpp'], 'hpp')
         hpp_summary['Source File'] = os.path.basename(input_file)
-        hpp_summary_list.append(hpp_summary)
         add_sheet_with_data(wb, "HPP vs Harga Beli", hpp_summary)
     except KeyError as e:
         print(f"Missing columns in {input_file} for HPP summary: {e}")
     
     # Sheet 2: Detail HPP Analysis
     try:
-        hpp_detail = df[['Nama Barang', 'Tanggal', 'Kuantitas', '@Harga', 'Total Harga', 
+        hpp_detail_sheet = df[['Nama Barang', 'Tanggal', 'Kuantitas', '@Harga', 'Total Harga', 
                          '@Harga Beli', 'Kuantitas Beli', 'Penjualan', 'Laba']].copy()
-        hpp_detail['HPP'] = hpp_detail['Kuantitas'] * hpp_detail['@Harga']
-        hpp_detail['HPP Based on Purchase'] = hpp_detail['Kuantitas'] * hpp_detail['@Harga Beli']
-        hpp_detail['Selisih HPP'] = hpp_detail['HPP'] - hpp_detail['HPP Based on Purchase']
-        hpp_detail['Laba Recalculated'] = hpp_detail['Penjualan'] - hpp_detail['HPP Based on Purchase']
-        hpp_detail['Selisih Laba'] = hpp_detail['Laba Recalculated'] - hpp_detail['Laba']
-        hpp_detail = hpp_detail.round(2)
-        add_sheet_with_data(wb, "Detail HPP Analysis", hpp_detail)
+        hpp_detail_sheet = hpp_detail(hpp_detail_sheet).round(2)
+        add_sheet_with_data(wb, "Detail HPP Analysis", hpp_detail_sheet)
     except KeyError as e:
         print(f"Missing columns in {input_file} for detailed HPP analysis: {e}")
     
-    # Sheet 3: Profit by Category
-    try:
-        profit_by_category = df[['Nama Kategori Barang Barang & Jasa', 'Penjualan', 'Laba']].copy()
-        profit_by_category['HPP'] = profit_by_category['Penjualan'] - profit_by_category['Laba']
-        profit_by_category['Margin %'] = (profit_by_category['Laba'] / profit_by_category['Penjualan']) * 100
-        profit_by_category = profit_by_category.groupby('Nama Kategori Barang Barang & Jasa').sum().reset_index().round(2)
+    # Sheet 3: Profit by Category (HPP = Penjualan - Laba, Margin % from the sums)
+    missing = [c for c in CATEGORY_COLUMNS if c not in df.columns]
+    if part is not None and not missing:
+        by_category = rollup(part, ['Kategori'], sort_by='Kategori')
+        by_category = by_category[by_category['Kategori'] != '']
+        by_category['HPP'] = by_category['Penjualan'] - by_category['Laba']
+        partials['category'] = partialAggregates.from_rollup(by_category, 'category', ['Kategori'])
+        profit_by_category = partialAggregates.finalize(partials['category'], 'category')
         profit_by_category['Source File'] = os.path.basename(input_file)
-        profit_by_category_list.append(profit_by_category)
         add_sheet_with_data(wb, "Profit by Category", profit_by_category)
-    except KeyError as e:
-        print(f"Missing columns in {input_file} for profit by category: {e}")
+    elif missing:
+        print(f"Missing columns in {input_file} for profit by category: {missing}")
 
-    # Sheet 4: Supplier Analysis
-    try:
-        supplier_analysis = df[['Nama Pemasok Faktur Pembelian Beli', '@Harga Beli', 'Kuantitas Beli']].copy()
-        supplier_analysis['Total Pembelian'] = supplier_analysis['@Harga Beli'] * supplier_analysis['Kuantitas Beli']
-        supplier_analysis = supplier_analysis.groupby('Nama Pemasok Faktur Pembelian Beli').agg({
-            '@Harga Beli': 'mean',
-            'Kuantitas Beli': 'sum',
-            'Total Pembelian': 'sum'
-        }).reset_index().round(2)
-        supplier_analysis.rename(columns={
-            '@Harga Beli': 'Rata-rata Harga Beli',
-            'Kuantitas Beli': 'Total Kuantitas Dibeli',
-            'Total Pembelian': 'Total Nilai Pembelian'
-        }, inplace=True)
+    # Sheet 4: Supplier Analysis (per supplier on the purchase invoice)
+    missing = [c for c in SUPPLIER_COLUMNS if c not in df.columns]
+    if part is not None and not missing:
+        by_supplier = rollup(part, ['Pemasok Faktur'], sort_by='Pemasok Faktur')
+        partials['supplier'] = partialAggregates.from_rollup(by_supplier, 'supplier', ['Pemasok Faktur'],
+                                                             counts={'@Harga Beli': 'Jumlah Harga Beli'})
+        supplier_analysis = partialAggregates.finalize(partials['supplier'], 'supplier')
         supplier_analysis['Source File'] = os.path.basename(input_file)
-        supplier_summary_list.append(supplier_analysis)
         add_sheet_with_data(wb, "Supplier Analysis", supplier_analysis)
-    except KeyError as e:
-        print(f"Missing columns in {input_file} for supplier analysis: {e}")
+    elif missing:
+        print(f"Missing columns in {input_file} for supplier analysis: {missing}")
 
     # Sheet 5: PPN Analysis
     try:
         if 'Kena PPN' in df.columns and 'Kena PPN Beli' in df.columns:
-            ppn_analysis = df[['Nama Barang', 'Kena PPN', 'Kena PPN Beli', 'Total Harga']].copy()
-            ppn_analysis['PPN Penjualan'] = ppn_analysis.apply(lambda x: x['Total Harga'] * 0.11 if x['Kena PPN'] == 'Ya' else 0, axis=1)
-            ppn_analysis['PPN Pembelian'] = ppn_analysis.apply(lambda x: x['Total Harga'] * 0.11 if x['Kena PPN Beli'] == 'Ya' else 0, axis=1)
-            ppn_analysis['PPN Terutang'] = ppn_analysis['PPN Penjualan'] - ppn_analysis['PPN Pembelian']
-            ppn_summary = ppn_analysis.groupby('Nama Barang').sum().reset_index().round(2)
+            ppn_analysis = ppn(df[['Nama Barang', 'Kena PPN', 'Kena PPN Beli', 'Total Harga']].copy())
+            partials['ppn'] = partialAggregates.partial_aggregate(ppn_analysis, 'ppn')
+            ppn_summary = partialAggregates.finalize(partials['ppn'], 'ppn')
             ppn_summary['Source File'] = os.path.basename(input_file)
-            ppn_summary_list.append(ppn_summary)
             add_sheet_with_data(wb, "PPN Analysis", ppn_summary)
     except KeyError as e:
         print(f"Missing columns in {input_file} for PPN analysis: {e}")
@@ -129,8 +143,21 @@ def generate_report(input_file):
     wb.save(output_path)
     print(f"Report generated successfully: {output_path}")
 
-def generate_cumulative_summary():
-    if not hpp_summary_list and not profit_by_category_list and not supplier_summary_list and not ppn_summary_list:
+    partialAggregates.save_partials(input_file, partials)
+    return partials
+
+CUMULATIVE_SHEETS = [
+    ('hpp', "All HPP Summary", "Year HPP Summary"),
+    ('category', "All Profit by Category", "Year Profit by Category"),
+    ('supplier', "All Supplier Summary", "Year Supplier Summary"),
+    ('ppn', "All PPN Summary", "Year PPN Summary"),
+]
+
+def generate_cumulative_summary(source_files=None, entries=None):
+    """Build ALL_MONTHS_SUMMARY.xlsx from per-month partials (the stored ones unless entries are given)"""
+    if entries is None:
+        entries = partialAggregates.load_all(source_files=source_files)
+    if not entries:
         print("No cumulative data to summarize.")
         return
     
@@ -142,41 +169,106 @@ def generate_cumulative_summary():
         for r in dataframe_to_rows(df, index=False, header=True):
             ws.append(r)
 
-    if hpp_summary_list:
-        hpp_all = pd.concat(hpp_summary_list, ignore_index=True)
-        add_sheet("All HPP Summary", hpp_all)
-
-    if profit_by_category_list:
-        profit_all = pd.concat(profit_by_category_list, ignore_index=True)
-        add_sheet("All Profit by Category", profit_all)
+    for kind, per_month_sheet, year_sheet in CUMULATIVE_SHEETS:
+        monthly = []
+        for entry in entries:
+            partial = entry['partials'].get(kind)
+            if partial is None:
+                continue
+            table = partialAggregates.finalize(partial, kind)
+            table['Source File'] = entry['source']
+            monthly.append(table)
+        if not monthly:
+            continue
+        add_sheet(per_month_sheet, pd.concat(monthly, ignore_index=True))
 
-    if supplier_summary_list:
-        supplier_all = pd.concat(supplier_summary_list, ignore_index=True)
-        add_sheet("All Supplier Summary", supplier_all)
-
-    if ppn_summary_list:
-        ppn_all = pd.concat(ppn_summary_list, ignore_index=True)
-        add_sheet("All PPN Summary", ppn_all)
+        # Year totals: fold all months' partials together, then finalize once
+        merged = partialAggregates.merge_partials([e['partials'].get(kind) for e in entries], kind)
+        add_sheet(year_sheet, partialAggregates.finalize(merged, kind))
 
     output_path = "./BAEKMI/ALL_MONTHS_SUMMARY.xlsx"
     wb.save(output_path)
     print(f"\nCumulative summary report saved at: {output_path}")
 
-def process_all_files():
+def _generate_in_worker(input_file):
+    """Worker process entry point: returns the file's partials to the parent"""
+    print(f"\nProcessing file: {input_file}")
+    return generate_report(input_file)
+
+def generate_reports_parallel(input_files, workers=None):
+    """Generate the per-file reports in worker processes; returns {input_file: partials}"""
+    results = {}
+    workers = min(workers or os.cpu_count() or 1, len(input_files))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_generate_in_worker, f): f for f in input_files}
+        for future in as_completed(futures):
+            input_file = futures[future]
+            try:
+                results[input_file] = future.result()
+            except Exception as e:
+                print(f"Error generating report for {input_file}: {e}")
+    return results
+
+def _report_failed(failed):
+    if failed:
+        print(f"\n⚠️ Left out of the year summary (report failed, stored partials may be stale): "
+              + ", ".join(os.path.basename(f) for f in failed))
+
+def process_all_files(force=False, parallel=False, workers=None):
+    """Generate reports for new or changed merged files only, then rebuild the year summary from partials.
+
+    With parallel=True each file is handled by a worker process; the parent merges the returned
+    partials in month (file name) order, so the summary is identical to a serial run. A month whose
+    report failed in this run is left out of the year summary (its stored partials may be stale).
+    """
     input_folder = os.path.normpath("./BAEKMI/")
     os.makedirs(input_folder, exist_ok=True)
-    input_files = glob.glob(os.path.join(input_folder, "*_merge_with_purchasing_*.xlsx"))
+    input_files = sorted(glob.glob(os.path.join(input_folder, "*_merge_with_purchasing_*.xlsx")))
+    input_files = [f for f in input_files if not f.endswith("_ANALYSIS_REPORT.xlsx")]
     
     if not input_files:
         print(f"No matching files found in {input_folder}")
         return
     
+    report = RunReport("analysis_report")
+    pending = []
     for input_file in input_files:
-        print(f"\nProcessing file: {input_file}")
-        generate_report(input_file)
-    
-    generate_cumulative_summary()
+        if not force and not partialAggregates.is_stale(input_file):
+            print(f"\nUp to date, skipping: {input_file}")
+            continue
+        pending.append(input_file)
+
+    if parallel and len(pending) > 1:
+        with report.stage("generate_reports_parallel", files=len(pending), workers=workers or os.cpu_count()):
+            results = generate_reports_parallel(pending, workers)
+
+        failed = [f for f in pending if results.get(f) is None]
+        _report_failed(failed)
+        # Freshly generated partials come from the workers, the rest from the store; ordered by month
+        stored = {e['source']: e for e in partialAggregates.load_all(source_files=input_files)}
+        entries = []
+        for input_file in input_files:
+            source = os.path.basename(input_file)
+            if results.get(input_file) is not None:
+                entries.append({'source': source, 'partials': results[input_file]})
+            elif input_file not in failed and source in stored:
+                entries.append(stored[source])
+        with report.stage("cumulative_summary"):
+            generate_cumulative_summary(entries=entries)
+    else:
+        failed = []
+        for input_file in pending:
+            print(f"\nProcessing file: {input_file}")
+            with report.stage("generate_report", file=os.path.basename(input_file)):
+                if generate_report(input_file) is None:
+                    failed.append(input_file)
+        _report_failed(failed)
+
+        with report.stage("cumulative_summary"):
+            generate_cumulative_summary([f for f in input_files if f not in failed])
+    report.save(input_folder)
 
 if __name__ == "__main__":
-    process_all_files()
+    workers = next((int(a.split("=", 1)[1]) for a in sys.argv if a.startswith("--workers=")), None)
+    process_all_files(force="--force" in sys.argv, parallel="--parallel" in sys.argv, workers=workers)
     print("\nAll files processed!")
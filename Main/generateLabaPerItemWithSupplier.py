@@ -1,66 +1,31 @@
 import pandas as pd
 import os
-from glob import glob
+from aggregateCube import build_cube, rollup, months
 
 def export_item_profit_and_losses(directory="./BAEKMI"):
-    merged_files = glob(os.path.join(directory, "*_merge_*.xlsx"))
-    
-    if not merged_files:
-        print("No merged files found in directory:", directory)
-        return
-    
-    all_results = {}
-    combined_data = []
-
-    for file_path in merged_files:
-        try:
-            file_name = os.path.basename(file_path)
-            number, month = file_name.split('_merge_')
-            month = month.replace('.xlsx', '')
-
-            print(f"\nProcessing {file_name}...")
-            df = pd.read_excel(file_path)
-
-            if 'Nama Barang' not in df.columns or 'Laba' not in df.columns:
-                print(f"Skipping {file_name} - missing 'Nama Barang' or 'Laba'")
-                continue
-
-            # Convert Laba to numeric
-            df['Laba'] = pd.to_numeric(df['Laba'], errors='coerce')
-            df = df.dropna(subset=['Laba'])
+    # Per-month item totals and the summary are roll-ups of the cached aggregate cube
+    cube = build_cube(directory)
 
-            # Fill missing 'Pemasok'
-            df['Pemasok'] = df['Pemasok'].fillna('(Tidak Diketahui)')
-
-            # Select relevant columns
-            output_cols = ['Nama Barang', 'Pemasok', 'Laba']
-            optional_cols = ['Total Harga', 'Kuantitas', 'Satuan', '@Harga', 'Nama Kategori Barang Barang & Jasa']
-            for col in optional_cols:
-                if col in df.columns:
-                    output_cols.append(col)
+    if cube is None:
+        print("No valid data found in any files")
+        return
 
-            result_df = df[output_cols].copy()
+    all_results = {}
 
-            # Save per-file result
-            all_results[f"{number}_{month}"] = result_df
+    for month_key in months(cube):
+        print(f"\nProcessing {month_key}...")
 
-            # Add to combined summary
-            combined_data.append(result_df[['Nama Barang', 'Pemasok', 'Laba']])
-        
-        except Exception as e:
-            print(f"Error processing {file_name}: {str(e)}")
+        # Profit per item and supplier in the month, lowest first
+        result_df = rollup(cube, ['Nama Barang', 'Pemasok', 'Kategori'], months=[month_key])
+        result_df = result_df.rename(columns={'Kategori': 'Nama Kategori Barang Barang & Jasa'})[[
+            'Nama Barang', 'Pemasok', 'Laba', 'Total Harga', 'Kuantitas', 'Jumlah Baris', 'Nama Kategori Barang Barang & Jasa'
+        ]]
 
-    if not all_results:
-        print("No valid data found in any files")
-        return
+        # Save per-month result
+        all_results[month_key] = result_df
 
     # Build summary: total profit per item per supplier
-    summary_df = pd.concat(combined_data)
-    summary_df = (
-        summary_df.groupby(['Nama Barang', 'Pemasok'], as_index=False)
-        .agg({'Laba': 'sum'})
-        .sort_values(by='Laba')
-    )
+    summary_df = rollup(cube, ['Nama Barang', 'Pemasok'])[['Nama Barang', 'Pemasok', 'Laba']]
 
     timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
     output_file = os.path.join(directory, f"item_profit_loss_{timestamp}.xlsx")
@@ -1,65 +1,32 @@
 import pandas as pd
 import os
-from glob import glob
+from aggregateCube import build_cube, rollup, months
 
 def analyze_supplier_profits(directory="./BAEKMI"):
-    merged_files = glob(os.path.join(directory, "*_merge_*.xlsx"))
+    # Per-month supplier totals are roll-ups of the cached aggregate cube
+    cube = build_cube(directory)
     
-    if not merged_files:
-        print("No merged files found in directory:", directory)
+    if cube is None:
+        print("No valid data found in any files")
         return
     
     all_results = {}
-    combined_data = []  # For summary
     
-    for file_path in merged_files:
-        try:
-            file_name = os.path.basename(file_path)
-            number, month = file_name.split('_merge_')
-            month = month.replace('.xlsx', '')
-            
-            print(f"\nProcessing {file_name}...")
-            df = pd.read_excel(file_path)
-            
-            # Check required columns
-            if 'Pemasok' not in df.columns or 'Laba' not in df.columns:
-                print(f"Skipping {file_name} - missing required columns")
-                continue
-            
-            # Convert 'Laba' to numeric
-            df['Laba'] = pd.to_numeric(df['Laba'], errors='coerce')
-            
-            # Drop rows where 'Laba' is missing
-            df = df.dropna(subset=['Laba'])
-            
-            # Fill missing 'Pemasok'
-            df['Pemasok'] = df['Pemasok'].fillna('(Tidak Diketahui)')
-            
-            # Group and sum
-            supplier_profits = df.groupby('Pemasok', as_index=False)['Laba'].sum()
-            supplier_profits = supplier_profits.sort_values(by='Laba')
-            
-            print(supplier_profits.head(5))
-            losses_count = (supplier_profits['Laba'] < 0).sum()
-            print(f"→ Suppliers with losses: {losses_count}")
-            
-            # Store per-file results
-            all_results[f"{number}_{month}"] = supplier_profits
-            
-            # Add to combined data for summary
-            combined_data.append(supplier_profits)
+    for month_key in months(cube):
+        print(f"\nProcessing {month_key}...")
         
-        except Exception as e:
-            print(f"Error processing {file_name}: {str(e)}")
-    
-    if not all_results:
-        print("No valid data found in any files")
-        return
+        # Group and sum
+        supplier_profits = rollup(cube, ['Pemasok'], months=[month_key])[['Pemasok', 'Laba']]
+        
+        print(supplier_profits.head(5))
+        losses_count = (supplier_profits['Laba'] < 0).sum()
+        print(f"→ Suppliers with losses: {losses_count}")
+        
+        # Store per-file results
+        all_results[month_key] = supplier_profits
     
     # Create combined summary
-    summary_df = pd.concat(combined_data)
-    summary_df = summary_df.groupby('Pemasok', as_index=False)['Laba'].sum()
-    summary_df = summary_df.sort_values(by='Laba')
+    summary_df = rollup(cube, ['Pemasok'])[['Pemasok', 'Laba']]
     
     timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
     output_file = os.path.join(directory, f"supplier_total_profit_{timestamp}.xlsx")
@@ -1,69 +1,37 @@
 import pandas as pd
 import os
-from glob import glob
+import argparse
+from aggregateCube import build_cube, lowest_rows, months
+from topKLosses import load_rows, top_k_losses
 
 def analyze_supplier_profits(directory="./BAEKMI"):
-    # Find all merged files in the directory
-    merged_files = glob(os.path.join(directory, "*_merge_*.xlsx"))
-    
-    if not merged_files:
-        print("No merged files found in directory:", directory)
-        return
-    
-    all_results = {}
-
-    for file_path in merged_files:
-        try:
-            # Extract month and number from filename
-            file_name = os.path.basename(file_path)
-            number, month = file_name.split('_merge_')
-            month = month.replace('.xlsx', '')
-
-            print(f"\n🔍 Processing {file_name}...")
-
-            # Read the Excel file
-            df = pd.read_excel(file_path)
-
-            # Ensure required columns exist
-            if 'Pemasok' not in df.columns or 'Laba' not in df.columns:
-                print(f"⚠️ Skipping {file_name} - missing 'Pemasok' or 'Laba'")
-                continue
-
-            # Convert 'Laba' to numeric, handle errors
-            df['Laba'] = pd.to_numeric(df['Laba'], errors='coerce')
-            df = df.dropna(subset=['Laba'])
+    # The lowest-profit row per supplier and month is a slice of the cached aggregate cube
+    cube = build_cube(directory)
 
-            # Handle missing suppliers
-            df['Pemasok'] = df['Pemasok'].fillna('(Tidak Diketahui)')
-
-            # Get the lowest-profit item per supplier
-            lowest_profit_items = df.loc[df.groupby('Pemasok')['Laba'].idxmin()]
+    if cube is None:
+        print("🚫 No valid data found in any files.")
+        return
 
-            # Sort by profit (ascending)
-            lowest_profit_items = lowest_profit_items.sort_values('Laba')
+    all_results = {}
 
-            # Select columns to output
-            output_cols = [
-                'Pemasok', 'Nama Barang', 'Laba', 'Total Harga', 'Kuantitas',
-                'Satuan', '@Harga', 'Nama Kategori Barang Barang & Jasa'
-            ]
-            output_cols = [col for col in output_cols if col in lowest_profit_items.columns]
+    for month_key in months(cube):
+        print(f"\n🔍 Processing {month_key}...")
 
-            result_df = lowest_profit_items[output_cols]
+        # Get the lowest-profit item per supplier, sorted by profit (ascending)
+        lowest_profit_items = lowest_rows(cube, ['Pemasok'], months=[month_key])
 
-            # Count losses
-            num_losses = (result_df['Laba'] < 0).sum()
-            print(f"✅ Found {len(result_df)} suppliers, {num_losses} with losses (Laba < 0)")
+        # Select columns to output
+        result_df = lowest_profit_items.rename(columns={'Kategori': 'Nama Kategori Barang Barang & Jasa'})[[
+            'Pemasok', 'Nama Barang', 'Laba', 'Total Harga', 'Kuantitas',
+            'Satuan', '@Harga', 'Nama Kategori Barang Barang & Jasa'
+        ]]
 
-            # Store results
-            all_results[f"{number}_{month}"] = result_df
+        # Count losses
+        num_losses = (result_df['Laba'] < 0).sum()
+        print(f"✅ Found {len(result_df)} suppliers, {num_losses} with losses (Laba < 0)")
 
-        except Exception as e:
-            print(f"❌ Error processing {file_name}: {str(e)}")
-
-    if not all_results:
-        print("🚫 No valid data found in any files.")
-        return
+        # Store results
+        all_results[month_key] = result_df
 
     # Generate output file name
     timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
@@ -83,5 +51,42 @@ def analyze_supplier_profits(directory="./BAEKMI"):
 
     print(f"\n📁 Analysis complete. Results saved to: {output_file}")
 
+def export_top_k_losses(directory="./BAEKMI", k=10, by='supplier', start=None, end=None, losses_only=True):
+    """One workbook with the k worst items per group over the whole period, instead of one lowest row per month"""
+    rows = load_rows(directory)
+    if rows is None:
+        print("🚫 No valid data found in any files.")
+        return
+
+    result_df = top_k_losses(rows, by=by, k=k, start=start, end=end, losses_only=losses_only)
+    group_col = result_df.columns[0]
+    print(f"✅ Found {result_df[group_col].nunique()} groups, {len(result_df)} rows (top {k} per {by})")
+
+    period = f"_{start or 'awal'}_{end or 'akhir'}" if start or end else ""
+    timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(directory, f"top_{k}_losses_per_{by}{period}_{timestamp}.xlsx")
+
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        sheet_name = f"Top {k} per {by}"[:31]
+        result_df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+        worksheet = writer.sheets[sheet_name]
+        for i, col in enumerate(result_df.columns):
+            max_len = max(result_df[col].astype(str).map(len).max(), len(str(col)))
+            worksheet.set_column(i, i, max_len + 2)
+
+    print(f"\n📁 Analysis complete. Results saved to: {output_file}")
+
 if __name__ == "__main__":
-    analyze_supplier_profits()
+    parser = argparse.ArgumentParser(description="Lowest-profit items per supplier")
+    parser.add_argument("--top", type=int, help="k worst items per group over the whole period (default: lowest item per supplier per month)")
+    parser.add_argument("--by", default="supplier", choices=["supplier", "category", "month"])
+    parser.add_argument("--from", dest="start", help="start date, e.g. 2024-07-01")
+    parser.add_argument("--to", dest="end", help="end date (inclusive), e.g. 2024-09-30")
+    parser.add_argument("--include-profit", action="store_true", help="also rank rows with Laba >= 0")
+    args = parser.parse_args()
+
+    if args.top:
+        export_top_k_losses(k=args.top, by=args.by, start=args.start, end=args.end, losses_only=not args.include_profit)
+    else:
+        analyze_supplier_profits()
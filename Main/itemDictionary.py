@@ -0,0 +1,132 @@
+import pandas as pd
+import numpy as np
+import os
+import re
+import json
+import unicodedata
+
+# Canonical item names with stable integer IDs. Every distinct 'Nama Barang' is canonicalized once
+# (Unicode NFKC, case folding, punctuation to spaces, whitespace collapsed) and interned in a
+# dictionary that is persisted between runs, so the same product keeps the same int32 ID across
+# months and scripts. Joins, groupbys and the partial-name matchers then work on int32 arrays and
+# touch the name strings once per distinct name instead of once per row.
+#
+#   'Minyak  Goreng-2L ' -> 'minyak goreng 2l'
+#   'SUSU U.H.T 1/2 kg'  -> 'susu u h t 1/2 kg'     (punctuation between digits is kept)
+
+STORE_PATH = "./BAEKMI/_items/item_dictionary.json"
+SHARED_PATH_ENV = 'MBU_ITEM_DICTIONARY'  # one dictionary shared by several stores or runs
+UNKNOWN = -1  # missing or empty names, never matches anything
+
+# Punctuation (anything that is not a word character or whitespace) unless it sits between two digits
+_PUNCTUATION = re.compile(r"(?<!\d)[^\w\s]|[^\w\s](?!\d)")
+_SPACES = re.compile(r"\s+")
+_MISSING = {'', 'nan', 'none', 'nat'}
+
+
+def canonical_name(name):
+    """Canonical form of one item name ('' for missing names)"""
+    if name is None or name != name:
+        return ''
+    text = unicodedata.normalize('NFKC', str(name)).casefold()
+    text = _SPACES.sub(' ', _PUNCTUATION.sub(' ', text)).strip()
+    return '' if text in _MISSING else text
+
+
+def canonicalize(values):
+    """Canonical names for a column, computed once per distinct value"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+    canonical = np.array([canonical_name(u) for u in uniques] + [''], dtype=object)
+    return canonical.take(codes)  # sentinel -1 picks the trailing ''
+
+
+class ItemDictionary:
+    """Append-only canonical name <-> int32 ID mapping; IDs never change once assigned"""
+
+    def __init__(self, names=(), path=None):
+        self.path = path
+        self._names = list(names)
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self._saved = len(self._names)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.environ.get(SHARED_PATH_ENV, STORE_PATH)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return cls(json.load(f)['names'], path)
+        return cls(path=path)
+
+    def save(self, path=None):
+        """Write the dictionary back if new names were added since it was loaded"""
+        path = path or self.path or os.environ.get(SHARED_PATH_ENV, STORE_PATH)
+        if self._saved == len(self._names) and os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'names': self._names}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._saved = len(self._names)
+        return path
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return canonical_name(name) in self._ids
+
+    def encode(self, values, add=True):
+        """int32 item IDs for a column of raw names; unseen names get new IDs unless add=False"""
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        ids = np.empty(len(uniques) + 1, dtype=np.int32)
+        for i, raw in enumerate(uniques):
+            name = canonical_name(raw)
+            item_id = self._ids.get(name, UNKNOWN) if name else UNKNOWN
+            if item_id == UNKNOWN and name and add:
+                item_id = self._ids[name] = len(self._names)
+                self._names.append(name)
+            ids[i] = item_id
+        ids[-1] = UNKNOWN
+        return ids.take(codes)
+
+    def decode(self, ids):
+        """Canonical names for an array of IDs ('' for UNKNOWN)"""
+        names = np.array(self._names + [''], dtype=object)
+        ids = np.asarray(ids)
+        return names.take(np.where(ids < 0, len(self._names), ids))
+
+    def name(self, item_id):
+        return self._names[item_id] if item_id >= 0 else ''
+
+
+class ContainsIndex:
+    """Partial-name matcher over the item IDs of one table.
+
+    mask(needle_id) marks the rows whose canonical name contains the needle's canonical name. The
+    substring test runs once per distinct haystack name and the result is memoized per needle ID,
+    so repeated sales names cost one array lookup.
+    """
+
+    def __init__(self, dictionary, haystack_ids):
+        self.dictionary = dictionary
+        self._codes, self._uniques = pd.factorize(np.asarray(haystack_ids, dtype=np.int32))
+        self._names = dictionary.decode(self._uniques)
+        self._cache = {}
+
+    def mask(self, needle_id):
+        hits = self._cache.get(needle_id)
+        if hits is None:
+            if needle_id == UNKNOWN:
+                hits = np.zeros(len(self._names), dtype=bool)
+            else:
+                needle = self.dictionary.name(needle_id)
+                hits = np.fromiter((needle in name for name in self._names), dtype=bool, count=len(self._names))
+                hits &= self._uniques != UNKNOWN
+            self._cache[needle_id] = hits
+        return hits.take(self._codes)
+
+    def first(self, needle_id):
+        """Position of the first matching row, -1 if none"""
+        rows = np.flatnonzero(self.mask(needle_id))
+        return rows[0] if len(rows) else -1
@@ -0,0 +1,252 @@
+import pandas as pd
+import numpy as np
+import os
+import re
+from checkpoint import input_signature
+from dateKeys import parse_dates
+from kodeJoin import normalize_kode, usable
+from itemDictionary import canonical_name, canonicalize
+from uomEngine import canonicalize_satuan, uom_priority
+
+# Persistent item master, one row per canonical item name in three tables:
+#   latest     the most recent purchase row (latest Tanggal, later rows win ties) -> latest price and supplier
+#   smallest   the latest purchase row in the item's smallest unit                -> base unit and its price
+#   suppliers  'Kode #' / 'Pemasok' from the monthly supplier files               -> supplier per item
+# latest and smallest are built from the raw "Pembelian per Barang hingga <Bulan>" exports only (the
+# derived "pembelian terbaru" files hold one row per item and would skew the smallest-unit table), and
+# suppliers from the "NN supplier <bulan>" files only. Each file is merged in once: the master remembers the files it has seen
+# (path, size, mtime) and skips reading them again. Merging keeps the better row per item, so a new
+# export only adds to what is already known. Lookups go through hash indexes on the normalized
+# 'Kode #' and the canonical name, built once per load.
+#
+# Exports are cumulative ("hingga <Bulan>"), so the master reflects the newest export merged in. Asked
+# about an older export (re-running an earlier month), it answers from a one-off master built from
+# that file alone, so a month never sees purchases made after it. Supplier files are ordered the same
+# way by the month number in their name: a newer month's rows win per item, an older month is answered
+# from its own file.
+
+STORE_PATH = "./BAEKMI/_items/item_master.pkl"
+NAME_KEY = 'Nama Kanonik'
+TABLES = ('latest', 'smallest', 'suppliers')
+NOT_FOUND = -1
+_FILE_MONTH = re.compile(r'^(\d{2})\D')
+
+
+def file_month(path):
+    """Month number from a 'NN ...' file name, or None"""
+    match = _FILE_MONTH.match(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+
+def _best_per_item(rows, sort_by=None, ascending=True, order_by=None):
+    """Last row per canonical name after a stable sort (file order without sort_by).
+
+    The result is ordered by order_by, or by first appearance; the partial-name fallbacks scan in this order.
+    """
+    rows = rows.assign(_seen=pd.factorize(rows[NAME_KEY])[0])
+    if sort_by:
+        rows = rows.sort_values(sort_by, ascending=ascending, kind='mergesort', na_position='first')
+    best = rows.drop_duplicates(NAME_KEY, keep='last')
+    return best.sort_values(order_by or '_seen', kind='mergesort').drop(columns='_seen').reset_index(drop=True)
+
+
+class ItemMaster:
+    """Item tables plus the source files they were built from; see the module comment"""
+
+    def __init__(self, path=STORE_PATH, state=None):
+        state = state or {}
+        self.path = path
+        self.sources = state.get('sources', {})  # file signature -> {'kind', 'as_of', 'columns'}
+        self.as_of = state.get('as_of', pd.NaT)
+        self.suppliers_as_of = state.get('suppliers_as_of')  # month number of the newest supplier file
+        self.tables = {name: state.get(name) for name in TABLES}
+        self._indexes = {}
+        self._changed = False
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        if os.path.exists(path):
+            return cls(path, pd.read_pickle(path))
+        return cls(path)
+
+    def save(self):
+        """Write atomically if anything was merged in since loading"""
+        if not self._changed or self.path is None:
+            return self.path
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        pd.to_pickle({'sources': self.sources, 'as_of': self.as_of, 'suppliers_as_of': self.suppliers_as_of, **self.tables}, tmp_path)
+        os.replace(tmp_path, self.path)
+        self._changed = False
+        return self.path
+
+    def __len__(self):
+        latest = self.tables['latest']
+        return 0 if latest is None else len(latest)
+
+    @staticmethod
+    def signature(path):
+        return tuple(input_signature(path)['files'][0])
+
+    def knows(self, path):
+        return os.path.exists(path) and self.signature(path) in self.sources
+
+    # ---- merging ----
+    def _combined(self, name, rows):
+        """Stored rows followed by the new ones, so new rows win ties"""
+        stored = self.tables[name]
+        self._indexes.clear()
+        self._changed = True
+        return rows if stored is None or stored.empty else pd.concat([stored, rows], ignore_index=True)
+
+    def add_purchases(self, rows, source=None):
+        """Merge purchase rows ('Nama Barang', 'Tanggal', 'Satuan', ...) into the latest and smallest tables"""
+        rows = rows.copy()
+        rows['Tanggal'] = parse_dates(rows['Tanggal'])
+        rows[NAME_KEY] = canonicalize(rows['Nama Barang'])
+        rows = rows[rows[NAME_KEY] != ''].reset_index(drop=True)
+        # Purchase tables are ordered by 'Nama Barang' like the "pembelian terbaru" exports
+        self.tables['latest'] = _best_per_item(self._combined('latest', rows), 'Tanggal', order_by='Nama Barang')
+        # Largest units sort first so the kept (last) row is the smallest unit, latest date within it
+        smallest = self._combined('smallest', rows)
+        smallest = smallest.assign(_priority=uom_priority(canonicalize_satuan(smallest['Satuan'])).to_numpy())
+        self.tables['smallest'] = _best_per_item(smallest, ['_priority', 'Tanggal'], [False, True], 'Nama Barang').drop(columns='_priority')
+
+        as_of = rows['Tanggal'].max()
+        if pd.isna(self.as_of) or as_of > self.as_of:
+            self.as_of = as_of
+        if source is not None:
+            self.sources[self.signature(source)] = {'kind': 'purchases', 'as_of': as_of,
+                                                    'columns': list(rows.columns.drop(NAME_KEY))}
+
+    def add_suppliers(self, rows, source=None, as_of=None):
+        """Merge supplier rows ('Nama Barang', 'Pemasok', optional 'Kode #') of month as_of; merged rows win per item"""
+        rows = rows.copy()
+        rows[NAME_KEY] = canonicalize(rows['Nama Barang'])
+        rows = rows[rows[NAME_KEY] != ''].reset_index(drop=True)
+        self.tables['suppliers'] = _best_per_item(self._combined('suppliers', rows))
+        if as_of is not None and (self.suppliers_as_of is None or as_of > self.suppliers_as_of):
+            self.suppliers_as_of = as_of
+        if source is not None:
+            self.sources[self.signature(source)] = {'kind': 'suppliers', 'as_of': as_of, 'columns': list(rows.columns.drop(NAME_KEY))}
+
+    def for_purchases(self, path, rows=None, read=pd.read_excel):
+        """Master answering lookups for the raw purchase export at path.
+
+        The file is read (unless rows are given; read must return the cleaned export rows) and merged only
+        when the master has not seen it. For an export older than the newest one merged in, a one-off master
+        built from that export is returned.
+        """
+        if self.knows(path):
+            source = self.sources[self.signature(path)]
+            if source['as_of'] == self.as_of:
+                return self
+        if rows is None:
+            rows = read(path)
+        as_of = parse_dates(rows['Tanggal']).max()
+        if pd.notna(self.as_of) and as_of < self.as_of:
+            print(f"{os.path.basename(path)} ends {as_of:%d %b %Y}, before the item master ({self.as_of:%d %b %Y}); using that export alone")
+            one_off = ItemMaster(path=None)
+            one_off.add_purchases(rows, path)
+            return one_off
+        self.add_purchases(rows, path)
+        return self
+
+    def for_suppliers(self, path, read=pd.read_excel):
+        """Master answering lookups for the 'NN supplier <bulan>' file at path.
+
+        The file is read and merged only when new or changed. For a month older than the newest supplier
+        file merged in, a one-off master built from that file is returned (files without a month number
+        are merged in processing order).
+        """
+        as_of = file_month(path)
+        if self.knows(path) and self.sources[self.signature(path)]['as_of'] in (None, self.suppliers_as_of):
+            return self
+        if as_of is not None and self.suppliers_as_of is not None and as_of < self.suppliers_as_of:
+            print(f"{os.path.basename(path)} is for month {as_of:02d}, before the item master (month {self.suppliers_as_of:02d}); using that file alone")
+            one_off = ItemMaster(path=None)
+            one_off.add_suppliers(read(path), path, as_of)
+            return one_off
+        self.add_suppliers(read(path), path, as_of)
+        return self
+
+    # ---- lookups ----
+    def table(self, name, columns=None):
+        """Rows of one table without the canonical name column (optionally only the given columns)"""
+        rows = self.tables[name]
+        if rows is None:
+            return pd.DataFrame(columns=columns or [])
+        rows = rows.drop(columns=NAME_KEY)
+        return rows if columns is None else rows.reindex(columns=columns)
+
+    def columns(self, path):
+        """Columns of a merged-in source file, in file order"""
+        return self.sources[self.signature(path)]['columns']
+
+    def _index(self, name, key):
+        """{normalized 'Kode #' or canonical name: row position of the first such row}"""
+        index = self._indexes.get((name, key))
+        if index is None:
+            rows = self.tables[name]
+            index = {}
+            if rows is not None and (key == NAME_KEY or key in rows.columns):
+                values = normalize_kode(rows[key]) if key == 'Kode #' else rows[key]
+                for pos, value in enumerate(values):
+                    if (key == NAME_KEY or usable(value)) and value not in index:
+                        index[value] = pos
+            self._indexes[(name, key)] = index
+        return index
+
+    def names(self, name):
+        """Canonical names of a table in row order"""
+        rows = self.tables[name]
+        return [] if rows is None else rows[NAME_KEY].tolist()
+
+    def position(self, name, kode=None, nama=None):
+        """Row position in a table by 'Kode #', else by exact canonical name; NOT_FOUND if neither is known"""
+        if kode is not None:
+            kode = normalize_kode(pd.Series([kode])).iloc[0]
+            if usable(kode) and kode in self._index(name, 'Kode #'):
+                return self._index(name, 'Kode #')[kode]
+        return self._index(name, NAME_KEY).get(canonical_name(nama), NOT_FOUND)
+
+    def positions(self, name, kodes=None, names=None):
+        """Vectorized position(): one dictionary lookup per distinct code and per distinct canonical name.
+
+        Returns (positions, by_kode) where by_kode marks the rows resolved on 'Kode #'.
+        """
+        size = len(names) if names is not None else len(kodes)
+        result = np.full(size, NOT_FOUND, dtype=np.intp)
+        if kodes is not None:
+            kode_index = self._index(name, 'Kode #')
+            codes, uniques = pd.factorize(normalize_kode(pd.Series(kodes)), use_na_sentinel=True)
+            found = np.array([kode_index.get(u, NOT_FOUND) for u in uniques] + [NOT_FOUND], dtype=np.intp)
+            result = found.take(codes)
+        by_kode = result != NOT_FOUND
+        if names is not None:
+            name_index = self._index(name, NAME_KEY)
+            rest = np.flatnonzero(~by_kode)
+            codes, uniques = pd.factorize(pd.Series(canonicalize(names)[rest], dtype=object))
+            found = np.array([name_index.get(u, NOT_FOUND) if u else NOT_FOUND for u in uniques] + [NOT_FOUND], dtype=np.intp)
+            result[rest] = found.take(codes)
+        return result, by_kode
+
+    def info(self, kode=None, nama=None):
+        """Supplier, latest price and base unit of one item (None where unknown)"""
+        latest = self.position('latest', kode, nama)
+        smallest = self.position('smallest', kode, nama)
+        supplier = self.position('suppliers', kode, nama)
+
+        def value(table, pos, col):
+            rows = self.tables[table]
+            return rows[col].iat[pos] if pos != NOT_FOUND and col in rows.columns else None
+
+        return {
+            'Pemasok': value('suppliers', supplier, 'Pemasok'),
+            'Pemasok Faktur Terakhir': value('latest', latest, 'Nama Pemasok Faktur Pembelian'),
+            'Tanggal Terakhir': value('latest', latest, 'Tanggal'),
+            'Harga Terakhir': value('latest', latest, '@Harga'),
+            'Satuan Terakhir': value('latest', latest, 'Satuan'),
+            'Satuan Dasar': value('smallest', smallest, 'Satuan'),
+            'Harga Satuan Dasar': value('smallest', smallest, '@Harga'),
+        }
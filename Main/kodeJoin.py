@@ -0,0 +1,75 @@
+import pandas as pd
+import numpy as np
+
+# Exact joins on the item code ('Kode #'). Codes are normalized once per column (vectorized over the
+# distinct values), then a hash index maps each code to its row positions. The merge and match
+# scripts try the code first and only send rows without a code hit through the name matcher.
+
+EMPTY = np.empty(0, dtype=np.intp)
+
+
+def normalize_kode(series):
+    """Vectorized 'Kode #' cleanup: text, no '.0' from Excel floats, leading zeros stripped ('000' -> '0').
+
+    Missing codes stay missing (None) instead of becoming the text 'nan'.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    cleaned = pd.Index(uniques.astype(str)).str.strip().str.replace(r'\.0$', '', regex=True).str.lstrip('0')
+    cleaned = np.where(cleaned == '', '0', cleaned).astype(object)
+    result = np.full(len(codes), None, dtype=object)
+    present = codes >= 0
+    result[present] = cleaned.take(codes[present])
+    return pd.Series(result, index=series.index, dtype=object)
+
+
+def kode_column(df, column='Kode #'):
+    """The frame's code column, or None for every row when the file has no codes (all rows then go to name matching)"""
+    if column in df.columns:
+        return df[column]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def usable(kode):
+    """'0' is what an empty or all-zero code normalizes to, so it never identifies an item"""
+    return kode is not None and kode == kode and kode != '0'
+
+
+class KodeIndex:
+    """Hash index from normalized code to row positions (0-based, in the order of the frame)"""
+
+    def __init__(self, kode):
+        kode = normalize_kode(pd.Series(kode))
+        keep = kode.notna().to_numpy() & (kode != '0').to_numpy()
+        positions = np.flatnonzero(keep)
+        self._groups = pd.Series(positions).groupby(kode.to_numpy()[keep]).indices
+        self._positions = positions
+
+    def positions(self, kode):
+        """Row positions with this (already normalized) code; empty when unknown or unusable"""
+        if not usable(kode):
+            return EMPTY
+        hit = self._groups.get(kode)
+        return EMPTY if hit is None else self._positions[hit]
+
+    def __contains__(self, kode):
+        return usable(kode) and kode in self._groups
+
+    def __len__(self):
+        return len(self._groups)
+
+
+def first_match(left_kode, right_kode):
+    """For every left row, the position of the first right row with the same code (-1 if none).
+
+    Both sides are normalized here; this is the one-to-one lookup used instead of name dictionaries.
+    """
+    left = normalize_kode(pd.Series(left_kode))
+    right = normalize_kode(pd.Series(right_kode))
+    right = right.where(right != '0')
+    first = ~right.duplicated() & right.notna()
+    index = pd.Index(right[first].to_numpy())
+    result = np.full(len(left), -1, dtype=np.intp)
+    found = index.get_indexer(left.where(left != '0').to_numpy())
+    hit = found >= 0
+    result[hit] = np.flatnonzero(first.to_numpy())[found[hit]]
+    return result
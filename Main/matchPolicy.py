@@ -0,0 +1,61 @@
+import pandas as pd
+import numpy as np
+import os
+from resultBuilder import NO_MATCH
+from dateKeys import parse_dates
+
+# Match policies for the name-based merges. The matchers emit every (sales row, purchase row) pair;
+# a policy then keeps at most one purchase per sales row, resolved in one vectorized pass over the
+# pair arrays (lexsort + first per group), so output size stays linear in the number of sales rows.
+#
+#   all       every matching purchase (previous behaviour, can fan out for short names like "MINYAK")
+#   latest    the most recent purchase (latest Tanggal, then the last row in the file)
+#   longest   the most specific purchase name: the longest name containing the sales name (earlier rows win ties)
+#   cheapest  the lowest '@Harga'
+#
+# The scripts read the policy from MBU_MATCH_POLICY (default 'all').
+
+POLICIES = ('all', 'latest', 'longest', 'cheapest')
+
+
+def policy_from_env(default='all'):
+    policy = os.environ.get('MBU_MATCH_POLICY', default).strip().lower()
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown match policy '{policy}', expected one of {', '.join(POLICIES)}")
+    return policy
+
+
+def _sort_key(policy, df_beli, beli_pos, date_col, name_col, price_col):
+    """Per-pair key where smaller is better, and a tie-breaker"""
+    if policy == 'latest':
+        dates = parse_dates(df_beli[date_col]).to_numpy('datetime64[ns]').view('int64')
+        # NaT is the smallest int64, so missing dates lose; negate for "latest first", later rows win ties
+        return -dates[beli_pos].astype(float), -beli_pos
+    if policy == 'longest':
+        lengths = df_beli[name_col].astype(str).str.len().to_numpy()
+        return -lengths[beli_pos].astype(float), beli_pos
+    if policy == 'cheapest':
+        if price_col not in df_beli.columns:
+            raise KeyError(f"Match policy 'cheapest' needs the '{price_col}' column in pembelian")
+        prices = pd.to_numeric(df_beli[price_col], errors='coerce').to_numpy(dtype=float)
+        return np.nan_to_num(prices[beli_pos], nan=np.inf), beli_pos
+    raise ValueError(f"Unknown match policy '{policy}', expected one of {', '.join(POLICIES)}")
+
+
+def apply_policy(jual_pos, beli_pos, policy, df_beli, date_col='Tanggal', name_col='Nama Barang', price_col='@Harga'):
+    """Reduce the pair arrays from PairCollector to at most one purchase per sales row.
+
+    Unmatched sales rows (beli position NO_MATCH) are kept as they are; pair order is preserved.
+    """
+    if policy == 'all' or len(beli_pos) == 0:
+        return jual_pos, beli_pos
+
+    matched = beli_pos != NO_MATCH
+    key, tie = np.zeros(len(beli_pos)), np.zeros(len(beli_pos), dtype=np.int64)
+    key[matched], tie[matched] = _sort_key(policy, df_beli, beli_pos[matched], date_col, name_col, price_col)
+
+    order = np.lexsort((tie, key, jual_pos))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = jual_pos[order][1:] != jual_pos[order][:-1]
+    keep = np.sort(order[first])
+    return jual_pos[keep], beli_pos[keep]
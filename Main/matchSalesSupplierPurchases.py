@@ -1,78 +1,106 @@
 import pandas as pd
 import os
+import re
 from datetime import datetime
+import numpy as np
+from runReport import RunReport, record_rows
+from resultBuilder import take_rows
+from itemDictionary import canonicalize
+from itemMaster import ItemMaster
+from costingEngine import read_purchase_export
+from kodeJoin import normalize_kode
+
+_PEMBELIAN_TERBARU = re.compile(r'^(\d{2}) pembelian terbaru per barang hingga (\w+)\.xlsx$', re.IGNORECASE)
+
+def raw_purchase_export(purchasing_file):
+    """The raw 'NN Bulan/Pembelian per Barang hingga <Bulan>.xlsx' a 'pembelian terbaru' file was cleaned from, or None"""
+    match = _PEMBELIAN_TERBARU.match(os.path.basename(purchasing_file))
+    if not match:
+        return None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(purchasing_file)))
+    number, month = match.group(1), match.group(2)
+    # Month folders keep the capitalized name ('01 Januari')
+    for name in dict.fromkeys((month, month.capitalize())):
+        path = os.path.join(root, f"{number} {name}", f"Pembelian per Barang hingga {name}.xlsx")
+        if os.path.exists(path):
+            return path
+    return None
+
+def _read_raw_export(path):
+    """Raw export rows cleaned like the clean scripts do before they merge them into the item master"""
+    df = read_purchase_export(path)
+    if 'Kode #' in df.columns:
+        df['Kode #'] = normalize_kode(df['Kode #'])
+    return df
+
+def purchase_items(purchasing_file):
+    """Item master for the month of purchasing_file.
+
+    The persistent master is built from the raw exports only, so it is used through the raw export this
+    file was cleaned from. Without that export the file is looked up on its own and not stored.
+    """
+    raw_export = raw_purchase_export(purchasing_file)
+    if raw_export is None:
+        items = ItemMaster(path=None)
+        items.add_purchases(pd.read_excel(purchasing_file), purchasing_file)
+        return items, purchasing_file
+    master = ItemMaster.load()
+    items = master.for_purchases(raw_export, read=_read_raw_export)
+    master.save()
+    return items, raw_export
 
 def process_sales_purchasing(sales_file, purchasing_file):
     """Process and merge sales data with purchasing data"""
     try:
-        # Read files
+        # Read the sales file; the raw purchase export is only read when the item master has not seen it yet
         df_sales = pd.read_excel(sales_file, sheet_name='Data Penjualan')
-        df_purchasing = pd.read_excel(purchasing_file)
+        items, purchase_source = purchase_items(purchasing_file)
+        df_purchasing = items.table('latest', items.columns(purchase_source))
+        record_rows(rows_in=len(df_sales) + len(df_purchasing))
         
         # Print column names
         print(f"Sales columns in {os.path.basename(sales_file)}: {df_sales.columns.tolist()}")
         print(f"Purchasing columns in {os.path.basename(purchasing_file)}: {df_purchasing.columns.tolist()}")
+        print(f"Item master: {len(items)} items, purchases up to {items.as_of:%d %b %Y}")
         
         # Verify 'Nama Barang' column
         if 'Nama Barang' not in df_sales.columns:
             raise ValueError(f"'Nama Barang' column missing in sales file: {sales_file}")
-        if 'Nama Barang' not in df_purchasing.columns:
-            raise ValueError(f"'Nama Barang' column missing in purchasing file: {purchasing_file}")
         
-        # Validate data
-        for df, name in [(df_sales, 'sales'), (df_purchasing, 'purchasing')]:
-            if df['Nama Barang'].isna().any():
-                print(f"Warning: {df['Nama Barang'].isna().sum()} missing values in 'Nama Barang' in {name} file")
-                df = df.dropna(subset=['Nama Barang'])
-            if df['Nama Barang'].str.strip().eq('').any():
-                print(f"Warning: {df['Nama Barang'].str.strip().eq('').sum()} empty strings in 'Nama Barang' in {name} file")
-                df = df[df['Nama Barang'].str.strip() != '']
-            if name == 'purchasing' and df['Nama Barang'].duplicated().any():
-                duplicates = df[df['Nama Barang'].duplicated(keep=False)]
-                print(f"Warning: {df['Nama Barang'].duplicated().sum()} duplicate values in 'Nama Barang' in purchasing file")
-                print("Duplicate 'Nama Barang' values:", duplicates['Nama Barang'].tolist())
-                df = df.drop_duplicates(subset=['Nama Barang'], keep='first')
+        # Validate data (the item master already holds one purchasing row per canonical name)
+        if df_sales['Nama Barang'].isna().any():
+            print(f"Warning: {df_sales['Nama Barang'].isna().sum()} missing values in 'Nama Barang' in sales file")
+        if df_sales['Nama Barang'].str.strip().eq('').any():
+            print(f"Warning: {df_sales['Nama Barang'].str.strip().eq('').sum()} empty strings in 'Nama Barang' in sales file")
         
         # Update DataFrames after cleaning
         df_sales = df_sales[df_sales['Nama Barang'].str.strip() != '']
-        df_purchasing = df_purchasing[df_purchasing['Nama Barang'].str.strip() != '']
         
         # Print sample data and types
         print(f"Sample 'Nama Barang' from sales (first 5): {df_sales['Nama Barang'].head().tolist()}")
         print(f"Sample 'Nama Barang' from purchasing (first 5): {df_purchasing['Nama Barang'].head().tolist()}")
         print("Sales 'Nama Barang' types:", df_sales['Nama Barang'].apply(type).value_counts().to_dict())
-        print("Purchasing 'Nama Barang' types:", df_purchasing['Nama Barang'].apply(type).value_counts().to_dict())
         
-        # Create purchasing mapping dictionary
-        purchasing_map = {}
-        for _, row in df_purchasing.iterrows():
-            name = row['Nama Barang']
-            try:
-                if pd.notna(name) and name.strip():
-                    cleaned_name = str(name).strip().lower()
-                    if cleaned_name in purchasing_map:
-                        print(f"Skipping duplicate 'Nama Barang' after cleaning: {cleaned_name}")
-                        continue
-                    purchasing_map[cleaned_name] = row.to_dict()
-                else:
-                    print(f"Skipping invalid 'Nama Barang' value in purchasing file: {name!r}")
-            except Exception as e:
-                print(f"Error processing 'Nama Barang' value '{name!r}' in purchasing file: {str(e)}")
-                raise ValueError(f"Failed to process 'Nama Barang' value '{name!r}': {str(e)}")
+        # Tier 1: 'Kode #' and exact canonical name through the item master's indexes
+        kode = df_sales['Kode #'] if 'Kode #' in df_sales.columns else None
+        matched_pos, by_kode = items.positions('latest', kode, df_sales['Nama Barang'])
+        by_kode = int(by_kode.sum())
+        
+        # Tier 2: partial name match for the rest, one substring scan per distinct sales name
+        rest = np.flatnonzero(matched_pos < 0)
+        names, name_codes = np.unique(canonicalize(df_sales['Nama Barang'])[rest].astype(str), return_inverse=True)
+        products = items.names('latest')
+        found = np.array([
+            next((pos for pos, product in enumerate(products) if key in product), -1) if key else -1
+            for key in names
+        ], dtype=np.intp)
+        matched_pos[rest] = found[name_codes]
+        print(f"Matched on 'Kode #': {by_kode} of {len(df_sales)} rows; name matching used for the rest")
         
         # Match purchasing data to sales data
-        for col in df_purchasing.columns:
-            try:
-                df_sales[f"{col} Beli"] = df_sales['Nama Barang'].apply(
-                    lambda x: next(
-                        (purchasing_map[product][col] for product in purchasing_map 
-                         if pd.notna(x) and x.strip() and str(x).strip().lower() in product),
-                        None
-                    )
-                )
-            except Exception as e:
-                print(f"Error matching column '{col} Beli' for 'Nama Barang' values")
-                raise ValueError(f"Error matching column '{col} Beli': {str(e)}")
+        beli_cols = take_rows(df_purchasing, matched_pos, list(df_purchasing.columns), ' Beli')
+        beli_cols.index = df_sales.index
+        df_sales = pd.concat([df_sales, beli_cols], axis=1)
         
         # Extract month and number
         base_name = os.path.basename(sales_file)
@@ -95,6 +123,7 @@ def process_sales_purchasing(sales_file, purchasing_file):
             })
             summary.to_excel(writer, sheet_name='Summary', index=False)
         
+        record_rows(rows_out=len(df_sales))
         print(f"Successfully processed and saved: {output_file}")
         return output_file
     
@@ -136,14 +165,19 @@ if __name__ == "__main__":
     print(f"Processing files in: {directory}\n")
     
     results = []
+    report = RunReport("match_purchasing")
     for sales_file, purchasing_file in find_matching_files(directory):
         print(f"Processing:\n- Sales: {os.path.basename(sales_file)}\n- Purchasing: {os.path.basename(purchasing_file)}")
+        report.begin("match_purchasing", file=os.path.basename(sales_file))
         try:
             output = process_sales_purchasing(sales_file, purchasing_file)
             results.append(output)
+            report.end()
         except Exception as e:
+            report.end(status='error')
             print(str(e))
     
     print("\nProcessing complete. Files created:")
     for r in results:
-        print(f"- {r}")
\ No newline at end of file
+        print(f"- {r}")
+    report.save(directory)
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# Opt-in counters for the name matchers. Enable with MBU_MATCH_STATS=1 (or enable()); when disabled
+# every hook returns immediately, so the matchers pay one boolean check per sales row.
+
+_enabled = os.environ.get('MBU_MATCH_STATS', '').lower() in ('1', 'true', 'yes')
+_stats = {}
+TOP_NAMES = 25
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+def _bucket(n):
+    """Power-of-two histogram bucket label: 0, 1, 2-3, 4-7, 8-15, ..."""
+    if n <= 0:
+        return '0'
+    low = 1 << (int(n).bit_length() - 1)
+    return '1' if low == 1 else f"{low}-{2 * low - 1}"
+
+
+def _matcher(name):
+    if name not in _stats:
+        _stats[name] = {
+            'rows': 0,
+            'comparisons': 0,
+            'candidates': Counter(),
+            'multiplicity': Counter(),
+            'seconds': Counter(),
+            'names': {},
+        }
+    return _stats[name]
+
+
+def record_row(matcher, sales_name, comparisons, candidates, matches):
+    """Record one sales row: comparisons performed, name candidates found, output rows emitted"""
+    if not _enabled:
+        return
+    s = _matcher(matcher)
+    s['rows'] += 1
+    s['comparisons'] += comparisons
+    s['candidates'][_bucket(candidates)] += 1
+    s['multiplicity'][_bucket(matches)] += 1
+    if candidates > s['names'].get(sales_name, -1):
+        s['names'][sales_name] = candidates
+
+
+def record_seconds(matcher, kind, seconds):
+    if _enabled:
+        _matcher(matcher)['seconds'][kind] += seconds
+
+
+@contextmanager
+def timed(matcher, kind):
+    """Accumulate time spent in `kind` ('match' or 'io') for a matcher"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_seconds(matcher, kind, time.perf_counter() - start)
+
+
+def _sort_buckets(counter):
+    return dict(sorted(counter.items(), key=lambda kv: int(kv[0].split('-')[0])))
+
+
+def summary():
+    result = {}
+    for matcher, s in _stats.items():
+        top = sorted(s['names'].items(), key=lambda kv: kv[1], reverse=True)[:TOP_NAMES]
+        result[matcher] = {
+            'rows': s['rows'],
+            'comparisons': s['comparisons'],
+            'comparisons_per_row': round(s['comparisons'] / s['rows'], 1) if s['rows'] else 0,
+            'candidates_per_row': _sort_buckets(s['candidates']),
+            'matches_per_row': _sort_buckets(s['multiplicity']),
+            'seconds': {k: round(v, 3) for k, v in s['seconds'].items()},
+            'top_candidate_names': [{'Nama Barang': name, 'candidates': n} for name, n in top],
+        }
+    return result
+
+
+def export(output_dir, report=None):
+    """Write match_stats_<timestamp>.json to output_dir (and attach it to a RunReport); None when disabled"""
+    if not _enabled or not _stats:
+        return None
+    data = summary()
+    if report is not None:
+        report.extra['match_stats'] = data
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"match_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"Match statistics saved to: {path}")
+    return path
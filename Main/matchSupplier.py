@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+from kodeJoin import normalize_kode
 
 # Month mapping (number to month name)
 months = {
@@ -28,10 +29,7 @@ def clean_penjualan(df):
     
     # Clean data
     df['Tanggal'] = pd.to_datetime(df['Tanggal'])
-    df['Kode #'] = df['Kode #'].astype(str)
-    df['Kode #'] = df['Kode #'].apply(
-        lambda x: x.lstrip('0') if x.lstrip('0') else '0'
-    )
+    df['Kode #'] = normalize_kode(df['Kode #'])
     return df
 
 def clean_beli_supplier(df):
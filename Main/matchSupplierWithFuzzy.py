@@ -1,10 +1,12 @@
 import pandas as pd
 from fuzzywuzzy import process
+import matchStats
 
 # Read the excel file
-df_penjualan = pd.read_excel("./BAEKMI/01 penjualan januari.xlsx")
+with matchStats.timed('fuzzy', 'io'):
+    df_penjualan = pd.read_excel("./BAEKMI/01 penjualan januari.xlsx")
+    df_beli_supplier = pd.read_excel("./BAEKMI/01 supplier januari.xlsx")
 print(df_penjualan.info())
-df_beli_supplier = pd.read_excel("./BAEKMI/01 supplier januari.xlsx")
 print(df_beli_supplier.info())
 
 # Create a dictionary mapping from df_beli_supplier's complete names to suppliers
@@ -12,8 +14,16 @@ name_to_supplier = dict(zip(df_beli_supplier['Nama Barang'], df_beli_supplier['P
 
 # Function to find the best match for each partial name
 def find_supplier(partial_name):
-    # Get the best match from df_beli_supplier's complete names
-    result = process.extractOne(partial_name, name_to_supplier.keys())
+    if matchStats.enabled():
+        # Score every name once; the count above the threshold and the best match both come from these
+        # scores (sorted best first, ties in name order like extractOne)
+        scored = process.extract(partial_name, name_to_supplier.keys(), limit=None)
+        candidates = sum(1 for _, score in scored if score >= 80)
+        matchStats.record_row('fuzzy', partial_name, len(name_to_supplier), candidates, int(candidates > 0))
+        result = scored[0] if scored else None
+    else:
+        # Get the best match from df_beli_supplier's complete names
+        result = process.extractOne(partial_name, name_to_supplier.keys())
     if result:  # If a match was found
         match, score = result
         # Only return the supplier if we have a good match (adjust threshold as needed)
@@ -21,7 +31,8 @@ def find_supplier(partial_name):
     return None
 
 # Apply the function to create a new Pemasok column in df_penjualan
-df_penjualan['Pemasok'] = df_penjualan['Nama Barang'].apply(find_supplier)
+with matchStats.timed('fuzzy', 'match'):
+    df_penjualan['Pemasok'] = df_penjualan['Nama Barang'].apply(find_supplier)
 
 # Check how many matches were successful
 matched_count = df_penjualan['Pemasok'].notna().sum()
@@ -31,4 +42,6 @@ print(f"Successfully matched {matched_count} out of {total_count} rows ({matched
 # Optional: Save unmatched items for review
 unmatched = df_penjualan[df_penjualan['Pemasok'].isna()]
 print(f"\nUnmatched items sample:")
-print(unmatched['Nama Barang'].head(10).to_string(index=False))
\ No newline at end of file
+print(unmatched['Nama Barang'].head(10).to_string(index=False))
+
+matchStats.export("./BAEKMI")
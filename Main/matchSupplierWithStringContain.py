@@ -1,27 +1,55 @@
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
+from runReport import RunReport, record_rows
+import matchStats
+from itemDictionary import canonicalize
+from itemMaster import ItemMaster
+
+def find_supplier(sales_name, supplier_map):
+    """Supplier of the first product whose canonical name contains the sales name"""
+    key = str(sales_name).strip().lower()
+    if not matchStats.enabled():
+        return next((supplier for product, supplier in supplier_map.items() if key in product), None)
+
+    # Instrumented path: also count every candidate, not just the first hit
+    first, comparisons, candidates = None, len(supplier_map), 0
+    for i, (product, supplier) in enumerate(supplier_map.items()):
+        if key in product:
+            if candidates == 0:
+                first, comparisons = supplier, i + 1
+            candidates += 1
+    matchStats.record_row('supplier_contains', key, comparisons, candidates, int(candidates > 0))
+    return first
 
 def process_monthly_sales(supplier_file, sales_file):
     """Process and merge supplier data with sales data"""
-    # Read files
-    df_supplier = pd.read_excel(supplier_file)
-    df_sales = pd.read_excel(sales_file)
+    # Read files; the supplier file is only read when the item master has not seen it yet
+    with matchStats.timed('supplier_contains', 'io'):
+        master = ItemMaster.load().for_suppliers(supplier_file)
+        master.save()
+        df_sales = pd.read_excel(sales_file)
+    record_rows(rows_in=len(df_sales))
     
-    # Create supplier mapping dictionary (lowercase for case-insensitive matching)
-    supplier_map = {
-        str(name).strip().lower(): supplier 
-        for name, supplier in zip(df_supplier['Nama Barang'], df_supplier['Pemasok'])
-    }
+    # Supplier mapping keyed by canonical name (case, punctuation and spacing folded), from the item master
+    suppliers = master.table('suppliers')['Pemasok'].to_numpy(dtype=object)
+    supplier_map = dict(zip(master.names('suppliers'), suppliers))
     
-    # Match suppliers to sales data
-    df_sales['Pemasok'] = df_sales['Nama Barang'].apply(
-        lambda x: next(
-            (supplier for product, supplier in supplier_map.items() 
-             if str(x).strip().lower() in product),
-            None
-        )
-    )
+    # Match suppliers to sales data: 'Kode #' and exact canonical name first, partial name matching for the rest
+    with matchStats.timed('supplier_contains', 'match'):
+        kode = df_sales['Kode #'] if 'Kode #' in df_sales.columns else None
+        supplier_pos, by_kode = master.positions('suppliers', kode, df_sales['Nama Barang'])
+        found_pos = supplier_pos >= 0
+        pemasok = np.full(len(df_sales), None, dtype=object)
+        pemasok[found_pos] = suppliers[supplier_pos[found_pos]]
+        rest = np.flatnonzero(~found_pos)
+        # One lookup per distinct canonical sales name, broadcast back to the rows
+        names, name_codes = np.unique(canonicalize(df_sales['Nama Barang'])[rest].astype(str), return_inverse=True)
+        found = np.array([find_supplier(x, supplier_map) if x else None for x in names], dtype=object)
+        pemasok[rest] = found[name_codes]
+        df_sales['Pemasok'] = pemasok
+        print(f"Matched on 'Kode #': {int(by_kode.sum())} of {len(df_sales)} rows")
     
     # Extract month and number from filename
     base_name = os.path.basename(sales_file)
@@ -33,7 +61,7 @@ def process_monthly_sales(supplier_file, sales_file):
     output_file = f"./BAEKMI/{number}_merge_{month}.xlsx"
     
     # Export to Excel
-    with pd.ExcelWriter(output_file) as writer:
+    with matchStats.timed('supplier_contains', 'io'), pd.ExcelWriter(output_file) as writer:
         df_sales.to_excel(writer, sheet_name='Data Penjualan', index=False)
         
         # Add summary sheet
@@ -44,6 +72,7 @@ def process_monthly_sales(supplier_file, sales_file):
         })
         summary.to_excel(writer, sheet_name='Summary', index=False)
     
+    record_rows(rows_out=len(df_sales))
     print(f"Successfully processed and saved: {output_file}")
     return output_file
 
@@ -81,14 +110,20 @@ if __name__ == "__main__":
     print(f"Processing files in: {directory}\n")
     
     results = []
+    report = RunReport("match_supplier")
     for supplier_file, sales_file in find_matching_files(directory):
         print(f"Processing:\n- Sales: {os.path.basename(sales_file)}\n- Supplier: {os.path.basename(supplier_file)}")
+        report.begin("match_supplier", file=os.path.basename(sales_file))
         try:
             output = process_monthly_sales(supplier_file, sales_file)
             results.append(output)
+            report.end()
         except Exception as e:
+            report.end(status='error')
             print(f"Error processing {sales_file}: {str(e)}")
     
     print("\nProcessing complete. Files created:")
     for r in results:
-        print(f"- {r}")
\ No newline at end of file
+        print(f"- {r}")
+    matchStats.export(directory, report)
+    report.save(directory)
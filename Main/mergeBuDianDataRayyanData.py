@@ -1,9 +1,24 @@
 import pandas as pd
+import numpy as np
+import sys
+from itertools import islice
 from datetime import datetime
+from resultBuilder import PairCollector, take_rows, assemble
+from kodeJoin import normalize_kode, kode_column, KodeIndex
+from matchPolicy import policy_from_env, apply_policy
+from itemDictionary import ItemDictionary, ContainsIndex
+from checkpoint import Checkpoint, checkpoint_path, input_signature
+from dateKeys import parse_dates, day_keys, same_day, format_days, format_dates
+from uomEngine import learn_conversion_factors, normalize_quantities, shared_conversion_factors, factors_digest
+
+penjualan_path = "./BAEKMI/Penjualan2024.xlsx"
+pembelian_path = "./PembelianBuDian2024.xlsx"
+output_path = "./MergedPenjualanPembelianReport2024_CHATGPT.xlsx"
+resume = "--resume" in sys.argv  # continue after the last completed chunk of an interrupted run
 
 print("🔄 STEP 1: Loading Excel files...")
-df_penjualan = pd.read_excel("./BAEKMI/Penjualan2024.xlsx")
-df_beli = pd.read_excel("./PembelianBuDian2024.xlsx")
+df_penjualan = pd.read_excel(penjualan_path)
+df_beli = pd.read_excel(pembelian_path)
 
 print("✅ Loaded:")
 print(f"   - df_penjualan: {df_penjualan.shape[0]} rows")
@@ -18,58 +33,89 @@ def clean_text(s):
 print("   - Cleaning df_penjualan columns: 'Nama Barang', 'Satuan', 'Tanggal'")
 df_penjualan['Nama Barang'] = df_penjualan['Nama Barang'].apply(clean_text)
 df_penjualan['Satuan'] = df_penjualan['Satuan'].apply(clean_text)
-df_penjualan['Tanggal'] = pd.to_datetime(df_penjualan['Tanggal'], errors='coerce').dt.strftime('%d %b %Y')
+df_penjualan['Tanggal'] = parse_dates(df_penjualan['Tanggal'])
 
 print("   - Cleaning df_beli columns: 'Nama Barang', 'Satuan', 'Tanggal'")
 df_beli['Nama Barang'] = df_beli['Nama Barang'].apply(clean_text)
 df_beli['Satuan'] = df_beli['Satuan'].apply(clean_text)
-df_beli['Tanggal'] = pd.to_datetime(df_beli['Tanggal'], errors='coerce').dt.strftime('%d %b %Y')
-
-print("✅ Columns cleaned and dates formatted to dd Mon yyyy format.\n")
-
-print("🔁 STEP 3: Starting merge logic with partial string matching...")
-
-merged_rows = []
-
-for idx, jual_row in df_penjualan.iterrows():
+df_beli['Tanggal'] = parse_dates(df_beli['Tanggal'])
+
+print("✅ Columns cleaned and dates parsed (formatted to dd Mon yyyy only at export).\n")
+
+print("📏 Converting units to each item's base unit...")
+uom_factors = shared_conversion_factors()
+if uom_factors is None:
+    uom_factors = learn_conversion_factors(df_beli)
+df_penjualan = normalize_quantities(df_penjualan, uom_factors)
+df_beli = normalize_quantities(df_beli, uom_factors)
+print(f"   - {len(uom_factors)} item/unit conversion factors\n")
+
+print("🔤 Interning canonical item names...")
+items = ItemDictionary.load()
+jual_ids = items.encode(df_penjualan['Nama Barang'])
+beli_names = ContainsIndex(items, items.encode(df_beli['Nama Barang']))
+items.save()
+print(f"   - {len(items)} canonical names in the item dictionary\n")
+
+print("🔁 STEP 3: Starting merge logic (exact Kode # first, then partial string matching)...")
+
+checkpoint = Checkpoint(checkpoint_path(output_path), input_signature(penjualan_path, pembelian_path,
+                                                                 uom_factors=factors_digest(uom_factors)))
+start, state = checkpoint.start(resume, pairs=PairCollector(), matched_by_kode=0)
+pairs, matched_by_kode = state['pairs'], state['matched_by_kode']
+beli_kode = KodeIndex(kode_column(df_beli))
+beli_tanggal = day_keys(df_beli['Tanggal'])
+beli_satuan = df_beli['Satuan'].to_numpy()
+beli_satuan_dasar = df_beli['Satuan Dasar'].to_numpy()
+
+jual_tanggal_days = day_keys(df_penjualan['Tanggal'])
+jual_tanggal_labels = format_days(jual_tanggal_days)  # for the progress messages only
+jual_keys = zip(normalize_kode(kode_column(df_penjualan)), jual_ids, df_penjualan['Nama Barang'], jual_tanggal_days, jual_tanggal_labels, df_penjualan['Satuan'], df_penjualan['Satuan Dasar'])
+for idx, (jual_kode, jual_id, jual_nama, jual_tanggal, jual_label, jual_satuan, jual_satuan_dasar) in islice(enumerate(jual_keys), start, None):
     if idx % 50 == 0 or idx == len(df_penjualan) - 1:
         print(f"   > Processing row {idx + 1} of {len(df_penjualan)}")
 
-    jual_nama = jual_row['Nama Barang']
-    jual_tanggal = jual_row['Tanggal']
-    jual_satuan = jual_row['Satuan']
-
-    matching_beli = df_beli[
-        (df_beli['Tanggal'] == jual_tanggal) &
-        (df_beli['Satuan'] == jual_satuan) &
-        (df_beli['Nama Barang'].str.contains(jual_nama, na=False, regex=False))
-    ]
-
-    if matching_beli.empty:
-        print(f"     ⚠️  No match for: '{jual_nama}' on {jual_tanggal} [{jual_satuan}]")
-        row_data = {'Kode #': None}
-        row_data.update(jual_row.drop(['Tanggal', 'Nama Barang', 'Satuan']).add_suffix(' Jual'))
-        row_data.update({
-            'Tanggal': jual_tanggal,
-            'Nama Barang': jual_nama,
-            'Satuan': jual_satuan
-        })
-        merged_rows.append(row_data)
+    matching_beli = beli_kode.positions(jual_kode)
+    # Same unit, or the same base unit after conversion (a PCS sale of a CTN purchase)
+    matching_beli = matching_beli[same_day(beli_tanggal[matching_beli], jual_tanggal) &
+                                  ((beli_satuan[matching_beli] == jual_satuan) | (beli_satuan_dasar[matching_beli] == jual_satuan_dasar))]
+    if len(matching_beli) > 0:
+        matched_by_kode += 1
     else:
-        print(f"     ✅ {len(matching_beli)} match(es) found for: '{jual_nama}' on {jual_tanggal} [{jual_satuan}]")
-        for _, beli_row in matching_beli.iterrows():
-            row_data = {'Kode #': beli_row['Kode #']}
-            row_data.update(jual_row.drop(['Tanggal', 'Nama Barang', 'Satuan']).add_suffix(' Jual'))
-            row_data.update(beli_row.drop(['Tanggal', 'Nama Barang', 'Satuan', 'Kode #']).add_suffix(' Beli'))
-            row_data.update({
-                'Tanggal': jual_tanggal,
-                'Nama Barang': jual_nama,
-                'Satuan': jual_satuan
-            })
-            merged_rows.append(row_data)
+        matching_beli = np.flatnonzero(
+            same_day(beli_tanggal, jual_tanggal) &
+            ((beli_satuan == jual_satuan) | (beli_satuan_dasar == jual_satuan_dasar)) &
+            beli_names.mask(jual_id)
+        )
+
+    if len(matching_beli) == 0:
+        print(f"     ⚠️  No match for: '{jual_nama}' on {jual_label} [{jual_satuan}]")
+        pairs.add_unmatched(idx)
+    else:
+        print(f"     ✅ {len(matching_beli)} match(es) found for: '{jual_nama}' on {jual_label} [{jual_satuan}]")
+        pairs.add_matches(idx, matching_beli)
+
+    if checkpoint.due(idx + 1):
+        checkpoint.save(idx + 1, pairs=pairs, matched_by_kode=matched_by_kode)
+
+print(f"   🔑 Matched on Kode #: {matched_by_kode} of {len(df_penjualan)} rows")
 
 print("\n📦 STEP 4: Building final merged DataFrame...")
-df_merged = pd.DataFrame(merged_rows)
+jual_pos, beli_pos = pairs.arrays()
+match_policy = policy_from_env()
+if match_policy != 'all':
+    pair_count = len(beli_pos)
+    # Pairs may join across units (by Satuan Dasar), so price policies compare per base unit
+    jual_pos, beli_pos = apply_policy(jual_pos, beli_pos, match_policy, df_beli, price_col='@Harga Dasar')
+    print(f"   🎯 Match policy '{match_policy}': {pair_count} pairs reduced to {len(beli_pos)} rows")
+key_cols = ['Tanggal', 'Nama Barang', 'Satuan']
+df_merged = assemble([
+    take_rows(df_beli, beli_pos, ['Kode #']),
+    take_rows(df_penjualan, jual_pos, [col for col in df_penjualan.columns if col not in key_cols], ' Jual'),
+    take_rows(df_beli, beli_pos, [col for col in df_beli.columns if col not in key_cols + ['Kode #']], ' Beli'),
+    take_rows(df_penjualan, jual_pos, key_cols),
+])
+df_merged['Tanggal'] = format_dates(df_merged['Tanggal'])
 print(f"✅ Merged DataFrame created with {df_merged.shape[0]} rows.\n")
 
 print("🧾 STEP 5: Reordering columns...")
@@ -79,6 +125,6 @@ df_merged = df_merged[first_cols + other_cols]
 print("✅ Columns reordered with 'Kode #' as the first column.\n")
 
 print("💾 STEP 6: Exporting to Excel file...")
-output_path = "./MergedPenjualanPembelianReport2024_CHATGPT.xlsx"
 df_merged.to_excel(output_path, index=False)
+checkpoint.clear()
 print(f"✅ Done! File saved to: {output_path}")
@@ -1,9 +1,27 @@
 import pandas as pd
-import re
+import numpy as np
+import os
+import sys
+from itertools import islice
 from datetime import datetime
 import time
+from resultBuilder import PairCollector, take_rows, assemble
+from kodeJoin import normalize_kode, kode_column, KodeIndex
+from matchPolicy import policy_from_env, apply_policy
+from itemDictionary import ItemDictionary, ContainsIndex
+from checkpoint import Checkpoint, checkpoint_path, input_signature
+from dateKeys import parse_dates, day_keys, same_day, format_dates
+from uomEngine import learn_conversion_factors, normalize_quantities, shared_conversion_factors, factors_digest
+from runReport import RunReport
+import matchStats
+
+penjualan_path = "./BAEKMI/Penjualan2024.xlsx"
+pembelian_path = "./PembelianBuDian2024.xlsx"
+output_path = "./MergedPenjualanPembelianReport2024_DEEPSEEK.xlsx"
+resume = "--resume" in sys.argv  # continue after the last completed chunk of an interrupted run
 
 program_start_time = time.time()
+report = RunReport("merge_budian_rayyan")
 print("=== STARTING MERGE PROCESS ===")
 print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
@@ -12,23 +30,27 @@ print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 # =============================================================================
 print("STEP 1: Loading data files...")
 start_time = time.time()
+report.begin("load")
 
 try:
-    df_penjualan = pd.read_excel("./BAEKMI/Penjualan2024.xlsx")
-    df_beli = pd.read_excel("./PembelianBuDian2024.xlsx")
+    with matchStats.timed("safe_contains", "io"):
+        df_penjualan = pd.read_excel(penjualan_path)
+        df_beli = pd.read_excel(pembelian_path)
 
     print(f"Data loaded successfully. Penjualan: {len(df_penjualan)} rows, Pembelian: {len(df_beli)} rows")
 except Exception as e:
     print(f"ERROR loading files: {str(e)}")
     raise
 
+report.end(rows_out=len(df_penjualan) + len(df_beli))
 print(f"STEP 1 completed in {time.time() - start_time:.2f} seconds\n")
 
 # =============================================================================
 # STEP 2: Data Preprocessing
 # =============================================================================
-print("STEP 2: Preprocessing data (cleaning, date formatting)...")
+print("STEP 2: Preprocessing data (cleaning, date parsing)...")
 start_time = time.time()
+report.begin("preprocess", rows_in=len(df_penjualan) + len(df_beli))
 
 def preprocess_data(df_penjualan, df_beli):
     print("  - Cleaning whitespace and standardizing text columns...")
@@ -36,35 +58,40 @@ def preprocess_data(df_penjualan, df_beli):
         df_penjualan[col] = df_penjualan[col].astype(str).str.strip()
         df_beli[col] = df_beli[col].astype(str).str.strip()
     
-    print("  - Formatting dates to '02 Mar 2024' format...")
+    print("  - Parsing dates (formatted to '02 Mar 2024' only at export)...")
     for df, name in [(df_penjualan, "Penjualan"), (df_beli, "Pembelian")]:
-        df["Tanggal"] = pd.to_datetime(df["Tanggal"], errors='coerce')
+        df["Tanggal"] = parse_dates(df["Tanggal"])
         invalid_dates = df["Tanggal"].isna().sum()
         if invalid_dates > 0:
-            print(f"    Warning: {invalid_dates} invalid dates found in {name} data")
-        df["Tanggal"] = df["Tanggal"].dt.strftime("%d %b %Y").fillna("Unknown Date")
+            print(f"    Warning: {invalid_dates} invalid dates found in {name} data (never matched on date)")
+
+    print("  - Converting units to each item's base unit...")
+    uom_factors = shared_conversion_factors()
+    if uom_factors is None:
+        uom_factors = learn_conversion_factors(df_beli)
+    df_penjualan = normalize_quantities(df_penjualan, uom_factors)
+    df_beli = normalize_quantities(df_beli, uom_factors)
+    print(f"    {len(uom_factors)} item/unit conversion factors")
     
-    return df_penjualan, df_beli
+    return df_penjualan, df_beli, uom_factors
 
-df_penjualan, df_beli = preprocess_data(df_penjualan, df_beli)
+df_penjualan, df_beli, uom_factors = preprocess_data(df_penjualan, df_beli)
+report.end(rows_out=len(df_penjualan) + len(df_beli))
 print(f"STEP 2 completed in {time.time() - start_time:.2f} seconds\n")
 
 # =============================================================================
 # STEP 3: Partial Matching Setup
 # =============================================================================
-print("STEP 3: Setting up partial matching function...")
+print("STEP 3: Interning canonical item names for partial matching...")
 start_time = time.time()
 
-def safe_contains(haystack, needle):
-    """Case-sensitive partial matching that escapes regex special characters"""
-    try:
-        if pd.isna(needle) or pd.isna(haystack):
-            return False
-        escaped_needle = re.escape(str(needle))
-        return bool(re.search(escaped_needle, str(haystack)))
-    except Exception as e:
-        print(f"Warning: Matching error for '{needle}' vs '{haystack}': {str(e)}")
-        return False
+# Names are canonicalized once per distinct value (case, punctuation, whitespace, Unicode) and
+# matched as int32 item IDs; the substring test runs once per distinct sales name
+items = ItemDictionary.load()
+jual_ids = items.encode(df_penjualan["Nama Barang"])
+beli_names = ContainsIndex(items, items.encode(df_beli["Nama Barang"]))
+items.save()
+print(f"  {len(items)} canonical names in the item dictionary")
 
 print(f"STEP 3 completed in {time.time() - start_time:.2f} seconds\n")
 
@@ -73,47 +100,56 @@ print(f"STEP 3 completed in {time.time() - start_time:.2f} seconds\n")
 # =============================================================================
 print("STEP 4: Merging datasets (this may take time)...")
 start_time = time.time()
+report.begin("match", rows_in=len(df_penjualan))
 total_rows = len(df_penjualan)
-merged_rows = []
-match_counts = 0
-no_match_counts = 0
+checkpoint = Checkpoint(checkpoint_path(output_path), input_signature(penjualan_path, pembelian_path,
+                                                                 uom_factors=factors_digest(uom_factors)))
+start, state = checkpoint.start(resume, pairs=PairCollector(), match_counts=0, no_match_counts=0, kode_counts=0)
+pairs = state["pairs"]
+match_counts, no_match_counts, kode_counts = state["match_counts"], state["no_match_counts"], state["kode_counts"]
+beli_kode = KodeIndex(kode_column(df_beli))
+beli_tanggal = day_keys(df_beli["Tanggal"])
+beli_satuan = df_beli["Satuan"].to_numpy()
+beli_satuan_dasar = df_beli["Satuan Dasar"].to_numpy()
 
 print(f"  Processing {total_rows} sales records...")
-for i, (_, penjualan_row) in enumerate(df_penjualan.iterrows()):
+match_start = time.perf_counter()
+jual_keys = zip(normalize_kode(kode_column(df_penjualan)), jual_ids, df_penjualan["Nama Barang"], day_keys(df_penjualan["Tanggal"]), df_penjualan["Satuan"], df_penjualan["Satuan Dasar"])
+for i, (jual_kode, jual_id, jual_nama, jual_tanggal, jual_satuan, jual_satuan_dasar) in islice(enumerate(jual_keys), start, None):
     if i % 100 == 0 or i == total_rows - 1:
         print(f"  Processing row {i+1}/{total_rows} ({((i+1)/total_rows)*100:.1f}%)...")
     
-    # Find matching rows in df_beli
-    mask = (
-        (df_beli["Tanggal"] == penjualan_row["Tanggal"]) &
-        (df_beli["Satuan"] == penjualan_row["Satuan"]) &
-        df_beli["Nama Barang"].apply(
-            lambda x: safe_contains(x, penjualan_row["Nama Barang"])
+    # Exact Kode # on the same date and unit (or base unit) first
+    matches = beli_kode.positions(jual_kode)
+    same_unit = (beli_satuan[matches] == jual_satuan) | (beli_satuan_dasar[matches] == jual_satuan_dasar)
+    matches = matches[same_day(beli_tanggal[matches], jual_tanggal) & same_unit]
+    if len(matches) > 0:
+        kode_counts += 1
+    else:
+        # Find matching rows in df_beli
+        name_hits = beli_names.mask(jual_id)
+        mask = (
+            same_day(beli_tanggal, jual_tanggal) &
+            ((beli_satuan == jual_satuan) | (beli_satuan_dasar == jual_satuan_dasar)) &
+            name_hits
         )
-    )
-    matches = df_beli[mask]
+        matches = np.flatnonzero(mask)
+        if matchStats.enabled():
+            matchStats.record_row("safe_contains", jual_nama, len(df_beli), int(name_hits.sum()), len(matches))
     
-    if not matches.empty:
+    if len(matches) > 0:
         match_counts += 1
-        for _, match_row in matches.iterrows():
-            merged_row = {
-                "Kode #": match_row.get("Kode #", None),
-                **{f"{col} Jual": penjualan_row[col] for col in df_penjualan.columns},
-                **{f"{col} Beli": match_row[col] for col in df_beli.columns 
-                   if col not in ["Tanggal", "Nama Barang", "Satuan", "Kode #"]}
-            }
-            merged_rows.append(merged_row)
+        pairs.add_matches(i, matches)
     else:
         no_match_counts += 1
-        merged_row = {
-            "Kode #": None,
-            **{f"{col} Jual": penjualan_row[col] for col in df_penjualan.columns},
-            **{f"{col} Beli": None for col in df_beli.columns 
-               if col not in ["Tanggal", "Nama Barang", "Satuan", "Kode #"]}
-        }
-        merged_rows.append(merged_row)
-
-print(f"  Matching results: {match_counts} with matches, {no_match_counts} without matches")
+        pairs.add_unmatched(i)
+
+    if checkpoint.due(i + 1):
+        checkpoint.save(i + 1, pairs=pairs, match_counts=match_counts, no_match_counts=no_match_counts, kode_counts=kode_counts)
+
+print(f"  Matching results: {match_counts} with matches ({kode_counts} on Kode #), {no_match_counts} without matches")
+matchStats.record_seconds("safe_contains", "match", time.perf_counter() - match_start)
+report.end(rows_out=len(pairs))
 print(f"STEP 4 completed in {time.time() - start_time:.2f} seconds\n")
 
 # =============================================================================
@@ -121,8 +157,22 @@ print(f"STEP 4 completed in {time.time() - start_time:.2f} seconds\n")
 # =============================================================================
 print("STEP 5: Creating final merged DataFrame...")
 start_time = time.time()
-
-merged = pd.DataFrame(merged_rows)
+report.begin("assemble", rows_in=len(pairs))
+
+beli_value_cols = [col for col in df_beli.columns if col not in ["Tanggal", "Nama Barang", "Satuan", "Kode #"]]
+jual_pos, beli_pos = pairs.arrays()
+match_policy = policy_from_env()
+if match_policy != "all":
+    pair_count = len(beli_pos)
+    # Pairs may join across units (by Satuan Dasar), so price policies compare per base unit
+    jual_pos, beli_pos = apply_policy(jual_pos, beli_pos, match_policy, df_beli, price_col='@Harga Dasar')
+    print(f"  Match policy '{match_policy}': {pair_count} pairs reduced to {len(beli_pos)} rows")
+merged = assemble([
+    take_rows(df_beli, beli_pos, ["Kode #"]),
+    take_rows(df_penjualan, jual_pos, list(df_penjualan.columns), " Jual"),
+    take_rows(df_beli, beli_pos, beli_value_cols, " Beli"),
+])
+merged["Tanggal Jual"] = format_dates(merged["Tanggal Jual"], missing="Unknown Date")
 print(f"  Merged DataFrame created with {len(merged)} rows")
 
 # Reorder columns
@@ -138,6 +188,7 @@ columns_order = ["Kode #"] + \
 
 merged = merged[columns_order]
 print("  Columns reordered successfully")
+report.end(rows_out=len(merged))
 print(f"STEP 5 completed in {time.time() - start_time:.2f} seconds\n")
 
 # =============================================================================
@@ -145,16 +196,19 @@ print(f"STEP 5 completed in {time.time() - start_time:.2f} seconds\n")
 # =============================================================================
 print("STEP 6: Exporting to Excel...")
 start_time = time.time()
+report.begin("export", rows_in=len(merged))
 
-output_path = "./MergedPenjualanPembelianReport2024_DEEPSEEK.xlsx"
 try:
-    merged.to_excel(output_path, index=False)
+    with matchStats.timed("safe_contains", "io"):
+        merged.to_excel(output_path, index=False)
+    checkpoint.clear()
     print(f"  File saved successfully to {output_path}")
     print(f"  Final dimensions: {merged.shape[0]} rows x {merged.shape[1]} columns")
 except Exception as e:
     print(f"ERROR saving file: {str(e)}")
     raise
 
+report.end(rows_out=len(merged))
 print(f"STEP 6 completed in {time.time() - start_time:.2f} seconds\n")
 
 # =============================================================================
@@ -167,4 +221,9 @@ print(f"End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 print(f"Summary:")
 print(f"- Sales records processed: {total_rows}")
 print(f"- Records with matches: {match_counts} ({match_counts/total_rows:.1%})")
-print(f"- Records without matches: {no_match_counts} ({no_match_counts/total_rows:.1%})")
\ No newline at end of file
+print(f"- Records without matches: {no_match_counts} ({no_match_counts/total_rows:.1%})")
+
+report.extra["match_counts"] = match_counts
+report.extra["no_match_counts"] = no_match_counts
+matchStats.export(os.path.dirname(output_path), report)
+report.save(os.path.dirname(output_path))
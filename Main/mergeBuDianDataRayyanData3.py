@@ -1,9 +1,23 @@
 import pandas as pd
+import numpy as np
+import sys
+from itertools import islice
+from resultBuilder import PairCollector, take_rows, assemble
+from kodeJoin import normalize_kode, kode_column, KodeIndex
+from itemDictionary import ItemDictionary, ContainsIndex
+from checkpoint import Checkpoint, checkpoint_path, input_signature
+from dateKeys import parse_dates, day_keys, format_dates
+from uomEngine import learn_conversion_factors, normalize_quantities, shared_conversion_factors, factors_digest
+
+penjualan_path = "./BAEKMI/Penjualan2024.xlsx"
+pembelian_path = "./PembelianBuDian2024.xlsx"
+output_path = "./MergedDianRayyan2024.xlsx"
+resume = "--resume" in sys.argv  # continue after the last completed chunk of an interrupted run
 
 # Step 1: Read the files
 print("Reading sales and purchase files...")
-df_penjualan = pd.read_excel("./BAEKMI/Penjualan2024.xlsx")
-df_beli = pd.read_excel("./PembelianBuDian2024.xlsx")
+df_penjualan = pd.read_excel(penjualan_path)
+df_beli = pd.read_excel(pembelian_path)
 
 # Step 2: Trim whitespaces and enforce consistent format
 print("Cleaning whitespace and formatting columns...")
@@ -14,85 +28,81 @@ df_beli['Satuan'] = df_beli['Satuan'].astype(str).str.strip()
 
 # Convert 'Tanggal' to datetime
 print("Converting Tanggal to datetime format...")
-df_penjualan['Tanggal'] = pd.to_datetime(df_penjualan['Tanggal'])
-df_beli['Tanggal'] = pd.to_datetime(df_beli['Tanggal'])
-
-# Step 3: Prepare an empty list to collect merged rows
-merged_rows = []
+df_penjualan['Tanggal'] = parse_dates(df_penjualan['Tanggal'])
+df_beli['Tanggal'] = parse_dates(df_beli['Tanggal'])
+
+# Convert units to each item's base unit, so a PCS sale can match a CTN purchase
+print("Converting units to each item's base unit...")
+uom_factors = shared_conversion_factors()
+if uom_factors is None:
+    uom_factors = learn_conversion_factors(df_beli)
+df_penjualan = normalize_quantities(df_penjualan, uom_factors)
+df_beli = normalize_quantities(df_beli, uom_factors)
+
+# Intern canonical item names once; the partial name match runs on the int32 IDs
+items = ItemDictionary.load()
+jual_ids = items.encode(df_penjualan['Nama Barang'])
+beli_names = ContainsIndex(items, items.encode(df_beli['Nama Barang']))
+items.save()
+
+# Step 3: Prepare a collector for matched (sales, purchase) row positions, restored from the checkpoint with --resume
+checkpoint = Checkpoint(checkpoint_path(output_path), input_signature(penjualan_path, pembelian_path,
+                                                                 uom_factors=factors_digest(uom_factors)))
+start, state = checkpoint.start(resume, pairs=PairCollector(), matched_by_kode=0)
+pairs, matched_by_kode = state['pairs'], state['matched_by_kode']
 
 # Step 4: Iterate over penjualan rows to match
-print("Matching sales with purchases using partial Nama Barang match...")
-for idx, row_jual in df_penjualan.iterrows():
-    jual_nama = row_jual['Nama Barang']
-    jual_satuan = row_jual['Satuan']
-
-    # Filter df_beli by matching 'Satuan' and partial 'Nama Barang'
-    match_beli = df_beli[
-        (df_beli['Satuan'] == jual_satuan) &
-        (df_beli['Nama Barang'].str.contains(jual_nama, na=False, regex=False))
-    ]
-
-    if not match_beli.empty:
-        # Pick the latest purchase date (can be multiple rows if same date)
-        latest_date = match_beli['Tanggal'].max()
-        match_beli = match_beli[match_beli['Tanggal'] == latest_date]
-
-        for _, row_beli in match_beli.iterrows():
-            merged_row = {}
-
-            # Prioritize 'Kode #_Jual' then 'Kode #_Beli'
-            merged_row['Kode #_Jual'] = row_jual.get('Kode #')
-            merged_row['Kode #_Beli'] = row_beli.get('Kode #')
-
-            # Add Tanggal, Nama Barang, Satuan
-            merged_row['Tanggal'] = row_jual['Tanggal']
-            merged_row['Nama Barang'] = jual_nama
-            merged_row['Satuan'] = jual_satuan
-
-            # Add rest of penjualan columns with suffix 'Jual'
-            for col in df_penjualan.columns:
-                if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                    merged_row[f"{col}_Jual"] = row_jual[col]
-
-            # Add rest of pembelian columns with suffix 'Beli'
-            for col in df_beli.columns:
-                if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                    merged_row[f"{col}_Beli"] = row_beli[col]
+print("Matching sales with purchases on Kode #, then partial Nama Barang match...")
+beli_kode = KodeIndex(kode_column(df_beli))
+beli_satuan = df_beli['Satuan'].to_numpy()
+beli_satuan_dasar = df_beli['Satuan Dasar'].to_numpy()
+beli_tanggal = day_keys(df_beli['Tanggal'])
+jual_keys = zip(normalize_kode(kode_column(df_penjualan)), jual_ids, df_penjualan['Satuan'], df_penjualan['Satuan Dasar'])
+for idx, (jual_kode, jual_id, jual_satuan, jual_satuan_dasar) in islice(enumerate(jual_keys), start, None):
+    # Exact 'Kode #' with the same 'Satuan' (or the same base unit) first
+    match_beli = beli_kode.positions(jual_kode)
+    match_beli = match_beli[(beli_satuan[match_beli] == jual_satuan) | (beli_satuan_dasar[match_beli] == jual_satuan_dasar)]
+    if len(match_beli) > 0:
+        matched_by_kode += 1
+    else:
+        # Filter df_beli by matching 'Satuan' (raw or base unit) and partial 'Nama Barang'
+        match_beli = np.flatnonzero(((beli_satuan == jual_satuan) | (beli_satuan_dasar == jual_satuan_dasar)) & beli_names.mask(jual_id))
 
-            merged_rows.append(merged_row)
+    if len(match_beli) > 0:
+        # Pick the latest purchase date (can be multiple rows if same date)
+        match_dates = beli_tanggal[match_beli]
+        pairs.add_matches(idx, match_beli[match_dates == match_dates.max()])
     else:
         # No match: merge with empty beli data
-        merged_row = {}
-
-        merged_row['Kode #_Jual'] = row_jual.get('Kode #')
-        merged_row['Kode #_Beli'] = None
-        merged_row['Tanggal'] = row_jual['Tanggal']
-        merged_row['Nama Barang'] = jual_nama
-        merged_row['Satuan'] = jual_satuan
+        pairs.add_unmatched(idx)
 
-        for col in df_penjualan.columns:
-            if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                merged_row[f"{col}_Jual"] = row_jual[col]
-        for col in df_beli.columns:
-            if col not in ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']:
-                merged_row[f"{col}_Beli"] = None
+    if checkpoint.due(idx + 1):
+        checkpoint.save(idx + 1, pairs=pairs, matched_by_kode=matched_by_kode)
 
-        merged_rows.append(merged_row)
+print(f"Matched on Kode #: {matched_by_kode} of {len(df_penjualan)} sales rows")
 
 # Step 5: Create merged DataFrame
 print("Creating final merged DataFrame...")
-df_merged = pd.DataFrame(merged_rows)
+key_cols = ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']
+jual_pos, beli_pos = pairs.arrays()
+df_merged = assemble([
+    take_rows(df_penjualan, jual_pos, ['Kode #'], '_Jual'),
+    take_rows(df_beli, beli_pos, ['Kode #'], '_Beli'),
+    take_rows(df_penjualan, jual_pos, ['Tanggal', 'Nama Barang', 'Satuan']),
+    take_rows(df_penjualan, jual_pos, [col for col in df_penjualan.columns if col not in key_cols], '_Jual'),
+    take_rows(df_beli, beli_pos, [col for col in df_beli.columns if col not in key_cols], '_Beli'),
+])
 
 # Step 6: Sort by Tanggal then Nama Barang
 print("Sorting merged data by Tanggal and Nama Barang...")
 df_merged = df_merged.sort_values(by=['Tanggal', 'Nama Barang'], ascending=[True, True])
 
 # Step 7: Format Tanggal as 'DD Mon YYYY'
-df_merged['Tanggal'] = df_merged['Tanggal'].dt.strftime('%d %b %Y')
+df_merged['Tanggal'] = format_dates(df_merged['Tanggal'])
 
 # Step 8: Export to Excel
-output_path = "./MergedDianRayyan2024.xlsx"
 print(f"Exporting merged data to {output_path}...")
 df_merged.to_excel(output_path, index=False)
+checkpoint.clear()
 
 print("Done! Merged report saved.")
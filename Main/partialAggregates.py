@@ -0,0 +1,114 @@
+import pandas as pd
+import os
+import glob
+from profitKernel import safe_divide
+
+# Per-month partial aggregates for ALL_MONTHS_SUMMARY.xlsx. Each month stores sums and counts
+# (the sufficient statistics for the means), so months can be merged in any order and a new
+# month is folded in without reprocessing the others. Ratios such as 'Margin %' are not summable,
+# so only their numerator and denominator sums are stored and the ratio is taken in finalize().
+
+STORE_DIR = "./BAEKMI/_partials"
+
+# kind -> group keys, value columns (reported as 'sum' or 'mean'), ratios of two value sums in % and output renames
+SPECS = {
+    'hpp': {
+        'keys': ['Nama Barang'],
+        'values': {'@Harga': 'mean', '@Harga Beli': 'mean', 'Selisih HPP vs Harga Beli': 'mean', '% Selisih': 'mean'},
+        'rename': {},
+    },
+    'category': {
+        'keys': ['Nama Kategori Barang Barang & Jasa'],
+        'values': {'Penjualan': 'sum', 'Laba': 'sum', 'HPP': 'sum'},
+        'ratios': {'Margin %': ('Laba', 'Penjualan')},
+        'rename': {},
+    },
+    'supplier': {
+        'keys': ['Nama Pemasok Faktur Pembelian Beli'],
+        'values': {'@Harga Beli': 'mean', 'Kuantitas Beli': 'sum', 'Total Pembelian': 'sum'},
+        'rename': {
+            '@Harga Beli': 'Rata-rata Harga Beli',
+            'Kuantitas Beli': 'Total Kuantitas Dibeli',
+            'Total Pembelian': 'Total Nilai Pembelian',
+        },
+    },
+    'ppn': {
+        'keys': ['Nama Barang'],
+        'values': {'Total Harga': 'sum', 'PPN Penjualan': 'sum', 'PPN Pembelian': 'sum', 'PPN Terutang': 'sum'},
+        'rename': {},
+    },
+}
+
+
+def partial_aggregate(rows, kind):
+    """Group row-level data into '<col>__sum' and '<col>__count' columns for one kind"""
+    spec = SPECS[kind]
+    grouped = rows.groupby(spec['keys'])
+    parts = {}
+    for col in spec['values']:
+        parts[f"{col}__sum"] = grouped[col].sum()
+        parts[f"{col}__count"] = grouped[col].count()
+    return pd.DataFrame(parts).reset_index()
+
+
+def from_rollup(table, kind, dims, counts=None):
+    """Partial aggregate from an aggregateCube roll-up over dims (the cube's names for the kind's keys).
+
+    The roll-up already holds the sums; counts maps a 'mean' value to its cube count column (default 'Jumlah Baris').
+    """
+    spec = SPECS[kind]
+    parts = {key: table[dim].to_numpy() for key, dim in zip(spec['keys'], dims)}
+    for col in spec['values']:
+        parts[f"{col}__sum"] = table[col].to_numpy()
+        parts[f"{col}__count"] = table[(counts or {}).get(col, 'Jumlah Baris')].to_numpy()
+    return pd.DataFrame(parts)
+
+
+def merge_partials(partials, kind):
+    """Associative, order-independent merge of partial aggregates of the same kind"""
+    partials = [p for p in partials if p is not None and not p.empty]
+    if not partials:
+        return None
+    return pd.concat(partials, ignore_index=True).groupby(SPECS[kind]['keys']).sum().reset_index()
+
+
+def finalize(partial, kind):
+    """Turn a partial aggregate into the report table (means = sum / count, ratios = sum / sum * 100), rounded to 2 decimals"""
+    spec = SPECS[kind]
+    result = partial[spec['keys']].copy()
+    for col, how in spec['values'].items():
+        total = partial[f"{col}__sum"]
+        result[col] = total / partial[f"{col}__count"].where(partial[f"{col}__count"] != 0) if how == 'mean' else total
+    for col, (numerator, denominator) in spec.get('ratios', {}).items():
+        result[col] = safe_divide(partial[f"{numerator}__sum"], partial[f"{denominator}__sum"]) * 100
+    return result.rename(columns=spec['rename']).round(2)
+
+
+def _store_path(source_file, store_dir):
+    return os.path.join(store_dir, os.path.splitext(os.path.basename(source_file))[0] + ".pkl")
+
+
+def save_partials(source_file, partials, store_dir=STORE_DIR):
+    os.makedirs(store_dir, exist_ok=True)
+    pd.to_pickle({
+        'source': os.path.basename(source_file),
+        'source_mtime': os.path.getmtime(source_file),
+        'partials': partials,
+    }, _store_path(source_file, store_dir))
+
+
+def is_stale(source_file, store_dir=STORE_DIR):
+    """True when the source has no stored partials or changed since they were stored"""
+    path = _store_path(source_file, store_dir)
+    if not os.path.exists(path):
+        return True
+    return pd.read_pickle(path)['source_mtime'] < os.path.getmtime(source_file)
+
+
+def load_all(store_dir=STORE_DIR, source_files=None):
+    """Stored entries sorted by source file name (i.e. by month number), optionally only for source_files"""
+    entries = [pd.read_pickle(path) for path in glob.glob(os.path.join(store_dir, "*.pkl"))]
+    if source_files is not None:
+        wanted = {os.path.basename(f) for f in source_files}
+        entries = [e for e in entries if e['source'] in wanted]
+    return sorted(entries, key=lambda e: e['source'])
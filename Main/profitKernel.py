@@ -0,0 +1,90 @@
+import pandas as pd
+import numpy as np
+
+# One place for the margin math used by generateAllReport.py, generateAllReportFromMergePurchasing.py
+# and Lembur/main.py. Numeric columns are coerced once with coerce_numeric(); every metric below is a
+# vectorized NumPy expression over whole columns. Divisions by zero give NaN instead of inf.
+
+PPN_RATE = 0.11
+
+NUMERIC_COLUMNS = [
+    'Kuantitas', '@Harga', 'Total Harga', 'Penjualan', 'Laba', 'Diskon',
+    'Kuantitas Beli', '@Harga Beli', 'Total Harga Beli',
+    'Kuantitas_Jual', 'Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Beli',
+    'Kuantitas Dasar_Jual', '@Harga Dasar_Beli',
+]
+
+
+def coerce_numeric(df, columns=None):
+    """Convert the known numeric columns that are present to numbers once (invalid values become NaN)"""
+    for col in (columns or NUMERIC_COLUMNS):
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def safe_divide(numerator, denominator):
+    """Element-wise division where a zero or missing denominator gives NaN"""
+    num = np.asarray(numerator, dtype=float)
+    den = np.asarray(denominator, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(den != 0, num / den, np.nan)
+    if isinstance(numerator, pd.Series):
+        return pd.Series(result, index=numerator.index)
+    return result
+
+
+def unit_cost(penjualan, laba, kuantitas):
+    """HPP per unit = (Penjualan - Laba) / Kuantitas, rounded to 2 decimals; 0 when quantity is 0 or missing"""
+    return pd.Series(safe_divide(penjualan - laba, kuantitas), index=penjualan.index).round(2).fillna(0)
+
+
+def recalculated_profit(df, hpp=None):
+    """Monthly report columns: HPP from the latest purchase, and Laba recalculated from it.
+
+    hpp is an optional per-row cost from costingEngine (average or FIFO); rows it cannot cost keep the
+    latest-purchase HPP.
+    """
+    latest = df['@Harga Beli'] * df['Kuantitas Beli']
+    df['HPP'] = latest if hpp is None else pd.Series(np.asarray(hpp, dtype=float), index=df.index).fillna(latest)
+    df['Selisih HPP vs Harga Beli'] = df['HPP'] - df['@Harga Beli']
+    df['Hitung Ulang Laba'] = df['Penjualan'] - df['HPP'] - df['Diskon']
+    return df
+
+
+def selling_vs_purchase_price(df):
+    """Per-row difference between selling price and purchase price, absolute and in % of the purchase price"""
+    df['Selisih HPP vs Harga Beli'] = df['@Harga'] - df['@Harga Beli']
+    df['% Selisih'] = safe_divide(df['Selisih HPP vs Harga Beli'], df['@Harga Beli']) * 100
+    return df
+
+
+def hpp_detail(df):
+    """HPP at selling price vs at purchase price, and the Laba recalculated from the purchase price"""
+    df['HPP'] = df['Kuantitas'] * df['@Harga']
+    df['HPP Based on Purchase'] = df['Kuantitas'] * df['@Harga Beli']
+    df['Selisih HPP'] = df['HPP'] - df['HPP Based on Purchase']
+    df['Laba Recalculated'] = df['Penjualan'] - df['HPP Based on Purchase']
+    df['Selisih Laba'] = df['Laba Recalculated'] - df['Laba']
+    return df
+
+
+def category_margin(df):
+    """HPP implied by Penjualan - Laba, and the margin in % of Penjualan"""
+    df['HPP'] = df['Penjualan'] - df['Laba']
+    df['Margin %'] = safe_divide(df['Laba'], df['Penjualan']) * 100
+    return df
+
+
+def purchase_value(df):
+    df['Total Pembelian'] = df['@Harga Beli'] * df['Kuantitas Beli']
+    return df
+
+
+def ppn(df, rate=PPN_RATE):
+    """PPN on sales and purchases for rows flagged 'Ya', and the PPN owed"""
+    total = df['Total Harga'].to_numpy(dtype=float)
+    df['PPN Penjualan'] = np.where(df['Kena PPN'].to_numpy() == 'Ya', total * rate, 0.0)
+    df['PPN Pembelian'] = np.where(df['Kena PPN Beli'].to_numpy() == 'Ya', total * rate, 0.0)
+    df['PPN Terutang'] = df['PPN Penjualan'] - df['PPN Pembelian']
+    return df
@@ -0,0 +1,311 @@
+import pandas as pd
+import os
+import hashlib
+import argparse
+from datetime import datetime
+from uomEngine import FACTOR_COLUMNS, canonicalize_satuan, learn_conversion_factors
+from kodeJoin import normalize_kode
+from itemDictionary import canonicalize
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Out-of-core alternative to the row loops in Lembur/main.py and mergeBuDianDataRayyanData*.py.
+# Every export is cleaned once into Parquet; matching, merging and aggregation then run as
+# DuckDB queries that use all cores and spill to disk when the data does not fit in memory.
+
+KEY_COLS = ['Kode #', 'Tanggal', 'Nama Barang', 'Satuan']
+INTERNAL_COLS = ['row_id', 'nama_kanonik', 'Satuan Kanonik']
+EXCEL_MAX_ROWS = 1048575
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+def clean_accurate_export(df):
+    """Clean a raw Accurate export (header on row 3) the same way Lembur/main.py does"""
+    df = df.dropna(axis="columns", how="all")
+    df.columns = df.iloc[3]
+    df = df.drop(range(0, 4)).reset_index(drop=True)
+    df = df.loc[:, ~df.columns.isna()]
+    df.columns = df.columns.astype(str)
+
+    if 'Kode #' in df.columns:
+        df['Kode #'] = normalize_kode(df['Kode #'])
+    df['Nama Barang'] = df['Nama Barang'].astype(str).str.strip()
+    df['Satuan'] = df['Satuan'].astype(str).str.strip()
+    df['Satuan Kanonik'] = canonicalize_satuan(df['Satuan'])
+    df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='mixed', errors='coerce')
+    df = df[df['Tanggal'].notna()]
+
+    # Parquet needs one type per column: keep fully numeric columns numeric and the rest as text
+    for col in df.columns:
+        if col in KEY_COLS or df[col].dtype != object:
+            continue
+        numeric = pd.to_numeric(df[col], errors='coerce')
+        if numeric.notna().sum() == df[col].notna().sum():
+            df[col] = numeric
+        else:
+            df[col] = df[col].astype(str).where(df[col].notna(), None)
+    return df
+
+def ingest(xlsx_paths, work_dir, name):
+    """Clean each xlsx export once into Parquet, reusing the cache while the source is unchanged"""
+    os.makedirs(work_dir, exist_ok=True)
+    parquet_paths = []
+    for path in xlsx_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        # Same-named exports from different folders (e.g. one per year) must not share a cache file
+        path_hash = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:10]
+        parquet_path = os.path.join(work_dir, f"{name}__{stem}__{path_hash}.parquet")
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            log(f"Using cached {parquet_path}")
+        else:
+            log(f"Cleaning {path} -> {parquet_path}")
+            clean_accurate_export(pd.read_excel(path)).to_parquet(parquet_path, index=False)
+        parquet_paths.append(parquet_path)
+    return parquet_paths
+
+def connect(work_dir, memory_limit='4GB', threads=None):
+    if duckdb is None:
+        raise ImportError("The out-of-core backend needs duckdb and pyarrow (pip install duckdb pyarrow)")
+    con = duckdb.connect()
+    spill_dir = os.path.join(work_dir, "spill")
+    os.makedirs(spill_dir, exist_ok=True)
+    con.execute(f"SET temp_directory = {_literal(spill_dir)}")
+    con.execute(f"SET memory_limit = {_literal(memory_limit)}")
+    con.execute("SET preserve_insertion_order = false")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    return con
+
+def _quote(col):
+    return '"' + col.replace('"', '""') + '"'
+
+def _literal(value):
+    """SQL string literal; paths go through here since COPY ... TO and SET take no bound parameters"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _columns(con, relation):
+    return [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+
+def _scan(parquet_paths):
+    return f"read_parquet([{', '.join(_literal(p) for p in parquet_paths)}], union_by_name = true)"
+
+def register_uom_factors(con, beli_parquet):
+    """Learn conversion factors from the purchase history (three columns only) and expose them as a table"""
+    if '@Harga' in _columns(con, _scan(beli_parquet)):
+        history = con.execute(f'SELECT "Nama Barang", "Satuan", "@Harga" FROM {_scan(beli_parquet)}').df()
+        factors = learn_conversion_factors(history)
+    else:
+        log("⚠️ No '@Harga' in pembelian; units are compared without conversion")
+        factors = pd.DataFrame(columns=FACTOR_COLUMNS)
+    factors = factors.astype({'Nama Barang': str, 'Satuan': str, 'Satuan Dasar': str, 'Faktor Konversi': float})
+    con.register('uom_factors_df', factors)
+    con.execute("CREATE OR REPLACE TEMP TABLE uom_factors AS SELECT * FROM uom_factors_df")
+    log(f"Learned {len(factors)} item/unit conversion factors.")
+
+def register_source(con, name, parquet_paths):
+    """Materialize a cleaned source as a temp table (spillable) with a stable row id, base-unit columns
+    and the canonical item name (itemDictionary.canonicalize, computed once per distinct name)"""
+    cols = _columns(con, _scan(parquet_paths))
+    names = con.execute(f'SELECT DISTINCT "Nama Barang" FROM {_scan(parquet_paths)}').df()
+    names['nama_kanonik'] = canonicalize(names['Nama Barang'])
+    con.register(f'{name}_names_df', names)
+    base_qty = ('TRY_CAST(s."Kuantitas" AS DOUBLE) * coalesce(f."Faktor Konversi", 1.0) AS "Kuantitas Dasar",'
+                if 'Kuantitas' in cols else '')
+    base_price = ('TRY_CAST(s."@Harga" AS DOUBLE) / coalesce(f."Faktor Konversi", 1.0) AS "@Harga Dasar",'
+                  if '@Harga' in cols else '')
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE {name} AS
+        SELECT
+            row_number() OVER () AS row_id,
+            s.*,
+            coalesce(f."Satuan Dasar", s."Satuan Kanonik") AS "Satuan Dasar",
+            coalesce(f."Faktor Konversi", 1.0) AS "Faktor Konversi",
+            {base_qty}
+            {base_price}
+            n.nama_kanonik
+        FROM {_scan(parquet_paths)} s
+        LEFT JOIN uom_factors f
+          ON f."Nama Barang" = s."Nama Barang" AND f."Satuan" = s."Satuan Kanonik"
+        LEFT JOIN {name}_names_df n ON n."Nama Barang" = s."Nama Barang"
+    """)
+    log(f"Registered {name}: {con.execute(f'SELECT count(*) FROM {name}').fetchone()[0]} rows")
+
+def register_matches(con, match_by_kode=True):
+    """Same rule as Lembur/main.py: purchases with the same Kode # and a compatible Satuan (raw or base
+    unit) when there are any, else equal Satuan and a partial match of the canonical Nama Barang; then
+    the latest purchase at or before the sale's timestamp."""
+    # Two equi-joins unioned instead of one OR condition, so DuckDB can still hash join on the unit
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE name_hits AS
+        SELECT j.row_id AS jual_id, b.row_id AS beli_id
+        FROM jual j JOIN beli b ON b."Satuan" = j."Satuan"
+        WHERE j.nama_kanonik <> '' AND contains(b.nama_kanonik, j.nama_kanonik)
+        UNION
+        SELECT j.row_id, b.row_id
+        FROM jual j JOIN beli b ON b."Satuan Dasar" = j."Satuan Dasar"
+        WHERE j.nama_kanonik <> '' AND contains(b.nama_kanonik, j.nama_kanonik)
+    """)
+    if match_by_kode and all('Kode #' in _columns(con, name) for name in ['jual', 'beli']):
+        # '0' is what an empty code normalizes to (kodeJoin.usable)
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE kode_hits AS
+            SELECT j.row_id AS jual_id, b.row_id AS beli_id
+            FROM jual j JOIN beli b ON b."Kode #" = j."Kode #"
+            WHERE j."Kode #" <> '0' AND (b."Satuan" = j."Satuan" OR b."Satuan Dasar" = j."Satuan Dasar")
+        """)
+        log(f"Resolved by 'Kode #': {con.execute('SELECT count(DISTINCT jual_id) FROM kode_hits').fetchone()[0]} sales rows")
+    else:
+        con.execute("CREATE OR REPLACE TEMP TABLE kode_hits AS SELECT * FROM name_hits LIMIT 0")
+    # A sales row with a code hit never falls back to name matching
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE candidate_hits AS
+        SELECT * FROM kode_hits
+        UNION ALL
+        SELECT * FROM name_hits WHERE jual_id NOT IN (SELECT jual_id FROM kode_hits)
+    """)
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE best_match AS
+        SELECT jual_id, beli_id FROM (
+            SELECT h.jual_id, h.beli_id,
+                   row_number() OVER (PARTITION BY h.jual_id ORDER BY b."Tanggal" DESC, h.beli_id) AS rn
+            FROM candidate_hits h
+            JOIN jual j ON j.row_id = h.jual_id
+            JOIN beli b ON b.row_id = h.beli_id
+            WHERE b."Tanggal" <= j."Tanggal"
+        ) WHERE rn = 1
+    """)
+
+def build_merged_query(con):
+    """Lembur output layout: key columns, then *_Jual, then *_Beli, then HPP_Jual / HPP_Beli"""
+    jual_all, beli_all = _columns(con, "jual"), _columns(con, "beli")
+    jual_cols = [c for c in jual_all if c not in KEY_COLS + INTERNAL_COLS]
+    beli_cols = [c for c in beli_all if c not in KEY_COLS + INTERNAL_COLS]
+
+    def kode(alias, cols):
+        # Exports without Kode # still get the column, empty
+        return f'{alias}."Kode #"' if 'Kode #' in cols else 'NULL'
+
+    select = [
+        'j."Nama Barang" AS "Nama Barang"',
+        'j."Satuan" AS "Satuan"',
+        'j."Tanggal" AS "Tanggal_Jual"',
+        f'{kode("j", jual_all)} AS "Kode #_Jual"',
+    ]
+    select += [f"j.{_quote(c)} AS {_quote(c + '_Jual')}" for c in jual_cols]
+    select += [f'{kode("b", beli_all)} AS "Kode #_Beli"', 'b."Tanggal" AS "Tanggal_Beli"']
+    select += [f"b.{_quote(c)} AS {_quote(c + '_Beli')}" for c in beli_cols]
+
+    if all(c in jual_cols for c in ['Penjualan', 'Laba', 'Kuantitas']):
+        select.append('coalesce(round((j."Penjualan" - j."Laba") / nullif(j."Kuantitas", 0), 2), 0) AS "HPP_Jual"')
+    else:
+        log("⚠️ Missing columns for HPP_Jual")
+    if all(c in jual_cols for c in ['Penjualan', 'Laba']) and 'Kuantitas' in beli_cols:
+        select.append('coalesce(round((j."Penjualan" - j."Laba") / nullif(b."Kuantitas", 0), 2), 0) AS "HPP_Beli"')
+    else:
+        log("⚠️ Missing columns for HPP_Beli")
+    if 'Kuantitas Dasar' in jual_cols and '@Harga Dasar' in beli_cols:
+        select.append('coalesce(round(j."Kuantitas Dasar" * b."@Harga Dasar", 2), 0) AS "HPP_Satuan_Dasar"')
+
+    return "SELECT\n    " + ",\n    ".join(select) + """
+        FROM best_match m
+        JOIN jual j ON j.row_id = m.jual_id
+        JOIN beli b ON b.row_id = m.beli_id
+    """
+
+UNMATCHED_QUERY = """
+    SELECT
+        j."Nama Barang" AS "Nama Barang",
+        j."Satuan" AS "Satuan",
+        j."Tanggal" AS "Tanggal_Jual",
+        CASE WHEN j.row_id IN (SELECT jual_id FROM candidate_hits)
+             THEN 'No purchase before sale date'
+             ELSE 'No matching item found' END AS "Reason"
+    FROM jual j
+    WHERE j.row_id NOT IN (SELECT jual_id FROM best_match)
+"""
+
+def run_merge(con, output_dir):
+    """Match, merge and aggregate; results are streamed to Parquet without going through pandas"""
+    os.makedirs(output_dir, exist_ok=True)
+    merged_path = os.path.join(output_dir, "merged.parquet")
+    unmatched_path = os.path.join(output_dir, "unmatched.parquet")
+    summary_path = os.path.join(output_dir, "monthly_summary.parquet")
+
+    log("Matching sales with purchases...")
+    register_matches(con)
+
+    log("Writing merged rows...")
+    con.execute(f"CREATE OR REPLACE TEMP VIEW merged AS {build_merged_query(con)}")
+    con.execute(f"COPY (SELECT * FROM merged ORDER BY \"Tanggal_Jual\", \"Nama Barang\") TO {_literal(merged_path)} (FORMAT PARQUET)")
+    con.execute(f"COPY ({UNMATCHED_QUERY} ORDER BY \"Tanggal_Jual\", \"Nama Barang\") TO {_literal(unmatched_path)} (FORMAT PARQUET)")
+
+    log("Aggregating per month...")
+    merged_cols = _columns(con, "merged")
+    measures = [c for c in ['Penjualan_Jual', 'Laba_Jual', 'Kuantitas_Jual', 'HPP_Satuan_Dasar'] if c in merged_cols]
+    sums = "".join(f", sum(TRY_CAST({_quote(c)} AS DOUBLE)) AS {_quote('Total ' + c)}" for c in measures)
+    con.execute(f"""
+        COPY (
+            SELECT strftime("Tanggal_Jual", '%Y-%m') AS "Bulan", count(*) AS "Jumlah Baris"{sums}
+            FROM read_parquet({_literal(merged_path)})
+            GROUP BY 1
+            ORDER BY 1
+        ) TO {_literal(summary_path)} (FORMAT PARQUET)
+    """)
+
+    merged_rows = con.execute(f"SELECT count(*) FROM read_parquet({_literal(merged_path)})").fetchone()[0]
+    unmatched_rows = con.execute(f"SELECT count(*) FROM read_parquet({_literal(unmatched_path)})").fetchone()[0]
+    log(f"✔️ Merged rows: {merged_rows}")
+    log(f"❌ Unmatched rows: {unmatched_rows}")
+    return merged_path, unmatched_path, summary_path
+
+def export_excel(con, merged_path, unmatched_path, summary_path, output_file):
+    """Write the Lembur-style workbook when the result fits in a sheet; dates are formatted only here"""
+    merged_rows = con.execute(f"SELECT count(*) FROM read_parquet({_literal(merged_path)})").fetchone()[0]
+    if merged_rows > EXCEL_MAX_ROWS:
+        log(f"⚠️ {merged_rows} merged rows exceed the Excel sheet limit; keeping Parquet output only")
+        return None
+
+    def fetch(path):
+        df = con.execute(f"SELECT * FROM read_parquet({_literal(path)})").df()
+        for col in ['Tanggal_Jual', 'Tanggal_Beli']:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col]).dt.strftime('%d %b %Y')
+        return df
+
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        fetch(merged_path).to_excel(writer, sheet_name='Merged', index=False)
+        fetch(unmatched_path).to_excel(writer, sheet_name='Unmatched', index=False)
+        fetch(summary_path).to_excel(writer, sheet_name='Monthly Summary', index=False)
+    log(f"📄 Output saved to: {output_file}")
+    return output_file
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core sales/purchase merge on DuckDB")
+    parser.add_argument('--penjualan', nargs='+', required=True, help="Raw Accurate sales exports (xlsx)")
+    parser.add_argument('--pembelian', nargs='+', required=True, help="Raw Accurate purchase exports (xlsx)")
+    parser.add_argument('--work-dir', default="./_duckdb_work", help="Parquet cache and spill directory")
+    parser.add_argument('--output-dir', default="./_duckdb_output")
+    parser.add_argument('--output-file', default="MBUPembelianPenjualan_DuckDB.xlsx")
+    parser.add_argument('--memory-limit', default='4GB')
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    log("Ingesting exports...")
+    jual_parquet = ingest(args.penjualan, args.work_dir, "penjualan")
+    beli_parquet = ingest(args.pembelian, args.work_dir, "pembelian")
+
+    con = connect(args.work_dir, args.memory_limit, args.threads)
+    register_uom_factors(con, beli_parquet)
+    register_source(con, "jual", jual_parquet)
+    register_source(con, "beli", beli_parquet)
+
+    merged_path, unmatched_path, summary_path = run_merge(con, args.output_dir)
+    export_excel(con, merged_path, unmatched_path, summary_path, args.output_file)
+    log("Process completed successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import argparse
+import threading
+from glob import glob
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from aggregateCube import build_cube, rollup, months, UNKNOWN_SUPPLIER
+from topKLosses import load_rows, top_k_losses
+import partialAggregates
+
+# Long-running localhost service over the merged year data. The month files are loaded once into
+# the aggregate cube (categorical dimensions) plus a compact row table for top-k queries; requests
+# are answered from memory. A background thread polls the month files and reloads when they change.
+#
+#   python queryService.py --port 8765
+#   curl "http://127.0.0.1:8765/suppliers?month=03_maret"
+#
+# Endpoints (all return JSON):
+#   /status                               loaded months, row counts, last reload
+#   /suppliers?month=..                   total Laba per supplier (analyze_supplier_profits)
+#   /items?month=..&supplier=..           total Laba per item and supplier (export_item_profit_and_losses)
+#   /categories?month=..                  totals per category
+#   /losses?by=supplier&k=10&from=..&to=  k worst rows per supplier/category/month
+#   /match-rate?month=..                  share of sales rows with a known supplier
+#   /summary?kind=category                year totals from the stored partial aggregates (ALL_MONTHS_SUMMARY)
+# `month` may be repeated or comma-separated; omit it for the whole year.
+
+DEFAULT_PORT = 8765
+POLL_SECONDS = 5
+
+
+def _compact(rows):
+    """Store repeated text columns as categoricals (one copy of each distinct string)"""
+    for col in rows.columns:
+        if rows[col].dtype == object or pd.api.types.is_string_dtype(rows[col]):
+            rows[col] = rows[col].astype('category')
+    return rows
+
+
+def _records(df):
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return json.loads(df.to_json(orient='records', double_precision=2))
+
+
+class Dataset:
+    """Snapshot of the merged data; replaced as a whole on reload so readers never see a partial state"""
+
+    def __init__(self, directory):
+        start = time.perf_counter()
+        self.directory = directory
+        self.signature = source_signature(directory)
+        self.cube = build_cube(directory)
+        rows = load_rows(directory)
+        self.rows = _compact(rows) if rows is not None else None
+        self.partials = partialAggregates.load_all(os.path.join(directory, "_partials"))
+        self.loaded_at = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.load_seconds = round(time.perf_counter() - start, 3)
+
+
+def source_signature(directory):
+    """Names and mtimes of the month files and of the stored partials (/summary reads the latter)"""
+    files = glob(os.path.join(directory, "*_merge_*.xlsx")) + glob(os.path.join(directory, "_partials", "*.pkl"))
+    return sorted((os.path.relpath(f, directory), os.path.getmtime(f)) for f in files)
+
+
+def _months_arg(params):
+    values = [m for v in params.get('month', []) for m in v.split(',') if m]
+    return values or None
+
+
+def query(dataset, path, params):
+    """Answer one request from the in-memory dataset; returns a JSON-serializable object"""
+    cube = dataset.cube
+    if path == '/status':
+        return {
+            'directory': dataset.directory,
+            'months': months(cube) if cube is not None else [],
+            'cube_rows': 0 if cube is None else len(cube),
+            'rows': 0 if dataset.rows is None else len(dataset.rows),
+            'loaded_at': dataset.loaded_at,
+            'load_seconds': dataset.load_seconds,
+        }
+    if cube is None:
+        raise LookupError("No merged files loaded")
+
+    month_filter = _months_arg(params)
+    if path == '/suppliers':
+        return _records(rollup(cube, ['Pemasok'], months=month_filter)[['Pemasok', 'Laba', 'Jumlah Rugi']])
+    if path == '/items':
+        result = rollup(cube, ['Nama Barang', 'Pemasok'], months=month_filter)
+        if 'supplier' in params:
+            result = result[result['Pemasok'] == params['supplier'][0]]
+        return _records(result[['Nama Barang', 'Pemasok', 'Laba', 'Kuantitas', 'Jumlah Rugi']])
+    if path == '/categories':
+        return _records(rollup(cube, ['Kategori'], months=month_filter))
+    if path == '/losses':
+        if dataset.rows is None:
+            raise LookupError("No merged rows loaded")
+        result = top_k_losses(
+            dataset.rows,
+            by=params.get('by', ['supplier'])[0],
+            k=int(params.get('k', ['10'])[0]),
+            start=params.get('from', [None])[0],
+            end=params.get('to', [None])[0],
+            months=month_filter,
+            losses_only=params.get('include_profit', ['0'])[0] != '1',
+        )
+        return _records(result)
+    if path == '/match-rate':
+        per_month = rollup(cube, ['Bulan', 'Pemasok'], months=month_filter, sort_by=None)
+        per_month['Cocok'] = np.where(per_month['Pemasok'] == UNKNOWN_SUPPLIER, 0, per_month['Jumlah Baris'])
+        rate = per_month.groupby('Bulan')[['Cocok', 'Jumlah Baris']].sum().reset_index()
+        rate['Match Rate'] = (rate['Cocok'] / rate['Jumlah Baris']).round(4)
+        return _records(rate)
+    if path == '/summary':
+        kind = params.get('kind', ['category'])[0]
+        if kind not in partialAggregates.SPECS:
+            raise KeyError(f"Unknown summary kind: {kind}")
+        merged = partialAggregates.merge_partials([e['partials'].get(kind) for e in dataset.partials], kind)
+        if merged is None:
+            raise LookupError(f"No stored partials for {kind}")
+        return _records(partialAggregates.finalize(merged, kind))
+    raise LookupError(f"Unknown endpoint: {path}")
+
+
+class QueryService:
+    def __init__(self, directory="./BAEKMI", poll_seconds=POLL_SECONDS):
+        self.directory = directory
+        self.poll_seconds = poll_seconds
+        self.dataset = Dataset(directory)
+        self._stop = threading.Event()
+
+    def reload_if_changed(self):
+        if source_signature(self.directory) != self.dataset.signature:
+            print("Month files changed, reloading...")
+            self.dataset = Dataset(self.directory)
+            print(f"Reloaded in {self.dataset.load_seconds}s")
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                print(f"Reload failed, keeping previous data: {e}")
+
+    def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                start = time.perf_counter()
+                try:
+                    body, status = query(service.dataset, url.path, parse_qs(url.query)), 200
+                except (KeyError, ValueError) as e:
+                    body, status = {'error': str(e)}, 400
+                except LookupError as e:
+                    body, status = {'error': str(e)}, 404
+                except Exception as e:
+                    # Anything else is a server-side failure; answer with JSON instead of dropping the connection
+                    print(f"Error answering {self.path}: {type(e).__name__}: {e}")
+                    body, status = {'error': f"{type(e).__name__}: {e}"}, 500
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.send_header('X-Query-Ms', f"{(time.perf_counter() - start) * 1000:.2f}")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._watch, daemon=True).start()
+        print(f"Serving {self.directory} on http://{host}:{port} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident query service for the merged month files")
+    parser.add_argument("--directory", default="./BAEKMI")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between change checks")
+    args = parser.parse_args()
+    QueryService(args.directory, args.poll).serve(port=args.port)
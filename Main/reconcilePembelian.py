@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+import os
+import argparse
+from datetime import datetime
+from uomEngine import canonicalize_satuan
+from kodeJoin import normalize_kode, usable
+from queryBackend import clean_accurate_export
+
+# Reconciliation of Bu Dian's ground-truth purchases (PembelianBuDian2024.xlsx) against the Accurate
+# purchase export. Lines with a code are collapsed to one line per (Kode #, day, canonical Satuan) and
+# joined with a single hash join; lines without a usable code stay one row each. Only lines left over on
+# both sides go through the name fallback, which is again a hash join on (day, Satuan) followed by a
+# substring check on the few candidate pairs.
+#
+#   python reconcilePembelian.py --accurate "./12 Desember/Pembelian per Barang hingga Desember.xlsx"
+
+KEYS = ['Kode', 'Hari', 'Satuan Kanonik']
+QTY_TOLERANCE = 1e-6
+PRICE_TOLERANCE = 0.5   # Rupiah; prices are averaged per key, so allow rounding noise
+
+STATUS_SAME = 'Sama'
+STATUS_QTY = 'Beda Kuantitas'
+STATUS_PRICE = 'Beda Harga'
+STATUS_BOTH = 'Beda Kuantitas & Harga'
+STATUS_ONLY_BUDIAN = 'Hanya Bu Dian'
+STATUS_ONLY_ACCURATE = 'Hanya Accurate'
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def prepare(df, source):
+    """Normalized join keys plus numeric Kuantitas/@Harga for one side"""
+    out = pd.DataFrame({
+        'Kode': normalize_kode(df['Kode #']),
+        'Hari': pd.to_datetime(df['Tanggal'], errors='coerce').dt.normalize(),
+        'Satuan Kanonik': canonicalize_satuan(df['Satuan']),
+        'Nama Barang': df['Nama Barang'].astype(str).str.strip(),
+        'Kuantitas': pd.to_numeric(df['Kuantitas'], errors='coerce') if 'Kuantitas' in df.columns else np.nan,
+        '@Harga': pd.to_numeric(df['@Harga'], errors='coerce') if '@Harga' in df.columns else np.nan,
+    })
+    out = out[out['Hari'].notna()]
+    out['Nilai'] = out['Kuantitas'] * out['@Harga']
+    log(f"{source}: {len(out)} purchase lines")
+    return out
+
+
+def collapse(lines):
+    """One row per key for lines with a usable code: summed quantity/value, value-weighted price, and the
+    line count. Lines without a code keep one row each (the key would lump different items together)."""
+    has_code = lines['Kode'].map(usable).to_numpy(dtype=bool)
+    grouped = lines[has_code].groupby(KEYS, sort=False)
+    result = grouped.agg(
+        **{'Nama Barang': ('Nama Barang', 'first'), 'Kuantitas': ('Kuantitas', 'sum'),
+           'Nilai': ('Nilai', 'sum'), 'Jumlah Baris': ('Nama Barang', 'size')}
+    ).reset_index()
+    uncoded = lines.loc[~has_code, KEYS + ['Nama Barang', 'Kuantitas', 'Nilai']].assign(**{'Jumlah Baris': 1})
+    uncoded['Kode'] = None
+    result = pd.concat([result, uncoded], ignore_index=True)
+    result['@Harga'] = result['Nilai'] / result['Kuantitas'].where(result['Kuantitas'] != 0)
+    return result
+
+
+def _status(qty_a, qty_b, price_a, price_b):
+    qty_diff = ~np.isclose(qty_a, qty_b, atol=QTY_TOLERANCE, equal_nan=True)
+    price_diff = ~np.isclose(price_a, price_b, atol=PRICE_TOLERANCE, equal_nan=True)
+    return np.select([qty_diff & price_diff, qty_diff, price_diff], [STATUS_BOTH, STATUS_QTY, STATUS_PRICE], STATUS_SAME)
+
+
+def name_fallback(only_budian, only_accurate):
+    """Pair leftover lines on the same day and unit whose names contain one another (one-to-one)"""
+    if only_budian.empty or only_accurate.empty:
+        return pd.DataFrame()
+    candidates = only_budian.reset_index().merge(
+        only_accurate.reset_index(), on=['Hari', 'Satuan Kanonik'], suffixes=(' Bu Dian', ' Accurate')
+    )
+    if candidates.empty:
+        return candidates
+    a = candidates['Nama Barang Bu Dian'].str.lower().to_numpy()
+    b = candidates['Nama Barang Accurate'].str.lower().to_numpy()
+    contains = np.fromiter((x in y or y in x for x, y in zip(a, b)), dtype=bool, count=len(candidates))
+    candidates = candidates[contains]
+
+    # Closest quantity first, then keep each line at most once per side
+    candidates = candidates.assign(_gap=(candidates['Kuantitas Bu Dian'] - candidates['Kuantitas Accurate']).abs())
+    candidates = candidates.sort_values('_gap', kind='stable')
+    candidates = candidates.drop_duplicates('index Bu Dian').drop_duplicates('index Accurate')
+    return candidates.drop(columns='_gap')
+
+
+def reconcile(df_budian, df_accurate):
+    """Compare the two purchase sources; returns the detail table and a status summary"""
+    budian = collapse(prepare(df_budian, "Bu Dian"))
+    accurate = collapse(prepare(df_accurate, "Accurate"))
+
+    log("Hash join on Kode # + Tanggal + Satuan...")
+    # Lines without a code never match by code (pandas would join missing keys with each other)
+    by_code = budian[budian['Kode'].notna()].merge(accurate, on=KEYS, suffixes=(' Bu Dian', ' Accurate'))
+    by_code['Dasar Pencocokan'] = 'Kode'
+
+    matched_keys = by_code.set_index(KEYS).index
+    leftover_budian = budian[~budian.set_index(KEYS).index.isin(matched_keys)]
+    leftover_accurate = accurate[~accurate.set_index(KEYS).index.isin(matched_keys)]
+    log(f"Matched by code: {len(by_code)}; name fallback on {len(leftover_budian)} x {len(leftover_accurate)} leftover lines")
+
+    by_name = name_fallback(leftover_budian, leftover_accurate)
+    if not by_name.empty:
+        by_name['Dasar Pencocokan'] = 'Nama'
+        by_name['Kode'] = by_name['Kode Bu Dian'].fillna(by_name['Kode Accurate'])
+        used_budian = set(by_name['index Bu Dian'])
+        used_accurate = set(by_name['index Accurate'])
+    else:
+        used_budian = used_accurate = set()
+
+    columns = ['Kode', 'Hari', 'Satuan Kanonik', 'Dasar Pencocokan',
+               'Nama Barang Bu Dian', 'Nama Barang Accurate',
+               'Kuantitas Bu Dian', 'Kuantitas Accurate', '@Harga Bu Dian', '@Harga Accurate',
+               'Jumlah Baris Bu Dian', 'Jumlah Baris Accurate']
+    matched = pd.concat([by_code, by_name], ignore_index=True).reindex(columns=columns)
+    matched['Status'] = _status(matched['Kuantitas Bu Dian'].to_numpy(dtype=float), matched['Kuantitas Accurate'].to_numpy(dtype=float),
+                                matched['@Harga Bu Dian'].to_numpy(dtype=float), matched['@Harga Accurate'].to_numpy(dtype=float))
+
+    only_budian = leftover_budian.drop(index=list(used_budian)).add_suffix(' Bu Dian').rename(
+        columns={'Kode Bu Dian': 'Kode', 'Hari Bu Dian': 'Hari', 'Satuan Kanonik Bu Dian': 'Satuan Kanonik'})
+    only_budian['Status'] = STATUS_ONLY_BUDIAN
+    only_accurate = leftover_accurate.drop(index=list(used_accurate)).add_suffix(' Accurate').rename(
+        columns={'Kode Accurate': 'Kode', 'Hari Accurate': 'Hari', 'Satuan Kanonik Accurate': 'Satuan Kanonik'})
+    only_accurate['Status'] = STATUS_ONLY_ACCURATE
+
+    detail = pd.concat([matched, only_budian, only_accurate], ignore_index=True).reindex(columns=columns + ['Status'])
+    detail['Selisih Kuantitas'] = detail['Kuantitas Accurate'] - detail['Kuantitas Bu Dian']
+    detail['Selisih @Harga'] = (detail['@Harga Accurate'] - detail['@Harga Bu Dian']).round(2)
+    detail = detail.sort_values(['Hari', 'Kode'], kind='stable').reset_index(drop=True)
+
+    summary = detail.groupby(['Status', 'Dasar Pencocokan'], dropna=False).size().rename('Jumlah').reset_index()
+    return detail, summary
+
+
+def export(detail, summary, output_file):
+    """Summary sheet, the lines that differ, and the full detail; dates formatted only here"""
+    detail = detail.copy()
+    detail['Hari'] = detail['Hari'].dt.strftime('%d %b %Y')
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        summary.to_excel(writer, sheet_name='Summary', index=False)
+        detail[detail['Status'] != STATUS_SAME].to_excel(writer, sheet_name='Selisih', index=False)
+        detail.to_excel(writer, sheet_name='Detail', index=False)
+    log(f"📄 Output saved to: {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile Bu Dian's purchases with the Accurate purchase export")
+    parser.add_argument('--budian', default="./PembelianBuDian2024.xlsx", help="Cleaned Bu Dian purchases")
+    parser.add_argument('--accurate', nargs='+', required=True, help="Raw Accurate 'Pembelian per Barang' export(s)")
+    parser.add_argument('--output-dir', default="./BAEKMI")
+    args = parser.parse_args()
+
+    df_budian = pd.read_excel(args.budian)
+    df_accurate = pd.concat([clean_accurate_export(pd.read_excel(p)) for p in args.accurate], ignore_index=True)
+
+    detail, summary = reconcile(df_budian, df_accurate)
+    print(summary.to_string(index=False))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+    export(detail, summary, os.path.join(args.output_dir, f"rekonsiliasi_pembelian_{timestamp}.xlsx"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import pandas as pd
+import numpy as np
+
+# The merge loops used to build one dict (often via Series.drop().add_suffix()) per output row.
+# They now record only row positions here, and the suffixed output columns are assembled once
+# at the end with vectorized takes.
+
+NO_MATCH = -1
+
+
+class PairCollector:
+    """Collects (sales position, purchase position) pairs; NO_MATCH marks a sale without a purchase"""
+
+    def __init__(self):
+        self.jual_pos = []
+        self.beli_pos = []
+
+    def add_matches(self, jual_pos, beli_positions):
+        self.jual_pos.extend([jual_pos] * len(beli_positions))
+        self.beli_pos.extend(beli_positions)
+
+    def add_unmatched(self, jual_pos):
+        self.jual_pos.append(jual_pos)
+        self.beli_pos.append(NO_MATCH)
+
+    def __len__(self):
+        return len(self.jual_pos)
+
+    def arrays(self):
+        return np.asarray(self.jual_pos, dtype=np.int64), np.asarray(self.beli_pos, dtype=np.int64)
+
+
+def take_rows(df, positions, columns, suffix='', missing=None):
+    """Gather `columns` of `df` at integer `positions` (NO_MATCH gives an empty row) and suffix the names.
+
+    Columns not present in `df` are filled with `missing`, like `row.get(col, missing)` did.
+    """
+    present = [col for col in columns if col in df.columns]
+    # Reindexing a RangeIndex frame by positions is a single take per column; -1 is not a label, so it becomes NaN
+    part = df[present].reset_index(drop=True).reindex(positions)
+    part.index = pd.RangeIndex(len(positions))
+    for col in columns:
+        if col not in df.columns:
+            part[col] = missing
+    return part[columns].add_suffix(suffix)
+
+
+def assemble(parts):
+    """Glue column blocks produced by take_rows side by side"""
+    return pd.concat(parts, axis=1)
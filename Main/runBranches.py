@@ -0,0 +1,219 @@
+import pandas as pd
+import os
+import re
+import time
+import argparse
+from glob import glob
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Multi-branch batch run. Every branch root has the single-store layout (BAEKMI/, "NN Bulan/" month
+# folders); the monthly pipeline (clean -> supplier match -> purchase match -> analysis report ->
+# Laba/Rugi reports) runs for all branches on a bounded process pool, one branch per worker.
+#
+# Shared artifacts are built once before the pool starts:
+#   - the UOM conversion factors learned over all branches' purchases (uomEngine, MBU_UOM_FACTORS), read
+#     by every worker's clean stage
+#   - the canonical item dictionary over all branches' item names (itemDictionary), used only by the
+#     consolidation below to line up the same product across branches; the branch stages do not read it
+# Each branch keeps its own outputs and a branch_run.log in its BAEKMI folder; a consolidated workbook
+# (per branch, per supplier, per canonical item) is written to the output directory.
+#
+#   python runBranches.py ./Cabang_A ./Cabang_B ./Cabang_C --workers 3 --output-dir ./KONSOLIDASI
+
+SHARED_DIR = "./_shared_catalogs"
+LOG_FILE = "branch_run.log"
+_MONTH_DIR = re.compile(r'^(\d{2}) (\w+)$')
+_PENJUALAN = re.compile(r'^(\d{2}) penjualan (\w+)\.xlsx$', re.IGNORECASE)
+
+
+def branch_name(root):
+    return os.path.basename(os.path.normpath(os.path.abspath(root)))
+
+
+def discover_months(root):
+    """(number, month) pairs of a branch, from its month folders and its monthly sales files"""
+    months = {}
+    for path in glob(os.path.join(root, '[0-9][0-9] *')):
+        match = _MONTH_DIR.match(os.path.basename(path))
+        if match and os.path.isdir(path):
+            months[match.group(1)] = match.group(2)
+    for path in glob(os.path.join(root, 'BAEKMI', '*.xlsx')):
+        match = _PENJUALAN.match(os.path.basename(path))
+        if match:
+            months.setdefault(match.group(1), match.group(2))
+    return sorted(months.items())
+
+
+def branch_jobs(root):
+    """The pipeline for one branch in order: each stage per month, then the directory-level reports"""
+    jobs = []
+    for number, month in discover_months(root):
+        if os.path.isdir(os.path.join(root, f"{number} {month}")):
+            jobs.append(('clean', number, month))
+        jobs += [(stage, number, month.lower()) for stage in ('supplier_match', 'purchase_match', 'report')]
+    jobs.append(('month_reports', None, None))
+    return jobs
+
+
+def _raw_pembelian(path):
+    """Item, unit and price columns of a raw Accurate purchase export"""
+    from costingEngine import read_purchase_export
+    from uomEngine import canonicalize_satuan
+    df = read_purchase_export(path)[['Nama Barang', 'Satuan', '@Harga']].copy()
+    df['Satuan'] = canonicalize_satuan(df['Satuan'])
+    return df
+
+
+def build_shared_catalogs(roots, shared_dir=SHARED_DIR):
+    """Item dictionary over every branch's item names and UOM factors over every branch's purchases"""
+    from itemDictionary import ItemDictionary
+    from costingEngine import latest_purchase_export
+    from uomEngine import learn_conversion_factors, save_conversion_factors
+
+    os.makedirs(shared_dir, exist_ok=True)
+    dictionary_path = os.path.join(shared_dir, "item_dictionary.json")
+    factor_path = os.path.join(shared_dir, "faktor konversi satuan.xlsx")
+    items = ItemDictionary.load(dictionary_path)
+    purchases = []
+
+    for root in roots:
+        for path in sorted(glob(os.path.join(root, 'BAEKMI', '[0-9][0-9] *.xlsx'))):
+            name = os.path.basename(path).lower()
+            if ' penjualan ' in name or ' supplier ' in name:
+                items.encode(pd.read_excel(path, usecols=lambda c: c == 'Nama Barang').get('Nama Barang', []))
+        # "Pembelian per Barang hingga <Bulan>" is cumulative, so the latest month holds the full history
+        latest_export = latest_purchase_export(root)
+        if latest_export:
+            try:
+                df = _raw_pembelian(latest_export)
+                items.encode(df['Nama Barang'])
+                purchases.append(df)
+            except Exception as e:
+                print(f"Could not read purchases of {branch_name(root)}: {e}")
+
+    items.save(dictionary_path)
+    print(f"Shared item dictionary: {len(items)} canonical names -> {dictionary_path}")
+    if not purchases:
+        return dictionary_path, None
+    save_conversion_factors(learn_conversion_factors(pd.concat(purchases, ignore_index=True)), factor_path)
+    return dictionary_path, factor_path
+
+
+def run_branch(root):
+    """Worker process entry point: the whole pipeline for one branch; returns per-stage status"""
+    from watchPipeline import run_job
+    from runReport import RunReport
+
+    root = os.path.abspath(root)
+    os.chdir(root)  # the stage scripts use paths relative to the branch root
+    os.makedirs('BAEKMI', exist_ok=True)
+    results = []
+    with open(os.path.join('BAEKMI', LOG_FILE), 'w', encoding='utf-8') as log_file, redirect_stdout(log_file):
+        report = RunReport(f"branch_{branch_name(root)}")
+        for job in branch_jobs('.'):
+            stage, number, month = job
+            start = time.perf_counter()
+            try:
+                with report.stage(stage, month=None if number is None else f"{number}_{month}"):
+                    status = 'ok' if run_job(job, '.') is not None else 'skipped'
+            except Exception as e:
+                print(f"Error in {stage} {number or ''} {month or ''}: {e}")
+                status = 'error'
+            results.append({'stage': stage, 'month': None if number is None else f"{number}_{month}",
+                            'status': status, 'seconds': round(time.perf_counter() - start, 3)})
+        report.save('BAEKMI')
+    return results
+
+
+def consolidate(roots, output_dir, dictionary_path):
+    """Per-branch cubes side by side: totals per branch, per supplier and per canonical item"""
+    from aggregateCube import build_cube, rollup
+    from itemDictionary import ItemDictionary
+
+    items = ItemDictionary.load(dictionary_path)
+    frames = []
+    for root in roots:
+        cube = build_cube(os.path.join(root, 'BAEKMI'))
+        if cube is None:
+            continue
+        rows = rollup(cube, ['Pemasok', 'Nama Barang'], sort_by=None)
+        rows.insert(0, 'Cabang', branch_name(root))
+        # Item IDs from the shared dictionary line up the same product across branches
+        rows['ID Barang'] = items.encode(rows['Nama Barang'], add=False)
+        frames.append(rows)
+    if not frames:
+        print("No branch produced merged data to consolidate")
+        return None
+
+    rows = pd.concat(frames, ignore_index=True)
+    per_branch = rows.groupby('Cabang', sort=True)[['Laba', 'Penjualan', 'Jumlah Baris', 'Jumlah Rugi']].sum().reset_index()
+    per_supplier = rows.pivot_table(index='Pemasok', columns='Cabang', values='Laba', aggfunc='sum', fill_value=0)
+    per_supplier['Total'] = per_supplier.sum(axis=1)
+    per_supplier = per_supplier.sort_values('Total').reset_index()
+    known = rows[rows['ID Barang'] >= 0]
+    per_item = known.pivot_table(index='ID Barang', columns='Cabang', values='Laba', aggfunc='sum', fill_value=0)
+    per_item['Total'] = per_item.sum(axis=1)
+    per_item = per_item.sort_values('Total').reset_index()
+    per_item.insert(1, 'Nama Barang (kanonik)', items.decode(per_item['ID Barang'].to_numpy()))
+    per_item.columns.name = per_supplier.columns.name = None
+
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(output_dir, f"konsolidasi_cabang_{timestamp}.xlsx")
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        for sheet_name, df in [('Laba per Cabang', per_branch), ('Laba per Pemasok', per_supplier), ('Laba per Barang', per_item)]:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+            for i, col in enumerate(df.columns):
+                max_len = max(df[col].astype(str).map(len).max(), len(str(col)))
+                worksheet.set_column(i, i, max_len + 2)
+    print(f"Consolidated report saved to: {output_file}")
+    return output_file
+
+
+def run_branches(roots, workers=None, output_dir=".", shared_dir=SHARED_DIR):
+    roots = [os.path.abspath(r) for r in roots]
+    dictionary_path, factor_path = build_shared_catalogs(roots, os.path.abspath(shared_dir))
+    # Workers inherit the environment, so every branch cleans with the same UOM factors
+    if factor_path is not None:
+        os.environ['MBU_UOM_FACTORS'] = factor_path
+
+    results = {}
+    workers = min(workers or os.cpu_count() or 1, len(roots))
+    print(f"Running {len(roots)} branches on {workers} worker(s)...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_branch, root): root for root in roots}
+        for future in as_completed(futures):
+            root = futures[future]
+            try:
+                results[root] = future.result()
+                errors = sum(r['status'] == 'error' for r in results[root])
+                seconds = sum(r['seconds'] for r in results[root])
+                print(f"- {branch_name(root)}: {len(results[root])} stages in {seconds:.1f}s, {errors} error(s)")
+            except Exception as e:
+                print(f"- {branch_name(root)}: failed ({e})")
+
+    consolidate([r for r in roots if r in results], output_dir, dictionary_path)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the monthly pipeline for several branches and consolidate the results")
+    parser.add_argument("branches", nargs="*", help="branch root folders (each with BAEKMI/ and 'NN Bulan/' folders)")
+    parser.add_argument("--branch-file", help="text file with one branch root per line")
+    parser.add_argument("--workers", type=int, help="parallel branches (default: CPU count)")
+    parser.add_argument("--output-dir", default=".", help="where the consolidated workbook goes")
+    parser.add_argument("--shared-dir", default=SHARED_DIR, help="where the shared UOM factors and consolidation item dictionary go")
+    args = parser.parse_args()
+
+    roots = list(args.branches)
+    if args.branch_file:
+        with open(args.branch_file, encoding='utf-8') as f:
+            roots += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not roots:
+        parser.error("no branch roots given")
+    missing = [r for r in roots if not os.path.isdir(r)]
+    if missing:
+        parser.error(f"not a folder: {', '.join(missing)}")
+    run_branches(roots, args.workers, args.output_dir, args.shared_dir)
@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Per-stage wall time, CPU time, memory and row counts, saved as a JSON run report next to the
+# outputs so a slow monthly close can be traced back to the month and stage that regressed. The
+# process peak (ru_maxrss) only ever grows, so each stage also records the resident memory before
+# and after it: 'rss_delta_mb' is what the stage kept, 'peak_rss_growth_mb' how far it raised the peak.
+
+_active_report = None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB (None if the platform cannot tell)"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    return None
+
+
+def current_rss_mb():
+    """Resident memory of this process right now, in MB (None if the platform cannot tell)"""
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _difference(after, before):
+    return None if after is None or before is None else round(after - before, 1)
+
+
+class RunReport:
+    """Collects stage measurements for one script run.
+
+    Use `with report.stage('merge', rows_in=n) as st: ...; st['rows_out'] = m`, or
+    `report.begin(...)` / `report.end(rows_out=...)` in linear scripts.
+    Set trace_memory=True to also record Python heap peaks with tracemalloc (slower).
+    """
+
+    def __init__(self, name, trace_memory=False):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now()
+        self.stages = []
+        self._open = None
+        self.extra = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        global _active_report
+        _active_report = self
+
+    def begin(self, stage, rows_in=None, **info):
+        if self._open is not None:
+            self.end()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._open = {
+            'stage': stage,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'rows_in': rows_in,
+            'rows_out': None,
+            'status': 'ok',
+            **info,
+            '_wall': time.perf_counter(),
+            '_cpu': time.process_time(),
+            '_rss': current_rss_mb(),
+            '_peak': peak_rss_mb(),
+        }
+        return self._open
+
+    def end(self, rows_out=None, status=None):
+        record = self._open
+        if record is None:
+            return None
+        self._open = None
+        record['wall_seconds'] = round(time.perf_counter() - record.pop('_wall'), 3)
+        record['cpu_seconds'] = round(time.process_time() - record.pop('_cpu'), 3)
+        record['rss_mb'] = current_rss_mb()
+        record['rss_delta_mb'] = _difference(record['rss_mb'], record.pop('_rss'))
+        record['peak_rss_mb'] = peak_rss_mb()
+        record['peak_rss_growth_mb'] = _difference(record['peak_rss_mb'], record.pop('_peak'))
+        if self.trace_memory:
+            record['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        if rows_out is not None:
+            record['rows_out'] = rows_out
+        if status is not None:
+            record['status'] = status
+        self.stages.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage, rows_in=None, **info):
+        record = self.begin(stage, rows_in, **info)
+        try:
+            yield record
+        except BaseException:
+            self.end(status='error')
+            raise
+        self.end()
+
+    def to_dict(self):
+        if self._open is not None:
+            self.end()
+        return {
+            'run': self.name,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'total_wall_seconds': round(sum(s['wall_seconds'] for s in self.stages), 3),
+            'total_cpu_seconds': round(sum(s['cpu_seconds'] for s in self.stages), 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+            **self.extra,
+        }
+
+    def save(self, output_dir="."):
+        """Write run_report_<name>_<timestamp>.json into output_dir and return its path"""
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = self.started_at.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(output_dir, f"run_report_{self.name}_{timestamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+        print(f"Run report saved to: {path}")
+        return path
+
+
+def record_rows(rows_in=None, rows_out=None):
+    """Attach row counts to the stage open in the active run report; a no-op when nothing is being recorded"""
+    if _active_report is None or _active_report._open is None:
+        return
+    if rows_in is not None:
+        _active_report._open['rows_in'] = rows_in
+    if rows_out is not None:
+        _active_report._open['rows_out'] = rows_out
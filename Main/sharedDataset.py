@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+
+# Publish a merged month file once as memory-mapped .npy columns that report workers attach to
+# read-only. Numeric and datetime columns map straight onto the files; text columns are stored as
+# categorical codes plus one pickled list of categories. Every worker that attaches the same month
+# shares the OS page cache, so N parallel report jobs do not cost N copies of the frame.
+#
+# Frames from attach() are backed by read-only memory: replacing a column (df['Laba'] = ...) or
+# filtering works as usual, in-place writes into an existing column raise "read-only".
+
+SHARED_DIR_NAME = "_shared"
+MANIFEST = "manifest.json"
+CATEGORIES = "categories.pkl"
+
+
+def _column_file(i):
+    return f"c{i:04d}.npy"
+
+
+def publish(df, target_dir):
+    """Write df as one .npy file per column plus a manifest"""
+    os.makedirs(target_dir, exist_ok=True)
+    columns = []
+    categories = {}
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy(dtype='datetime64[ns]').view('int64')
+            kind = 'datetime'
+        elif pd.api.types.is_bool_dtype(series) or (pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype)):
+            values = series.to_numpy()
+            kind = 'numeric'
+        else:
+            # Codes in the dtype pandas itself picks, so attach() can wrap them without a copy
+            cat = pd.Categorical(series.astype(object))
+            values = cat.codes
+            categories[i] = list(cat.categories)
+            kind = 'category'
+        np.save(os.path.join(target_dir, _column_file(i)), np.ascontiguousarray(values))
+        columns.append({'name': str(col), 'kind': kind})
+
+    pd.to_pickle(categories, os.path.join(target_dir, CATEGORIES))
+    with open(os.path.join(target_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'rows': len(df), 'columns': columns}, f, ensure_ascii=False, indent=2)
+    return target_dir
+
+
+def attach(target_dir):
+    """DataFrame over the published columns, memory-mapped read-only (no copy of the data)"""
+    with open(os.path.join(target_dir, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    categories = pd.read_pickle(os.path.join(target_dir, CATEGORIES))
+
+    data = {}
+    for i, column in enumerate(manifest['columns']):
+        values = np.load(os.path.join(target_dir, _column_file(i)), mmap_mode='r')
+        if column['kind'] == 'datetime':
+            values = values.view('datetime64[ns]')
+        elif column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=pd.Index(categories[i], dtype=object), validate=False)
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def shared_path(source_file):
+    """./BAEKMI/01_merge_januari.xlsx -> ./BAEKMI/_shared/01_merge_januari"""
+    return os.path.join(os.path.dirname(source_file), SHARED_DIR_NAME, os.path.splitext(os.path.basename(source_file))[0])
+
+
+def is_published(source_file):
+    manifest = os.path.join(shared_path(source_file), MANIFEST)
+    return os.path.exists(manifest) and os.path.getmtime(manifest) >= os.path.getmtime(source_file)
+
+
+def publish_file(source_file, force=False):
+    """Read a merged Excel file once and publish it next to the source; skipped when already up to date"""
+    if force or not is_published(source_file):
+        print(f"Publishing {os.path.basename(source_file)} as shared columns...")
+        publish(pd.read_excel(source_file), shared_path(source_file))
+    return shared_path(source_file)
+
+
+def read_merged(source_file, categorical=False, columns=None):
+    """The published columns of source_file when up to date, otherwise a normal pd.read_excel().
+
+    With categorical=False text columns are decoded to object, which the report scripts expect
+    (fillna with new labels, groupby without unobserved categories). Decoding only builds an array
+    of references to the shared category strings; numeric columns stay memory-mapped.
+    columns limits the result to those of the given names that exist in the file.
+    """
+    if not is_published(source_file):
+        if columns is None:
+            return pd.read_excel(source_file)
+        return pd.read_excel(source_file, usecols=lambda c: c in columns)
+    df = attach(shared_path(source_file))
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]]
+    if not categorical:
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = np.asarray(df[col].array, dtype=object)
+    return df
+
+
+if __name__ == "__main__":
+    from glob import glob
+    for source_file in sorted(glob(os.path.join("./BAEKMI", "*_merge_*.xlsx"))):
+        if not source_file.endswith("_ANALYSIS_REPORT.xlsx"):
+            publish_file(source_file)
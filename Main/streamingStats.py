@@ -0,0 +1,242 @@
+import pandas as pd
+import numpy as np
+import os
+from openpyxl import load_workbook
+
+# Correlation statistics for exploration.ipynb without loading the merged workbook into memory.
+# Rows are streamed in chunks (openpyxl read-only mode for .xlsx, chunked readers for .csv/.parquet)
+# and folded into OnlineCovariance, which keeps pairwise-complete moment sums, so the result matches
+# DataFrame.corr() while memory stays O(columns^2). Several files (e.g. 2023-2025) can be chained.
+#
+#   corr = correlation_matrix(["./MergedJualBeli2023_Excel.xlsx", "./MergedJualBeli2024_Excel.xlsx"])
+#   laba = target_correlation("./MergedJualBeli2024_Excel.xlsx", target='Laba_Jual')
+
+CHUNK_ROWS = 50000
+
+# Spreadsheet helper columns dropped in exploration.ipynb before computing correlations
+HELPER_COLUMNS = [
+    'Unnamed: 27',
+    'Helper: Check if Kode #_Jual !== Kode #_Beli',
+    'Helper: Recount Laba Jual',
+    'Helper: Cek Laba Asli dan Laba Recount',
+]
+CATEGORY_COLUMN = 'Nama Kategori Barang Barang & Jasa_Jual'
+ENCODED_COLUMN = 'Kategori Barang Encoded'
+
+
+def _xlsx_chunks(path, chunk_rows, sheet_name=None):
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Same names pandas gives to blank headers, so HELPER_COLUMNS match
+        columns = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+def iter_chunks(paths, chunk_rows=CHUNK_ROWS, sheet_name=None):
+    """DataFrame chunks of one or more .xlsx/.csv/.parquet files, read sequentially"""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    for path in paths:
+        ext = os.path.splitext(str(path))[1].lower()
+        if ext == '.csv':
+            yield from pd.read_csv(path, chunksize=chunk_rows)
+        elif ext == '.parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            yield from _xlsx_chunks(path, chunk_rows, sheet_name)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _all_numbers(values):
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return True
+    return bool(values.dropna().map(_is_number).all())
+
+
+def scan_columns(paths, drop_columns=(), category_column=None, chunk_rows=CHUNK_ROWS):
+    """One pass over every chunk: the numeric columns and the category codes.
+
+    A column is numeric when all its non-empty values in all files are numbers, as select_dtypes sees
+    the whole frame in the notebook (an empty column counts as numeric, like pandas' all-NaN float
+    column). Columns are in order of first appearance. Codes map the sorted distinct values of
+    category_column to integers, matching LabelEncoder().fit_transform().
+    """
+    numeric, categories = {}, set()
+    for chunk in iter_chunks(paths, chunk_rows):
+        for col in chunk.columns:
+            if col in drop_columns:
+                continue
+            if numeric.get(col, True):
+                numeric[col] = _all_numbers(chunk[col])
+        if category_column and category_column in chunk.columns:
+            categories.update(chunk[category_column].astype(str).unique())
+    columns = [col for col, is_numeric in numeric.items() if is_numeric and col != ENCODED_COLUMN]
+    return columns, {value: code for code, value in enumerate(sorted(categories))}
+
+
+class OnlineCovariance:
+    """Pairwise-complete covariance/correlation accumulated chunk by chunk.
+
+    For every column pair only rows where both values are present are used, like DataFrame.corr().
+    Values are shifted by a per-column reference (the mean of the first chunk holding the column)
+    before summing so the raw moment sums stay well conditioned.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.shift = None
+        self.n = np.zeros((p, p))
+        self.sum = np.zeros((p, p))      # sum[i, j]: sum of x_i over rows where x_i and x_j are present
+        self.sumsq = np.zeros((p, p))    # sumsq[i, j]: sum of x_i^2 over the same rows
+        self.cross = np.zeros((p, p))    # cross[i, j]: sum of x_i * x_j
+
+    def update(self, chunk):
+        values = chunk.reindex(columns=self.columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        if self.shift is None:
+            self.shift = np.zeros(len(self.columns))
+            self._shifted = np.zeros(len(self.columns), dtype=bool)
+        # A column's sums are all zero until it first has values, so its shift can still be chosen then
+        new = ~self._shifted & present.any(axis=0)
+        if new.any():
+            self.shift[new] = np.nanmean(values[:, new], axis=0)
+            self._shifted |= new
+        mask = present.astype(float)
+        x = np.where(present, values - self.shift, 0.0)
+        self.n += mask.T @ mask
+        self.sum += x.T @ mask
+        self.sumsq += (x * x).T @ mask
+        self.cross += x.T @ x
+        return self
+
+    def merge(self, other):
+        """Fold another accumulator over the same columns into this one (e.g. from a parallel worker)"""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge accumulators over different columns")
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            self.shift, self._shifted = other.shift.copy(), other._shifted.copy()
+        delta = other.shift - self.shift
+        # Re-express other's sums around this accumulator's shift
+        d_i = delta[:, None]
+        d_j = delta[None, :]
+        self.sumsq += other.sumsq + 2 * d_i * other.sum + d_i ** 2 * other.n
+        self.cross += other.cross + d_i * other.sum.T + d_j * other.sum + d_i * d_j * other.n
+        self.sum += other.sum + d_i * other.n
+        self.n += other.n
+        self._shifted |= other._shifted
+        return self
+
+    @property
+    def count(self):
+        return pd.Series(np.diag(self.n), index=self.columns)
+
+    def mean(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.Series(np.diag(self.sum) / np.diag(self.n) + self.shift, index=self.columns)
+
+    def _centered(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            n = np.where(self.n > 0, self.n, np.nan)
+            co = self.cross - self.sum * self.sum.T / n
+            ss_i = self.sumsq - self.sum ** 2 / n
+        return n, co, ss_i
+
+    def cov(self, ddof=1):
+        n, co, _ = self._centered()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.where(n > ddof, co / (n - ddof), np.nan)
+        return pd.DataFrame(result, index=self.columns, columns=self.columns)
+
+    def corr(self, min_periods=1):
+        n, co, ss_i = self._centered()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = co / np.sqrt(ss_i * ss_i.T)
+        result = np.clip(result, -1.0, 1.0)
+        result[~(n >= max(min_periods, 2))] = np.nan
+        return pd.DataFrame(result, index=self.columns, columns=self.columns)
+
+
+def stratified_sample(chunks, strata, per_stratum, seed=0):
+    """Uniform sample without replacement of up to per_stratum rows per value of `strata`, in one pass.
+
+    Every row gets a random key; per stratum the rows with the smallest keys are kept (bottom-k
+    reservoir), so memory is bounded by per_stratum x number of strata.
+    """
+    rng = np.random.default_rng(seed)
+    kept = None
+    for chunk in chunks:
+        chunk = chunk.assign(_sample_key=rng.random(len(chunk)))
+        kept = chunk if kept is None else pd.concat([kept, chunk], ignore_index=True)
+        order = kept.sort_values('_sample_key', kind='stable')
+        kept = order.groupby(strata, dropna=False, sort=False).head(per_stratum)
+    if kept is None:
+        return pd.DataFrame()
+    return kept.drop(columns='_sample_key').reset_index(drop=True)
+
+
+def category_codes(paths, column=CATEGORY_COLUMN, chunk_rows=CHUNK_ROWS):
+    """Sorted distinct values of `column` -> code, matching LabelEncoder().fit_transform()"""
+    return scan_columns(paths, category_column=column, chunk_rows=chunk_rows)[1]
+
+
+def correlation_matrix(paths, drop_columns=HELPER_COLUMNS, category_column=CATEGORY_COLUMN,
+                       chunk_rows=CHUNK_ROWS, strata=None, per_stratum=None, seed=0, return_stats=False):
+    """Streaming equivalent of the notebook's numerical_df.corr().
+
+    A first pass decides the numeric columns over all files and collects the category codes;
+    category_column (if present) is label-encoded like LabelEncoder. With strata and per_stratum set,
+    the matrix is computed on a stratified sample.
+    """
+    columns, codes = scan_columns(paths, drop_columns, category_column, chunk_rows)
+    if codes:
+        columns.append(ENCODED_COLUMN)
+
+    def prepared():
+        for chunk in iter_chunks(paths, chunk_rows):
+            chunk = chunk.drop(columns=[c for c in drop_columns if c in chunk.columns])
+            if codes and category_column in chunk.columns:
+                chunk[ENCODED_COLUMN] = chunk[category_column].astype(str).map(codes)
+            yield chunk
+
+    chunks = prepared()
+    if strata is not None and per_stratum is not None:
+        chunks = iter([stratified_sample(chunks, strata, per_stratum, seed)])
+
+    stats = None
+    for chunk in chunks:
+        if stats is None:
+            stats = OnlineCovariance(columns)
+        stats.update(chunk)
+
+    if stats is None:
+        return (pd.DataFrame(), None) if return_stats else pd.DataFrame()
+    corr = stats.corr()
+    return (corr, stats) if return_stats else corr
+
+
+def target_correlation(paths, target='Laba_Jual', **kwargs):
+    """Correlation of every numeric column with `target` (the notebook's bar chart input)"""
+    corr = correlation_matrix(paths, **kwargs)
+    return corr[target].drop(target)
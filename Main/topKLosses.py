@@ -0,0 +1,81 @@
+import pandas as pd
+import os
+from aggregateCube import file_key, merged_files
+from columnLoader import load_columns, MissingColumnsError
+
+# k worst rows (lowest Laba) per supplier, category or month over any date range, in one pass
+# over the whole year. Selection uses groupby().nsmallest(k) (a per-group heap), so only k rows
+# per group are ordered instead of sorting every row.
+
+GROUP_COLUMNS = {
+    'supplier': 'Pemasok',
+    'category': 'Nama Kategori Barang Barang & Jasa',
+    'month': 'Bulan',
+}
+
+OUTPUT_COLUMNS = [
+    'Bulan', 'Tanggal', 'Pemasok', 'Nama Barang', 'Laba', 'Total Harga', 'Kuantitas',
+    'Satuan', '@Harga', 'Nama Kategori Barang Barang & Jasa'
+]
+REQUIRED_COLUMNS = ['Pemasok', 'Laba']
+
+
+def load_rows(directory="./BAEKMI"):
+    """Row-level Laba data of the merged files (one per month), tagged with the month key ('01_januari', ...)"""
+    frames = []
+    for file_path in merged_files(directory):
+        file_name = os.path.basename(file_path)
+        try:
+            df = load_columns(file_path, REQUIRED_COLUMNS, OUTPUT_COLUMNS)
+        except MissingColumnsError as e:
+            print(f"⚠️ Skipping {file_name} - {e}")
+            continue
+        except Exception as e:
+            print(f"❌ Error processing {file_name}: {str(e)}")
+            continue
+        df['Bulan'] = file_key(file_path)
+        frames.append(df)
+
+    if not frames:
+        return None
+    rows = pd.concat(frames, ignore_index=True)
+    rows['Laba'] = pd.to_numeric(rows['Laba'], errors='coerce')
+    rows = rows.dropna(subset=['Laba'])
+    rows['Pemasok'] = rows['Pemasok'].fillna('(Tidak Diketahui)')
+    if 'Tanggal' in rows.columns:
+        rows['Tanggal'] = pd.to_datetime(rows['Tanggal'], errors='coerce', dayfirst=True)
+    return rows.reset_index(drop=True)
+
+
+def select_period(rows, start=None, end=None, months=None):
+    """Restrict rows to Tanggal in [start, end] (whole days, inclusive) and/or to the given month keys"""
+    mask = pd.Series(True, index=rows.index)
+    if (start is not None or end is not None) and 'Tanggal' not in rows.columns:
+        raise KeyError("Tanggal column is required for a date range")
+    if start is not None:
+        mask &= rows['Tanggal'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= rows['Tanggal'] < pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    if months is not None:
+        mask &= rows['Bulan'].isin(months)
+    return rows[mask]
+
+
+def top_k_losses(rows, by='supplier', k=10, start=None, end=None, months=None, losses_only=False):
+    """k lowest-Laba rows per group (by = 'supplier', 'category', 'month' or a column name)"""
+    group_col = GROUP_COLUMNS.get(by, by)
+    if group_col not in rows.columns:
+        raise KeyError(f"Cannot group by missing column: {group_col}")
+    rows = select_period(rows, start, end, months)
+    if losses_only:
+        rows = rows[rows['Laba'] < 0]
+    if rows.empty:
+        return rows[[c for c in OUTPUT_COLUMNS if c in rows.columns]]
+
+    # Per-group heap selection; index level -1 holds the original row positions
+    worst = rows.groupby(group_col, sort=False, observed=True)['Laba'].nsmallest(k)
+    result = rows.loc[worst.index.get_level_values(-1)]
+
+    output_cols = [c for c in OUTPUT_COLUMNS if c in result.columns]
+    output_cols.insert(0, output_cols.pop(output_cols.index(group_col)))
+    return result[output_cols].sort_values([group_col, 'Laba'], kind='stable').reset_index(drop=True)
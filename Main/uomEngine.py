@@ -0,0 +1,154 @@
+import pandas as pd
+import numpy as np
+import os
+import hashlib
+
+# Canonical unit names. Keys are matched after strip + upper + removing dots/spaces,
+# so 'Pcs', 'pcs ' and 'P.C.S' all map to 'PCS'.
+UOM_ALIASES = {
+    'PCS': 'PCS', 'PC': 'PCS',
+    'ML': 'ML',
+    'GR': 'GR', 'GRAM': 'GR',
+    'LTR': 'LTR', 'LITER': 'LTR',
+    'PAI': 'PAI', 'PAIL': 'PAI',
+    'PCK': 'PCK', 'PACK': 'PCK',
+    'CAN': 'CAN', 'KALENG': 'CAN',
+    'BTL': 'BTL', 'BOTOL': 'BTL',
+    'JAR': 'JAR',
+    'JRG': 'JRG', 'JERIGEN': 'JRG',
+    'BOX': 'BOX',
+    'CTN': 'CTN', 'KARTON': 'CTN',
+    'GAL': 'GAL', 'GALON': 'GAL',
+    'KG': 'KG', 'KILO': 'KG',
+}
+
+# UOM hierarchy (lower number = smaller unit)
+UOM_PRIORITY = {
+    'PCS': 1, 'ML': 2, 'GR': 3, 'LTR': 4, 'PAI': 5, 'PCK': 6, 'CAN': 7,
+    'BTL': 8, 'JAR': 9, 'JRG': 10, 'BOX': 11, 'CTN': 12, 'GAL': 13, 'KG': 14,
+}
+UNKNOWN_PRIORITY = 999
+
+FACTOR_COLUMNS = ['Nama Barang', 'Satuan', 'Satuan Dasar', 'Faktor Konversi', 'Jumlah Data']
+
+# Factors learned once over every branch (set by runBranches.py); scripts use them instead of relearning
+SHARED_FACTORS_ENV = 'MBU_UOM_FACTORS'
+
+
+def canonicalize_satuan(series):
+    """Map raw 'Satuan' values to canonical unit names.
+
+    Only the distinct values are cleaned; the result is broadcast back with a
+    single take, so the cost scales with the number of unit spellings.
+    """
+    codes, uniques = pd.factorize(series.astype(str))
+    cleaned = pd.Index(uniques).str.strip().str.upper().str.replace(r'[\s.]+', '', regex=True)
+    canonical = np.array([UOM_ALIASES.get(u, u) for u in cleaned], dtype=object)
+    return pd.Series(canonical.take(codes), index=series.index, dtype=object)
+
+
+def uom_priority(canonical_satuan):
+    """Priority of canonical units; unknown units get 999"""
+    return canonical_satuan.map(UOM_PRIORITY).fillna(UNKNOWN_PRIORITY).astype(int)
+
+
+def learn_conversion_factors(df_beli, item_col='Nama Barang', price_col='@Harga'):
+    """Learn per-item conversion factors to the smallest unit from purchase history.
+
+    For every item bought in more than one unit, the factor of a unit is the ratio of
+    its median purchase price to the median price of the item's smallest unit,
+    rounded to a whole number (1 CTN = 24 PCS). Ratios below 1 are inconsistent
+    with the hierarchy and are dropped.
+    """
+    if item_col not in df_beli.columns or 'Satuan' not in df_beli.columns or price_col not in df_beli.columns:
+        print(f"Cannot learn conversion factors - missing '{item_col}', 'Satuan' or '{price_col}'")
+        return pd.DataFrame(columns=FACTOR_COLUMNS)
+
+    df = pd.DataFrame({
+        'Nama Barang': df_beli[item_col].astype(str).str.strip(),
+        'Satuan': canonicalize_satuan(df_beli['Satuan']),
+        'Harga': pd.to_numeric(df_beli[price_col], errors='coerce'),
+    })
+    df = df[(df['Harga'] > 0) & df['Satuan'].notna()]
+
+    per_unit = (
+        df.groupby(['Nama Barang', 'Satuan'], sort=False)['Harga']
+        .agg(['median', 'size'])
+        .reset_index()
+    )
+    per_unit['Priority'] = uom_priority(per_unit['Satuan'])
+
+    # Smallest known unit per item becomes the base unit
+    base_idx = per_unit.sort_values(['Nama Barang', 'Priority']).drop_duplicates('Nama Barang').index
+    base = per_unit.loc[base_idx, ['Nama Barang', 'Satuan', 'median']].rename(
+        columns={'Satuan': 'Satuan Dasar', 'median': 'Harga Dasar'}
+    )
+    per_unit = per_unit.merge(base, on='Nama Barang', how='left')
+
+    ratio = per_unit['median'] / per_unit['Harga Dasar']
+    per_unit['Faktor Konversi'] = np.where(
+        per_unit['Satuan'] == per_unit['Satuan Dasar'], 1.0, np.round(ratio)
+    )
+    per_unit = per_unit[per_unit['Faktor Konversi'] >= 1]
+    per_unit = per_unit.rename(columns={'size': 'Jumlah Data'})
+
+    return per_unit[FACTOR_COLUMNS].reset_index(drop=True)
+
+
+def normalize_quantities(df, factors, item_col='Nama Barang', qty_col='Kuantitas', price_col='@Harga'):
+    """Add 'Satuan Dasar', 'Faktor Konversi' and, when present, quantity and price in the base unit.
+
+    Rows whose item/unit pair has no learned factor keep their own canonical unit with factor 1.
+    """
+    df = df.copy()
+    satuan = canonicalize_satuan(df['Satuan'])
+
+    lookup = pd.MultiIndex.from_arrays([factors['Nama Barang'].astype(str), factors['Satuan']])
+    keys = pd.MultiIndex.from_arrays([df[item_col].astype(str).str.strip(), satuan])
+    pos = lookup.get_indexer(keys)
+    found = pos >= 0
+    safe_pos = np.maximum(pos, 0)
+
+    base_unit = factors['Satuan Dasar'].to_numpy(dtype=object)
+    factor = factors['Faktor Konversi'].to_numpy(dtype=float)
+
+    if len(factors):
+        df['Satuan Dasar'] = np.where(found, base_unit.take(safe_pos), satuan.to_numpy())
+        df['Faktor Konversi'] = np.where(found, factor.take(safe_pos), 1.0)
+    else:
+        df['Satuan Dasar'] = satuan.to_numpy()
+        df['Faktor Konversi'] = 1.0
+
+    if qty_col in df.columns:
+        df['Kuantitas Dasar'] = pd.to_numeric(df[qty_col], errors='coerce') * df['Faktor Konversi']
+    if price_col in df.columns:
+        df['@Harga Dasar'] = pd.to_numeric(df[price_col], errors='coerce') / df['Faktor Konversi']
+    return df
+
+
+def save_conversion_factors(factors, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    factors.to_excel(path, index=False)
+    print(f"Saved {len(factors)} conversion factors to {path}")
+
+
+def load_conversion_factors(path):
+    if not os.path.exists(path):
+        print(f"Conversion factor file not found: {path}")
+        return pd.DataFrame(columns=FACTOR_COLUMNS)
+    factors = pd.read_excel(path)
+    factors['Satuan'] = canonicalize_satuan(factors['Satuan'])
+    factors['Satuan Dasar'] = canonicalize_satuan(factors['Satuan Dasar'])
+    return factors
+
+
+def shared_conversion_factors():
+    """The shared factor table named by MBU_UOM_FACTORS, or None when no shared table is configured"""
+    path = os.environ.get(SHARED_FACTORS_ENV)
+    return load_conversion_factors(path) if path else None
+
+
+def factors_digest(factors):
+    """Content hash of a factor table, for checkpoint signatures (a changed MBU_UOM_FACTORS table changes the pairs)"""
+    hashes = pd.util.hash_pandas_object(factors, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes() + ','.join(map(str, factors.columns)).encode()).hexdigest()
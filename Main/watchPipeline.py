@@ -0,0 +1,214 @@
+import os
+import re
+import queue
+import argparse
+import threading
+from glob import glob
+from datetime import datetime
+
+# Watch mode: polls the month folders ("NN Bulan/") and ./BAEKMI for new or changed xlsx files and
+# re-runs only the stages for the affected month in a background worker, using the existing filename
+# conventions. A file is picked up once its size and mtime are unchanged over one poll, so an export
+# that is still being copied is not read half-written. Stage outputs are themselves watched files,
+# so one dropped export cascades through the pipeline:
+#
+#   NN Bulan/Pembelian per Barang hingga Bulan.xlsx   -> clean (both cleanPembelian scripts, month NN)
+#   BAEKMI/NN penjualan bulan.xlsx, NN supplier ...    -> supplier match     -> NN_merge_bulan.xlsx
+#   BAEKMI/NN_merge_bulan.xlsx, NN pembelian terbaru   -> purchase match     -> NN_merge_with_purchasing_bulan.xlsx
+#   BAEKMI/NN_merge_with_purchasing_bulan.xlsx         -> analysis report + year summary (from stored partials)
+#   any BAEKMI/NN_merge_*.xlsx                         -> Laba/Rugi reports, all roll-ups of the cube; only the
+#                                                         changed file is aggregated again, the other months come
+#                                                         from BAEKMI/_cube
+#
+#   python watchPipeline.py --root .            # watch from now on
+#   python watchPipeline.py --root . --all      # also process every existing file once at startup
+
+POLL_SECONDS = 10
+STAGE_ORDER = ['clean', 'supplier_match', 'purchase_match', 'report', 'month_reports']
+
+_RAW_PEMBELIAN = re.compile(r'^pembelian per barang hingga (\w+)\.xlsx$', re.IGNORECASE)
+_MONTH_DIR = re.compile(r'^(\d{2}) (\w+)$')
+_BAEKMI_PATTERNS = [
+    (re.compile(r'^(\d{2})_merge_with_purchasing_(\w+)\.xlsx$', re.IGNORECASE), ['report', 'month_reports']),
+    (re.compile(r'^(\d{2})_merge_(\w+)\.xlsx$', re.IGNORECASE), ['purchase_match', 'month_reports']),
+    (re.compile(r'^(\d{2}) (?:penjualan|supplier) (\w+)\.xlsx$', re.IGNORECASE), ['supplier_match']),
+    (re.compile(r'^(\d{2}) pembelian terbaru per barang hingga (\w+)\.xlsx$', re.IGNORECASE), ['purchase_match']),
+]
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
+
+
+def jobs_for(path, root="."):
+    """(stage, number, month) jobs a changed file triggers; month-independent jobs use (stage, None, None)"""
+    rel = os.path.relpath(path, root)
+    folder, name = os.path.split(rel)
+    if name.startswith('~$') or name.endswith('_ANALYSIS_REPORT.xlsx'):
+        return []
+    if folder == 'BAEKMI':
+        for pattern, stages in _BAEKMI_PATTERNS:
+            match = pattern.match(name)
+            if match:
+                number, month = match.group(1), match.group(2).lower()
+                return [(stage, None, None) if stage == 'month_reports' else (stage, number, month) for stage in stages]
+        return []
+    month_dir = _MONTH_DIR.match(folder)
+    if month_dir and _RAW_PEMBELIAN.match(name):
+        # Month folders keep the capitalized name ('01 Januari'), which the clean scripts expect
+        return [('clean', month_dir.group(1), month_dir.group(2))]
+    return []
+
+
+def _find(directory, pattern):
+    """File in directory whose lowercased name equals pattern (the scripts match month names case-insensitively)"""
+    return next((os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.lower() == pattern.lower()), None)
+
+
+def run_job(job, root="."):
+    """Run one stage for one month; returns the output path or None when its inputs are not there yet"""
+    stage, number, month = job
+    baekmi = os.path.join(root, 'BAEKMI')
+    if stage == 'clean':
+        import cleanPembelianSheets_Batch
+        import cleanPembelianSheetsSmallesUnitUOM
+        # Both scripts print and swallow their own errors; a None result means no output was written
+        for script in (cleanPembelianSheets_Batch, cleanPembelianSheetsSmallesUnitUOM):
+            if script.process_month(number, month) is None:
+                raise RuntimeError(f"{script.__name__} failed for {number} {month}")
+        return os.path.join(baekmi, f"{number} pembelian terbaru per barang hingga {month}.xlsx")
+    if stage == 'supplier_match':
+        from matchSupplierWithStringContain import process_monthly_sales
+        sales_file = _find(baekmi, f"{number} penjualan {month}.xlsx")
+        supplier_file = _find(baekmi, f"{number} supplier {month}.xlsx")
+        if sales_file is None or supplier_file is None:
+            return None
+        return process_monthly_sales(supplier_file, sales_file)
+    if stage == 'purchase_match':
+        from matchSalesSupplierPurchases import process_sales_purchasing
+        sales_file = _find(baekmi, f"{number}_merge_{month}.xlsx")
+        purchasing_file = _find(baekmi, f"{number} pembelian terbaru per barang hingga {month}.xlsx")
+        if sales_file is None or purchasing_file is None:
+            return None
+        return process_sales_purchasing(sales_file, purchasing_file)
+    if stage == 'report':
+        from generateAllReportFromMergePurchasing import generate_report, generate_cumulative_summary
+        input_file = _find(baekmi, f"{number}_merge_with_purchasing_{month}.xlsx")
+        if input_file is None:
+            return None
+        generate_report(input_file)
+        generate_cumulative_summary()
+        return input_file
+    if stage == 'month_reports':
+        import generateLabaPerSupplier
+        import generateLabaPerItemWithSupplier
+        import generateRugiPerItem
+        generateLabaPerSupplier.analyze_supplier_profits(baekmi)
+        generateLabaPerItemWithSupplier.export_item_profit_and_losses(baekmi)
+        generateRugiPerItem.analyze_supplier_profits(baekmi)
+        return baekmi
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+class DirectoryWatcher:
+    """Polling change detector over the month folders and BAEKMI"""
+
+    def __init__(self, root=".", include_existing=False):
+        self.root = root
+        self.seen = {} if include_existing else self.scan()
+        self.settling = {}
+
+    def scan(self):
+        paths = glob(os.path.join(self.root, 'BAEKMI', '*.xlsx')) + glob(os.path.join(self.root, '[0-9][0-9] *', '*.xlsx'))
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def changes(self):
+        """Files that changed and have stayed the same since the previous poll"""
+        ready = []
+        current = self.scan()
+        for path, signature in current.items():
+            if self.seen.get(path) == signature:
+                self.settling.pop(path, None)
+            elif self.settling.get(path) == signature:
+                ready.append(path)
+                self.seen[path] = signature
+                del self.settling[path]
+            else:
+                self.settling[path] = signature
+        return sorted(ready)
+
+
+class PipelineWatcher:
+    """Polls for changes and feeds the affected stages to one background worker, in pipeline order"""
+
+    def __init__(self, root=".", poll_seconds=POLL_SECONDS, include_existing=False):
+        self.root = root
+        self.poll_seconds = poll_seconds
+        self.watcher = DirectoryWatcher(root, include_existing)
+        self.jobs = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def submit(self, paths):
+        jobs = {job for path in paths for job in jobs_for(path, self.root)}
+        for job in sorted(jobs, key=lambda j: (STAGE_ORDER.index(j[0]), j[1] or '', j[2] or '')):
+            with self._lock:
+                if job in self._queued:
+                    continue
+                self._queued.add(job)
+            self.jobs.put(job)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._queued.discard(job)
+            stage, number, month = job
+            label = stage if number is None else f"{stage} {number} {month}"
+            log(f"Running {label}...")
+            try:
+                output = run_job(job, self.root)
+                if output is None:
+                    log(f"Skipped {label}: inputs for this month are not there yet")
+                else:
+                    log(f"Finished {label}")
+            except Exception as e:
+                log(f"Error in {label}: {e}")
+
+    def run(self):
+        threading.Thread(target=self._work, daemon=True).start()
+        log(f"Watching {os.path.abspath(self.root)} every {self.poll_seconds}s (Ctrl+C to stop)")
+        try:
+            while not self._stop.is_set():
+                # Report outputs (timestamped workbooks, summaries) change too but trigger nothing
+                changed = [p for p in self.watcher.changes() if jobs_for(p, self.root)]
+                if changed:
+                    log("Changed: " + ", ".join(os.path.relpath(p, self.root) for p in changed))
+                    self.submit(changed)
+                self._stop.wait(self.poll_seconds)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run only the affected pipeline stages when exports change")
+    parser.add_argument("--root", default=".", help="folder holding BAEKMI and the 'NN Bulan' month folders")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between change checks")
+    parser.add_argument("--all", action="store_true", help="process every existing file once at startup")
+    args = parser.parse_args()
+    # The stage scripts use paths relative to the pipeline root
+    os.chdir(args.root)
+    PipelineWatcher(".", args.poll, include_existing=args.all).run()